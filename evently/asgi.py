@@ -0,0 +1,17 @@
+"""
+ASGI config for evently project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The async chat API views run on the event loop when served through it.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'evently.settings')
+
+application = get_asgi_application()
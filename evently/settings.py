@@ -44,7 +44,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'events.auth_cache.CachedAuthenticationMiddleware',  # AuthenticationMiddleware with a user cache
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -53,6 +53,12 @@ if DEBUG:
     INSTALLED_APPS += ['debug_toolbar']
     MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
 
+# Query fingerprint log for `manage.py index_advisor`; recording is off unless a path is set.
+INDEX_ADVISOR_LOG = os.getenv('INDEX_ADVISOR_LOG')
+
+if INDEX_ADVISOR_LOG:
+    MIDDLEWARE += ['events.index_advisor.QueryFingerprintMiddleware']
+
 ROOT_URLCONF = 'evently.urls'
 
 TEMPLATES = [
@@ -76,6 +82,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'evently.wsgi.application'
 
+ASGI_APPLICATION = 'evently.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -127,6 +135,16 @@ STATIC_URL = '/static/'
 
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Chat messages are group committed by a writer thread (see events/ingest.py)
+CHAT_INGEST = {
+    'sync': False,         # Write messages in the request instead
+    'max_batch': 200,      # Messages per transaction
+    'max_delay': 0.005,    # Seconds a batch waits for more messages
+}
+
+# Compressed histories of purged chats (see events/archive.py)
+CHAT_ARCHIVE_DIR = os.getenv('CHAT_ARCHIVE_DIR', BASE_DIR / 'chat_archive')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -136,10 +154,15 @@ AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Emails are queued in the database and sent by a background job (see events/mail.py).
+EMAIL_BACKEND = 'events.mail.QueuedEmailBackend'
+
 # Email Backend for Development
-# For development purposes, emails are printed to the console instead of being sent.
+# For development purposes, queued emails are printed to the console instead of being sent.
 # IMPORTANT: Change this to 'django.core.mail.backends.smtp.EmailBackend' or another appropriate backend in production.
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+OUTBOUND_EMAIL = {
+    'backend': 'django.core.mail.backends.console.EmailBackend',
+}
 
 # Security settings
 SESSION_COOKIE_SECURE = True  # Ensure cookies are sent over HTTPS
@@ -161,27 +184,54 @@ LOGGING = {
     },
 }
 
+# Background tasks are queued through the database (ORM broker) and run by worker
+# processes: `python manage.py qcluster` serves the default queue and
+# `python manage.py qcluster --name maintenance` the maintenance queue (see events/jobs.py).
 Q_CLUSTER = {
     'name': 'DjangoQ',
-    'workers': 1,          # Number of worker threads
+    'workers': int(os.getenv('Q_WORKERS', 4)),  # Number of worker processes
     'recycle': 500,        # Optional: Recycle workers after 500 tasks
-    'timeout': 60,         # Optional: Task timeout in seconds
-    'sync': True,          # Run tasks synchronously without a broker
+    'timeout': 60,         # Task timeout in seconds, unless the job sets its own (JOB_TIMEOUTS)
+    'retry': 90,           # Retry unacknowledged tasks after 90 seconds; must exceed the timeouts
+    'max_attempts': 3,     # Give up on a task after 3 attempts
     'save_limit': 250,     # Optional: Number of successful tasks to save
-    'retry': 90,           # Optional: Retry failed tasks after 90 seconds
-    'orm': 'default',      # Optional: Use the ORM broker for persistence
+    'orm': 'default',      # Use the ORM broker for persistence
+    'poll': 0.5,           # Seconds between polls of an empty queue
+    # Run tasks inline in the caller, e.g. for debugging; events.jobs.run_queued() runs the real queue instead.
+    'sync': os.getenv('Q_SYNC', 'False') == 'True',
+    'ALT_CLUSTERS': {
+        'maintenance': {
+            'workers': int(os.getenv('Q_MAINTENANCE_WORKERS', 1)),
+            'timeout': 1800,
+            'retry': 1900,
+        },
+    },
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# The default cache keeps recently used entries in each process in front of Redis
+# and falls back to them while Redis is unavailable (see events/tiered_cache.py).
 CACHES = {
     'default': {
+        'BACKEND': 'events.tiered_cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': 30,
+            'SYNC_INTERVAL': 1,
+            'SHARED_ONLY': ['chat-rate:'],
+        }
+    },
+    'shared': {
         'BACKEND': 'django_redis.cache.RedisCache',
         'LOCATION': 'redis://127.0.0.1:6379/0',  # Replace with your Redis server details
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Fail fast so the default cache can carry on without Redis.
+            'SOCKET_CONNECT_TIMEOUT': 0.5,
+            'SOCKET_TIMEOUT': 0.5,
         }
     }
 }
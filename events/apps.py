@@ -9,22 +9,31 @@ class EventsConfig(AppConfig):
 
     def ready(self):
         import events.signals  # Import the signals to connect them
-        from django_q.tasks import schedule, Schedule
-        
+        from .jobs import HIGH, LOW, PRIORITY_QUEUES, job_options
+
         try:
             from django_q.tasks import schedule, Schedule
-            # Only schedule the task if the table exists
-            if not Schedule.objects.filter(func='events.tasks.delete_old_events').exists():
-                schedule(
-            'events.tasks.delete_old_events',
-            schedule_type=Schedule.DAILY,  # Run daily
-                )
-
-            if not Schedule.objects.filter(func='events.tasks.update_event_status').exists():
-                schedule(
-                    'events.tasks.update_event_status',
-                    schedule_type=Schedule.HOURLY,  # Run hourly
-                )
+            # Scheduled jobs by queue priority; maintenance runs on the low one (see events/jobs.py).
+            schedules = {
+                'events.tasks.delete_old_events': (LOW, {'schedule_type': Schedule.DAILY}),  # Run daily
+                'events.tasks.update_event_status': (LOW, {'schedule_type': Schedule.HOURLY}),  # Run hourly
+                'events.tasks.purge_deleted_events': (LOW, {'schedule_type': Schedule.HOURLY}),  # Run hourly
+                'events.tasks.rotate_message_partition': (LOW, {'schedule_type': Schedule.MONTHLY}),  # Run monthly
+                # Reminders and digests only queue emails (see events/notifications.py).
+                'events.tasks.send_event_reminders': (LOW, {'schedule_type': Schedule.HOURLY}),  # Run hourly
+                'events.tasks.send_daily_digests': (LOW, {'schedule_type': Schedule.DAILY}),  # Run daily
+                'events.tasks.delete_old_emails': (LOW, {'schedule_type': Schedule.DAILY}),  # Run daily
+                # Sends the emails whose retry came due (see events/mail.py).
+                'events.mail.send_queued_email': (HIGH, {'schedule_type': Schedule.MINUTES, 'minutes': 1}),
+            }
+            for func, (priority, timing) in schedules.items():
+                # Only schedule the task if the table exists
+                if not Schedule.objects.filter(func=func).exists():
+                    options = job_options(func, priority)
+                    schedule(func, cluster=options.pop('cluster'), q_options=options, **timing)
+            # Schedules created before the queues existed ran on the default queue.
+            maintenance = [func for func, (priority, _) in schedules.items() if priority == LOW]
+            Schedule.objects.filter(func__in=maintenance, cluster__isnull=True).update(cluster=PRIORITY_QUEUES[LOW])
         except (OperationalError, ProgrammingError, ImproperlyConfigured):
             # Skip if the database is not ready (e.g., during migrations)
             pass
@@ -0,0 +1,149 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from itertools import groupby
+from operator import itemgetter
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import ChatParticipant
+from .partitions import chat_message_rows
+
+# An archive is a pair of append-only files in CHAT_ARCHIVE_DIR:
+#   chats.dat  one zlib-compressed JSON block per archived chat
+#   chats.idx  one fixed-size record per block: chat id, offset and length in chats.dat
+# Blocks are written before their index record, so a crash can at worst leave an
+# unreferenced block or a torn trailing record, both of which readers ignore.
+# Archiving a chat again appends a new block; the latest record wins.
+DATA_FILE = 'chats.dat'
+INDEX_FILE = 'chats.idx'
+INDEX_RECORD = struct.Struct('<QQI')
+
+
+def archive_dir():
+    return getattr(settings, 'CHAT_ARCHIVE_DIR', settings.BASE_DIR / 'chat_archive')
+
+
+def encode_chat(chat, participant_ids, messages):
+    '''Serialize and compress a chat with its message rows from chat_message_rows().'''
+    block = {
+        'chat_id': chat.id,
+        'event_id': chat.event_id,
+        'event_title': chat.event.title,
+        'event_date': chat.event.date,
+        'participants': sorted(participant_ids),
+        'messages': [
+            {
+                'id': message_id,
+                'user_id': user_id,
+                'user': username,
+                'message': message,
+                'created_at': created_at,
+            }
+            for message_id, message, created_at, _, user_id, username in messages
+        ],
+    }
+    return zlib.compress(json.dumps(block, cls=DjangoJSONEncoder, separators=(',', ':')).encode(), 9)
+
+
+def archive_chats(chats):
+    '''
+    Append the given chats with their messages and participants to the archive.
+    There must be a single writer at a time (the scheduled purge task).
+    Returns the number of chats archived.
+    '''
+    chats = {chat.id: chat for chat in chats.select_related('event')}
+    if not chats:
+        return 0
+
+    participants = {}
+    for chat_id, user_id in ChatParticipant.objects.filter(chat_id__in=chats).values_list('chat_id', 'user_id'):
+        participants.setdefault(chat_id, set()).add(user_id)
+    # Messages are streamed ordered by chat, and each chat's block is written as its
+    # messages are read, so only one chat is held in memory at a time.
+    messages = chat_message_rows(sorted(chats), since=min(chat.created_at for chat in chats.values()))
+
+    directory = archive_dir()
+    os.makedirs(directory, exist_ok=True)
+    records, archived = [], set()
+    with open(os.path.join(directory, DATA_FILE), 'ab') as data:
+        def write(chat_id, rows):
+            block = encode_chat(chats[chat_id], participants.get(chat_id, ()), rows)
+            records.append(INDEX_RECORD.pack(chat_id, data.tell(), len(block)))
+            data.write(block)
+            archived.add(chat_id)
+
+        for chat_id, rows in groupby(messages, key=itemgetter(3)):
+            write(chat_id, rows)
+        for chat_id in sorted(chats.keys() - archived):
+            write(chat_id, ())
+        data.flush()
+        os.fsync(data.fileno())
+    with open(os.path.join(directory, INDEX_FILE), 'ab') as index:
+        index.write(b''.join(records))
+        index.flush()
+        os.fsync(index.fileno())
+    return len(records)
+
+
+class ChatArchive:
+    '''
+    Read access to the archive through memory maps; no database queries.
+    The index is loaded into a dict when the index file has grown since the last lookup.
+    '''
+
+    def __init__(self, directory=None):
+        self.directory = directory or archive_dir()
+        self._index_size = 0
+        self._offsets = {}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _refresh_index(self):
+        try:
+            size = os.path.getsize(self._path(INDEX_FILE))
+        except FileNotFoundError:
+            return
+        # Ignore a torn trailing record left by an interrupted write.
+        size -= size % INDEX_RECORD.size
+        if size == self._index_size:
+            return
+        with open(self._path(INDEX_FILE), 'rb') as index, mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for chat_id, offset, length in INDEX_RECORD.iter_unpack(view[self._index_size:size]):
+                self._offsets[chat_id] = (offset, length)
+        self._index_size = size
+
+    def __contains__(self, chat_id):
+        self._refresh_index()
+        return chat_id in self._offsets
+
+    def get(self, chat_id):
+        '''Return the archived chat as a dict, or None if the chat isn't archived.'''
+        self._refresh_index()
+        location = self._offsets.get(chat_id)
+        if location is None:
+            return None
+        offset, length = location
+        with open(self._path(DATA_FILE), 'rb') as data, mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            block = view[offset:offset + length]
+        return json.loads(zlib.decompress(block))
+
+    def history_for(self, chat_id, user_id):
+        '''Return the archived chat if the user took part in it, otherwise None.'''
+        chat = self.get(chat_id)
+        if chat is None or user_id not in chat['participants']:
+            return None
+        return chat
+
+
+_archives = {}
+
+
+def get_archive():
+    '''Return the process-wide reader for the configured archive directory.'''
+    directory = str(archive_dir())
+    if directory not in _archives:
+        _archives[directory] = ChatArchive(directory)
+    return _archives[directory]
@@ -0,0 +1,94 @@
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+# request.user is loaded from the shared cache, keyed by the user id in the session,
+# so authenticated requests (mostly chat polls) don't query the user table.
+# Cached users are dropped when they are saved and when the save commits (see signals.py), which covers
+# password changes, deactivation and logins; the timeout bounds anything else.
+#
+# The cache holds the user's fields without the password hash, and the session
+# auth hash derived from it. Users are rebuilt with the password deferred, so
+# saving one only writes the cached fields, and reading the password loads it.
+DEFAULT_AUTH_USER_CACHE_TIMEOUT = 60
+
+
+def user_cache_key(user_id):
+    return f'auth-user-fields:{user_id}'
+
+
+def cache_entry(user):
+    '''The cached form of a user: its fields except the password, and its session auth hash.'''
+    fields = {field.attname: getattr(user, field.attname) for field in user._meta.concrete_fields if field.attname != 'password'}
+    return {'fields': fields, 'session_auth_hash': user.get_session_auth_hash()}
+
+
+def cached_user(entry):
+    '''Build a user from its cache entry, with the password deferred.'''
+    model = get_user_model()
+    fields = entry['fields']
+    return model.from_db(router.db_for_read(model), list(fields), list(fields.values()))
+
+
+def get_cached_user(request):
+    '''
+    Return the session's user from the cache, falling back to Django's get_user(),
+    whose result is cached when it is an authenticated user.
+    The session hash is checked on every request, as get_user() does.
+    '''
+    try:
+        user_id = get_user_model()._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+
+    key = user_cache_key(user_id)
+    entry = cache.get(key)
+    if entry is not None and backend_path in settings.AUTHENTICATION_BACKENDS:
+        session_hash = request.session.get(HASH_SESSION_KEY)
+        if session_hash and constant_time_compare(session_hash, entry['session_auth_hash']):
+            return cached_user(entry)
+
+    # A miss, or a hash that only get_user() can settle (fallback secrets, flushing).
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, cache_entry(user), getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', DEFAULT_AUTH_USER_CACHE_TIMEOUT))
+    return user
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_cached_user(request)
+    return request._cached_user
+
+
+async def auser(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_cached_user)(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    '''AuthenticationMiddleware that resolves request.user through the user cache.'''
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(auser, request)
+
+
+def invalidate_user(user_id):
+    '''
+    Drop a cached user now and again when the current transaction commits, so a request
+    in between can't cache the user with the session hash from before the change.
+    '''
+    key = user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(partial(cache.delete, key))
@@ -0,0 +1,26 @@
+from datetime import timezone
+
+# Compact response format for the chat API: every list of records is sent as
+# columns (one array per field), users are sent once as an id -> username map and
+# timestamps are epoch milliseconds. Clients ask for it with ?format=compact or
+# by accepting COMPACT_MEDIA_TYPE.
+COMPACT_MEDIA_TYPE = 'application/vnd.evently.compact+json'
+
+
+def wants_compact(request):
+    return request.GET.get('format') == 'compact' or COMPACT_MEDIA_TYPE in request.headers.get('Accept', '')
+
+
+def epoch_ms(value):
+    '''Convert an aware datetime to epoch milliseconds, keeping None.'''
+    if value is None:
+        return None
+    return round(value.astimezone(timezone.utc).timestamp() * 1000)
+
+
+def columns(names, rows):
+    '''Turn row tuples into a dict of columns keyed by the given names.'''
+    rows = list(rows)
+    if not rows:
+        return {name: [] for name in names}
+    return dict(zip(names, map(list, zip(*rows))))
@@ -2,7 +2,9 @@ from .models import RSVP
 
 def maybe_rsvp_count(request):
     if request.user.is_authenticated:
+        # Templates call the count when they render it, so views that pass
+        # their own maybe_count (or pages that don't show it) skip the query.
         return {
-            'maybe_count': RSVP.objects.filter(user=request.user, status='MAYBE').count()
+            'maybe_count': RSVP.objects.filter(user=request.user, status='MAYBE', event__deleted_at__isnull=True).count
         }
     return {}
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+# Usernames by user id, for pages and payloads that only print who did something.
+# Each process keeps a bounded LRU of recent names; misses go to the shared cache
+# (when enabled) and then to the database, in one query for a whole list of ids.
+# Entries are dropped on User save/delete (see signals.py); the TTL bounds how long
+# other processes can show an old name.
+DEFAULT_USER_DIRECTORY = {
+    'max_size': 10000,
+    'ttl': 300,
+    'shared': True,
+    'shared_timeout': 3600,
+}
+
+
+def user_directory_settings():
+    return {**DEFAULT_USER_DIRECTORY, **getattr(settings, 'USER_DIRECTORY', {})}
+
+
+def shared_key(user_id):
+    return f'user-name:{user_id}'
+
+
+class DisplayNameCache:
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, user_ids):
+        '''Return a dict of user id -> username for the given ids, skipping unknown users.'''
+        config = user_directory_settings()
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        current = time.monotonic()
+        names = {}
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry and entry[1] > current:
+                    self._entries.move_to_end(user_id)
+                    names[user_id] = entry[0]
+
+        missing = user_ids - names.keys()
+        fetched = {}
+        if missing and config['shared']:
+            shared = cache.get_many([shared_key(user_id) for user_id in missing])
+            fetched.update((user_id, shared[shared_key(user_id)]) for user_id in missing if shared_key(user_id) in shared)
+            missing -= fetched.keys()
+        if missing:
+            loaded = dict(User.objects.filter(id__in=missing).values_list('id', 'username'))
+            if loaded and config['shared']:
+                cache.set_many({shared_key(user_id): name for user_id, name in loaded.items()}, config['shared_timeout'])
+            fetched.update(loaded)
+
+        if fetched:
+            expires = current + config['ttl']
+            with self._lock:
+                for user_id, name in fetched.items():
+                    self._entries[user_id] = (name, expires)
+                    self._entries.move_to_end(user_id)
+                while len(self._entries) > config['max_size']:
+                    self._entries.popitem(last=False)
+        names.update(fetched)
+        return names
+
+    def get(self, user_id):
+        '''Return the username of a user, or None.'''
+        return self.get_many([user_id]).get(user_id)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if user_directory_settings()['shared']:
+            cache.delete(shared_key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+display_names = DisplayNameCache()
@@ -0,0 +1,29 @@
+from django.db.models import Count, Q
+from django.shortcuts import get_object_or_404
+from .models import Event
+
+# The part of an event page that is the same for every viewer, cached through
+# singleflight.get_or_compute() for EVENT_PAGE_TIMEOUT seconds. Changes to the event,
+# its RSVPs and tasks drop it sooner (see signals.py).
+EVENT_PAGE_TIMEOUT = 60
+
+
+def event_page_key(pk):
+    return f'event-page:{pk}'
+
+
+def load_event_page(pk):
+    '''Load the data of an event page that is the same for every viewer.'''
+    event = get_object_or_404(
+        Event.objects.annotate(
+            num_rsvps=Count('rsvps'),
+            num_attendees=Count('rsvps', filter=Q(rsvps__status='YES')),
+            num_waitlisted=Count('rsvps', filter=Q(rsvps__status='WAIT')),
+        ),
+        pk=pk,
+    )
+    return {
+        'event': event,
+        'tasks': list(event.task_set.all()),
+        'attendees_count': event.num_attendees,
+    }
@@ -58,16 +58,25 @@ class CustomSetPasswordForm(SetPasswordForm):
 class EventForm(forms.ModelForm):
     class Meta:
         model = Event
-        fields = ['title', 'date', 'location', 'description']
+        fields = ['title', 'date', 'location', 'description', 'capacity']
         widgets = {
             'date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
         }
+        help_texts = {
+            'capacity': "Leave empty for no limit. Responses beyond it join a waitlist.",
+        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['location'].required = False
         self.fields['description'].required = False
 
+class EventSearchForm(forms.Form):
+    q = forms.CharField(max_length=200, required=False, label="Search")
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}), label="From")
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}), label="To")
+    status = forms.ChoiceField(choices=[('', 'Any status')] + Event.STATUS_CHOICES, required=False)
+
 class RSVPForm(forms.ModelForm):
     class Meta:
         model = RSVP
@@ -0,0 +1,280 @@
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections
+
+# Statements worth recording; schema changes, PRAGMAs and savepoints are noise.
+RECORDED_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'IN \((?:\s*\?\s*,)*\s*\?\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+_TABLE_ALIAS_RE = re.compile(r'"(\w+)"(?:\s+AS)?\s+(T\d+)\b')
+_WRITE_TABLE_RE = re.compile(r'^(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"(\w+)"', re.IGNORECASE)
+_PLAN_TABLE_RE = re.compile(r'^(SCAN|SEARCH) (\w+)')
+_PLAN_INDEX_RE = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+_PREDICATE_RE = re.compile(r'(?:"(\w+)"|(T\d+))\."(\w+)"\s*(?:=|IN\b|IS\b|>|<)')
+_ORDER_BY_RE = re.compile(r'ORDER BY (.+?)(?: LIMIT | OFFSET |$)')
+_ORDER_COLUMN_RE = re.compile(r'(?:"(\w+)"|(T\d+))\."(\w+)"')
+
+
+def fingerprint(sql):
+    '''Normalize a SQL statement so queries differing only in literals share one key.'''
+    sql = sql.replace('%s', '?')
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _SPACE_RE.sub(' ', sql).strip()
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    '''
+    Database execute wrapper that counts statements by fingerprint.
+    One sample statement with its parameters is kept per fingerprint so the
+    query plan can be reproduced later.
+    '''
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(sql, params, many, time.perf_counter() - start)
+
+    def add(self, sql, params, many=False, duration=0.0, count=1):
+        if not sql.lstrip().upper().startswith(RECORDED_STATEMENTS):
+            return
+        if many:
+            params = next(iter(params), None) if params else None
+        key = fingerprint(sql)
+        with self._lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = {
+                    'fingerprint': key,
+                    'sql': sql,
+                    'params': list(params) if params else [],
+                    'count': 0,
+                    'duration': 0.0,
+                }
+            sample['count'] += count
+            sample['duration'] += duration
+
+    def merge(self, samples):
+        for sample in samples:
+            self.add(sample['sql'], sample['params'], duration=sample['duration'], count=sample['count'])
+
+    def dump(self, path):
+        '''Append the recorded samples to a JSON-lines log and reset the recorder.'''
+        with self._lock:
+            samples, self.samples = list(self.samples.values()), {}
+        if not samples:
+            return
+        with _log_lock, open(path, 'a', encoding='utf-8') as log:
+            for sample in samples:
+                log.write(json.dumps(sample, default=str) + '\n')
+
+
+_log_lock = threading.Lock()
+
+
+@contextmanager
+def recording(using='default'):
+    '''Record every statement executed on the given connection inside the block.'''
+    recorder = QueryRecorder()
+    with connections[using].execute_wrapper(recorder):
+        yield recorder
+
+
+def load_log(path):
+    '''Read a fingerprint log written by QueryFingerprintMiddleware into a recorder.'''
+    recorder = QueryRecorder()
+    with open(path, encoding='utf-8') as log:
+        recorder.merge(json.loads(line) for line in log if line.strip())
+    return recorder
+
+
+class QueryFingerprintMiddleware:
+    '''
+    Record the query fingerprints of every request to settings.INDEX_ADVISOR_LOG.
+    Only enabled when the setting is defined, as the logging itself adds overhead.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.log_path = settings.INDEX_ADVISOR_LOG
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connections['default'].execute_wrapper(recorder):
+            response = self.get_response(request)
+        recorder.dump(self.log_path)
+        return response
+
+
+def table_indexes(cursor, table):
+    '''Return the indexes SQLite maintains for a table with their columns and origin.'''
+    indexes = []
+    for _, name, unique, origin, partial in cursor.execute(f'PRAGMA index_list("{table}")').fetchall():
+        columns = [row[2] for row in cursor.execute(f'PRAGMA index_info("{name}")').fetchall()]
+        indexes.append({
+            'table': table,
+            'name': name,
+            'columns': columns,
+            'unique': bool(unique),
+            # 'c' is CREATE INDEX, 'u' a UNIQUE constraint and 'pk' a primary key.
+            'origin': origin,
+            'partial': bool(partial),
+        })
+    return indexes
+
+
+def explain(cursor, sql, params):
+    '''Return the EXPLAIN QUERY PLAN detail lines for a statement.'''
+    return [row[3] for row in cursor.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+
+
+def _aliases(sql):
+    return {alias: table for table, alias in _TABLE_ALIAS_RE.findall(sql)}
+
+
+def _columns_by_table(pattern, text, aliases):
+    columns = defaultdict(list)
+    for table, alias, column in pattern.findall(text):
+        table = table or aliases.get(alias)
+        if table and column not in columns[table]:
+            columns[table].append(column)
+    return columns
+
+
+def suggest_index(sql, table, aliases):
+    '''Build a candidate index for a table: equality/range predicates first, then ORDER BY columns.'''
+    where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+    where = _ORDER_BY_RE.split(where)[0]
+    columns = _columns_by_table(_PREDICATE_RE, where, aliases).get(table, [])
+    order_by = _ORDER_BY_RE.search(sql)
+    if order_by:
+        for column in _columns_by_table(_ORDER_COLUMN_RE, order_by.group(1), aliases).get(table, []):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def _is_prefix(columns, other):
+    return len(columns) <= len(other) and other[:len(columns)] == columns
+
+
+def analyze(recorder, using='default', tables=None):
+    '''
+    Map recorded fingerprints to the indexes SQLite uses and report unused,
+    redundant and missing indexes with their estimated read and write impact.
+    '''
+    connection = connections[using]
+    reads = defaultdict(int)    # index name -> executions it served
+    writes = defaultdict(int)   # table -> INSERT/UPDATE/DELETE executions
+    seen_tables = set(tables or [])
+    missing = {}
+
+    with connection.cursor() as cursor:
+        for sample in recorder.samples.values():
+            sql, count = sample['sql'], sample['count']
+            write = _WRITE_TABLE_RE.match(sql.lstrip())
+            if write:
+                writes[write.group(1)] += count
+                seen_tables.add(write.group(1))
+                if not sql.lstrip().upper().startswith(('UPDATE', 'DELETE')):
+                    continue
+            try:
+                plan = explain(cursor, sql, sample['params'])
+            except Exception:
+                # Statements whose sample parameters no longer apply cannot be explained.
+                continue
+
+            aliases = _aliases(sql)
+            current_table = None
+            for detail in plan:
+                match = _PLAN_TABLE_RE.match(detail)
+                if match:
+                    current_table = aliases.get(match.group(2), match.group(2))
+                    seen_tables.add(current_table)
+                index = _PLAN_INDEX_RE.search(detail)
+                if index and 'AUTOMATIC' not in detail:
+                    reads[index.group(1)] += count
+
+                needs_index = (
+                    (match and match.group(1) == 'SCAN' and not index)
+                    or 'AUTOMATIC' in detail
+                    or 'TEMP B-TREE FOR ORDER BY' in detail
+                )
+                if needs_index and current_table:
+                    columns = suggest_index(sql, current_table, aliases)
+                    if columns:
+                        key = (current_table, tuple(columns))
+                        entry = missing.setdefault(key, {
+                            'table': current_table,
+                            'columns': columns,
+                            'reads': 0,
+                            'fingerprints': [],
+                        })
+                        entry['reads'] += count
+                        if sample['fingerprint'] not in entry['fingerprints']:
+                            entry['fingerprints'].append(sample['fingerprint'])
+
+        indexes = []
+        for table in sorted(seen_tables):
+            indexes.extend(table_indexes(cursor, table))
+
+    by_table = defaultdict(list)
+    for index in indexes:
+        index['reads'] = reads.get(index['name'], 0)
+        index['writes'] = writes.get(index['table'], 0)
+        by_table[index['table']].append(index)
+
+    unused, redundant = [], []
+    for table, table_idx in by_table.items():
+        for index in table_idx:
+            # Unique indexes enforce constraints and are never candidates for removal.
+            if index['unique']:
+                continue
+            covering = next((
+                other for other in table_idx
+                if other is not index
+                and _is_prefix(index['columns'], other['columns'])
+                and (len(other['columns']) > len(index['columns']) or other['unique'] or other['name'] < index['name'])
+            ), None)
+            if covering:
+                redundant.append(dict(index, covered_by=covering['name']))
+            elif index['reads'] == 0:
+                unused.append(index)
+
+    existing = {(index['table'], tuple(index['columns'])) for index in indexes}
+    suggestions = [
+        entry for key, entry in missing.items()
+        if not any(table == key[0] and _is_prefix(list(key[1]), list(columns)) for table, columns in existing)
+    ]
+
+    # Every write touches the table b-tree plus one b-tree per index, so dropping
+    # an index saves one b-tree write out of (1 + number of indexes) per statement.
+    for entry in unused + redundant:
+        entry['write_saving'] = round(1 / (1 + len(by_table[entry['table']])), 3)
+    for entry in suggestions:
+        entry['writes'] = writes.get(entry['table'], 0)
+        entry['write_cost'] = round(1 / (1 + len(by_table[entry['table']])), 3)
+
+    return {
+        'indexes': indexes,
+        'unused': sorted(unused, key=lambda entry: -entry['writes']),
+        'redundant': sorted(redundant, key=lambda entry: -entry['writes']),
+        'missing': sorted(suggestions, key=lambda entry: -entry['reads']),
+        'writes': dict(writes),
+    }
@@ -0,0 +1,157 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from .models import Chat, ChatParticipant, Message
+
+# Messages are written behind the request: the view checks membership against the
+# cache and hands the message to a writer thread, which commits everything queued
+# within `max_delay` seconds (up to `max_batch` messages) in a single transaction.
+# The client is answered once the transaction holding its message has committed.
+# With 'sync' the message is written in the request instead, like the task queue's sync mode.
+DEFAULT_CHAT_INGEST = {
+    'sync': False,
+    'max_batch': 200,
+    'max_delay': 0.005,
+    'members_timeout': 300,
+}
+
+
+def chat_ingest_settings():
+    return {**DEFAULT_CHAT_INGEST, **getattr(settings, 'CHAT_INGEST', {})}
+
+
+def members_cache_key(chat_id):
+    return f'chat-members:{chat_id}'
+
+
+async def ais_chat_member(chat_id, user_id):
+    '''Check chat membership from the cache, loading the chat's members on a miss.'''
+    key = members_cache_key(chat_id)
+    members = await cache.aget(key)
+    if members is None:
+        participants = ChatParticipant.objects.filter(
+            chat_id=chat_id, chat__event__deleted_at__isnull=True
+        ).values_list('user_id', flat=True)
+        members = {member_id async for member_id in participants}
+        await cache.aset(key, members, timeout=chat_ingest_settings()['members_timeout'])
+    return user_id in members
+
+
+def write_messages(messages):
+    '''
+    Insert a batch of messages and update the summaries and authors' read receipts
+    of their chats in one transaction. Returns the messages with their ids set.
+    '''
+    with transaction.atomic():
+        Message.objects.bulk_create(messages)
+        by_chat = {}
+        for message in sorted(messages, key=lambda msg: msg.id):
+            by_chat.setdefault(message.chat_id, []).append(message)
+        # The insert holds the write lock, so these counts are from just before the batch.
+        counts = dict(Chat.objects.filter(pk__in=by_chat).values_list('id', 'message_count'))
+
+        for chat_id, chat_messages in by_chat.items():
+            Chat.objects.filter(pk=chat_id).update(**Chat.summary_update(chat_messages))
+            # Posting marks the chat as read for the author, up to their newest message.
+            newest = {msg.user_id: (position, msg) for position, msg in enumerate(chat_messages, 1)}
+            for user_id, (position, message) in newest.items():
+                ChatParticipant.objects.filter(
+                    chat_id=chat_id, user_id=user_id, last_read_message_id__lt=message.id
+                ).update(last_read_message_id=message.id, read_message_count=counts[chat_id] + position)
+    return messages
+
+
+class MessageWriter:
+    '''
+    Group commit of chat messages from a background thread.
+    Messages still queued when the process exits are lost; their clients were never
+    acknowledged and can retry.
+    '''
+
+    _STOP = object()
+
+    def __init__(self, max_batch=None, max_delay=None):
+        config = chat_ingest_settings()
+        self.max_batch = max_batch or config['max_batch']
+        self.max_delay = max_delay if max_delay is not None else config['max_delay']
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, message):
+        '''Queue an unsaved message; the returned future resolves once it is committed.'''
+        future = Future()
+        self._queue.put((message, future))
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='chat-message-writer', daemon=True)
+                    self._thread.start()
+        return future
+
+    def stop(self):
+        '''Commit what is queued and stop the writer thread.'''
+        if self._thread is not None:
+            self._queue.put((self._STOP, None))
+            self._thread.join()
+            self._thread = None
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch and batch[-1][0] is not self._STOP:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._collect()
+                stopping = batch[-1][0] is self._STOP
+                if stopping:
+                    batch.pop()
+                if batch:
+                    self._commit(batch)
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+    def _commit(self, batch):
+        try:
+            write_messages([message for message, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0][1].set_exception(exc)
+                return
+            # One bad message (e.g. for a chat deleted meanwhile) must not fail the others.
+            for message, future in batch:
+                message.pk = None
+                self._commit([(message, future)])
+            return
+        for message, future in batch:
+            future.set_result(message)
+
+
+writer = MessageWriter()
+
+
+async def ingest_message(chat_id, user_id, text):
+    '''Save a chat message through the write-behind writer and return it once committed.'''
+    message = Message(chat_id=chat_id, user_id=user_id, message=text)
+    if chat_ingest_settings()['sync']:
+        await sync_to_async(write_messages)([message])
+        return message
+    return await asyncio.wrap_future(writer.submit(message))
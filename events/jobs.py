@@ -0,0 +1,91 @@
+from multiprocessing import Value
+from django.conf import settings
+from django_q.brokers import get_broker
+from django_q.conf import Conf
+from django_q.monitor import monitor
+from django_q.queues import Queue
+from django_q.signing import SignedPackage
+from django_q.tasks import async_task
+from django_q.worker import worker
+
+# Background work goes through django-q's ORM broker to worker processes, so requests
+# don't wait for it. Tasks are queued with enqueue() in the request transaction and
+# become visible to the workers when it commits (or vanish if it rolls back).
+#
+# Priorities are queues served by their own workers (see Q_CLUSTER in settings):
+#   HIGH  the default queue, for work users expect to happen in seconds: invitation side
+#         effects and email. Start it with `python manage.py qcluster`.
+#   LOW   the `maintenance` queue, for scheduled jobs that may run for minutes (purges,
+#         archiving, partition rotation, digests), so they never hold up HIGH tasks.
+#         Start it with `python manage.py qcluster --name maintenance`.
+#
+# Each job runs under a timeout (JOB_TIMEOUTS, falling back to the queue's `timeout`),
+# after which its worker is killed. Tasks that fail or time out are retried `retry`
+# seconds later, so every job must be safe to run again, and a queue's `retry` must
+# exceed the timeouts of its jobs.
+#
+# run_queued() runs queued tasks in the current process through django-q's own worker
+# and monitor, for tests and local development without a cluster.
+HIGH = 'high'
+LOW = 'low'
+PRIORITY_QUEUES = {
+    HIGH: None,  # The cluster named by Q_CLUSTER['name'].
+    LOW: 'maintenance',
+}
+DEFAULT_JOB_TIMEOUTS = {
+    'events.purge.purge_event': 600,
+    'events.tasks.purge_deleted_events': 1500,
+    'events.tasks.delete_old_events': 1500,
+    'events.tasks.rotate_message_partition': 1500,
+    'events.tasks.update_event_status': 300,
+    'events.tasks.send_event_reminders': 1500,
+    'events.tasks.send_daily_digests': 1500,
+    'events.tasks.delete_old_emails': 1500,
+}
+
+
+def job_timeouts():
+    return {**DEFAULT_JOB_TIMEOUTS, **getattr(settings, 'JOB_TIMEOUTS', {})}
+
+
+def queue_name(priority):
+    return PRIORITY_QUEUES[priority] or Conf.PREFIX
+
+
+def job_options(func, priority):
+    '''The django-q options of a job: its queue and, when it has one, its timeout.'''
+    options = {'cluster': PRIORITY_QUEUES[priority]}
+    timeout = job_timeouts().get(func)
+    if timeout is not None:
+        options['timeout'] = timeout
+    return options
+
+
+def enqueue(func, *args, priority=HIGH, **kwargs):
+    '''Queue a call of `func` (a dotted path) for the workers of a priority. Returns the task id.'''
+    return async_task(func, *args, q_options=job_options(func, priority), **kwargs)
+
+
+def run_queued(priority=HIGH):
+    '''
+    Run the tasks waiting in a priority's queue in this process, as a worker would:
+    with their timeouts, saving their results and acknowledging them. Tasks queued
+    meanwhile are run too. Returns the number of tasks run.
+    '''
+    broker = get_broker(queue_name(priority))
+    count = 0
+    while broker.queue_size():
+        task_queue, result_queue = Queue(), Queue()
+        for ack_id, payload in broker.dequeue() or []:
+            task = SignedPackage.loads(payload)
+            task['ack_id'] = ack_id
+            task_queue.put(task)
+            count += 1
+        task_queue.put('STOP')
+        worker(task_queue, result_queue, Value('f', -1))
+        result_queue.put('STOP')
+        monitor(result_queue, broker)
+        for queue in (task_queue, result_queue):
+            queue.close()
+            queue.join_thread()
+    return count
@@ -0,0 +1,207 @@
+import logging
+import random
+import smtplib
+from datetime import timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.utils.timezone import now
+from .jobs import enqueue
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Outbound email goes through a queue in the database, so requests never wait for a
+# mail server. With EMAIL_BACKEND set to QueuedEmailBackend, everything that sends mail
+# (send_mail(), password reset emails) stores OutboundEmail rows in the request
+# transaction and queues send_queued_email() for the workers.
+#
+# send_queued_email() claims a batch of due emails with one UPDATE ... RETURNING that
+# moves their next attempt `claim_timeout` seconds ahead, so concurrent runs skip them,
+# and sends the batch through the delivery backend (OUTBOUND_EMAIL['backend']) over one
+# connection. A full batch queues another run. Emails the server rejects for good (5xx)
+# fail at once; other errors are retried with exponential backoff and jitter, up to
+# `max_attempts`. An email claimed by a worker that died becomes due again when its
+# claim runs out, so delivery is at least once. A scheduled run every minute sends the
+# retries that come due.
+#
+# queue_emails() adds generated emails (invitations, reminders, digests) in chunks.
+# Emails with a dedupe_key that is already queued are skipped, so generating them
+# again is harmless.
+#
+# prune_outbound_email() deletes sent and failed emails `retention_days` after their
+# last attempt, in batches. The retention must outlast the dedupe keys' purpose: a
+# reminder's key matters until its event starts, a digest's for the rest of its day.
+DEFAULT_OUTBOUND_EMAIL = {
+    'backend': 'django.core.mail.backends.smtp.EmailBackend',
+    'batch_size': 100,
+    'max_attempts': 5,
+    'retry_delay': 60,  # Seconds before the first retry, doubled for each one after it
+    'max_retry_delay': 3600,
+    'claim_timeout': 300,
+    'retention_days': 7,
+}
+PRUNE_BATCH_SIZE = 1000
+
+_CLAIM_SQL = '''
+    UPDATE {table} SET next_attempt_at = %s, attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM {table} WHERE status = %s AND next_attempt_at <= %s ORDER BY next_attempt_at, id LIMIT %s
+    ) AND status = %s AND next_attempt_at <= %s
+    RETURNING id
+'''
+
+_PRUNE_SQL = '''
+    DELETE FROM {table} WHERE id IN (
+        SELECT id FROM {table} WHERE status IN (%s, %s) AND next_attempt_at < %s LIMIT %s
+    )
+'''
+
+
+def outbound_email_settings():
+    return {**DEFAULT_OUTBOUND_EMAIL, **getattr(settings, 'OUTBOUND_EMAIL', {})}
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    '''An email backend that adds the messages to the outbound queue instead of sending them.'''
+
+    def send_messages(self, email_messages):
+        emails = [queued_email(message) for message in email_messages]
+        if not emails:
+            return 0
+        with transaction.atomic():
+            OutboundEmail.objects.bulk_create(emails)
+            enqueue('events.mail.send_queued_email')
+        return len(emails)
+
+
+def queue_emails(emails, chunk_size=500):
+    '''
+    Add unsaved OutboundEmails from an iterable to the queue, `chunk_size` at a time, each
+    chunk committed on its own. Emails whose dedupe_key is already queued are skipped.
+    '''
+    emails = iter(emails)
+    queued = False
+    while chunk := list(islice(emails, chunk_size)):
+        with transaction.atomic():
+            OutboundEmail.objects.bulk_create(chunk, ignore_conflicts=True)
+        queued = True
+    if queued:
+        enqueue('events.mail.send_queued_email')
+
+
+def queued_email(message):
+    '''Turn an EmailMessage into an unsaved OutboundEmail.'''
+    alternatives = getattr(message, 'alternatives', [])
+    if message.cc or message.bcc or message.attachments or any(mimetype != 'text/html' for _, mimetype in alternatives):
+        raise ValueError("The outbound email queue doesn't support cc, bcc, attachments or non-HTML alternatives.")
+    headers = dict(message.extra_headers)
+    if message.reply_to:
+        headers.setdefault('Reply-To', ', '.join(message.reply_to))
+    return OutboundEmail(
+        subject=message.subject,
+        body=message.body,
+        html_body=next((content for content, _ in alternatives), ''),
+        from_email=message.from_email,
+        to=list(message.to),
+        headers=headers,
+    )
+
+
+def email_message(email):
+    '''Build the EmailMessage to send for a queued email.'''
+    message = EmailMultiAlternatives(email.subject, email.body, email.from_email, email.to, headers=email.headers)
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def claim_due_emails(batch_size, claim_timeout):
+    '''Claim up to `batch_size` queued emails that are due, oldest first, and return them.'''
+    table = connection.ops.quote_name(OutboundEmail._meta.db_table)
+    current = now()
+    due = connection.ops.adapt_datetimefield_value(current)
+    params = [
+        connection.ops.adapt_datetimefield_value(current + timedelta(seconds=claim_timeout)),
+        OutboundEmail.QUEUED, due, batch_size, OutboundEmail.QUEUED, due,
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(_CLAIM_SQL.format(table=table), params)
+        ids = [row[0] for row in cursor.fetchall()]
+    emails = OutboundEmail.objects.in_bulk(ids)
+    return [emails[pk] for pk in sorted(ids)]
+
+
+def is_permanent(exc):
+    '''Whether a send failure is a rejection that retrying won't change (a 5xx SMTP reply).'''
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def retry_delay(attempts, config):
+    '''Seconds to wait before the next attempt, after `attempts` failed ones.'''
+    delay = min(config['retry_delay'] * 2 ** (attempts - 1), config['max_retry_delay'])
+    # Jitter spreads the retries of emails that failed together.
+    return delay * random.uniform(0.5, 1)
+
+
+def send_queued_email():
+    '''Send a batch of due emails over one connection of the delivery backend. Returns the number sent.'''
+    config = outbound_email_settings()
+    emails = claim_due_emails(config['batch_size'], config['claim_timeout'])
+    if not emails:
+        return 0
+
+    sent, failures = [], {}
+    backend = get_connection(config['backend'])
+    try:
+        for position, email in enumerate(emails):
+            try:
+                # Opens a connection for the first email and again after a failure closed it.
+                backend.open()
+            except Exception as exc:
+                # The server can't be reached; don't try the rest of the batch.
+                failures.update({pending: exc for pending in emails[position:]})
+                break
+            try:
+                backend.send_messages([email_message(email)])
+            except Exception as exc:
+                failures[email] = exc
+                backend.close()
+            else:
+                sent.append(email.pk)
+    finally:
+        backend.close()
+
+    current = now()
+    OutboundEmail.objects.filter(pk__in=sent).update(status=OutboundEmail.SENT, sent_at=current, last_error='')
+    for email, exc in failures.items():
+        error = f'{type(exc).__name__}: {exc}'
+        if is_permanent(exc) or email.attempts >= config['max_attempts']:
+            logger.warning('Giving up on email %s after %s attempts: %s', email.pk, email.attempts, error)
+            OutboundEmail.objects.filter(pk=email.pk).update(status=OutboundEmail.FAILED, last_error=error)
+        else:
+            next_attempt_at = current + timedelta(seconds=retry_delay(email.attempts, config))
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=next_attempt_at, last_error=error)
+
+    if len(emails) == config['batch_size']:
+        enqueue('events.mail.send_queued_email')
+    return len(sent)
+
+
+def prune_outbound_email(batch_size=PRUNE_BATCH_SIZE):
+    '''Delete the sent and failed emails past their retention, committing every batch. Returns the number deleted.'''
+    config = outbound_email_settings()
+    table = connection.ops.quote_name(OutboundEmail._meta.db_table)
+    cutoff = connection.ops.adapt_datetimefield_value(now() - timedelta(days=config['retention_days']))
+    deleted = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(_PRUNE_SQL.format(table=table), [OutboundEmail.SENT, OutboundEmail.FAILED, cutoff, batch_size])
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,59 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...index_advisor import analyze, load_log
+
+
+class Command(BaseCommand):
+    help = 'Report unused, redundant and missing indexes for a recorded query workload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=getattr(settings, 'INDEX_ADVISOR_LOG', None),
+            help='Fingerprint log written by QueryFingerprintMiddleware (defaults to INDEX_ADVISOR_LOG).',
+        )
+        parser.add_argument('--database', default='default', help='Database alias to explain queries against.')
+        parser.add_argument('--table', action='append', dest='tables', help='Always report indexes of this table.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        if not options['log']:
+            raise CommandError('No fingerprint log given. Pass --log or set INDEX_ADVISOR_LOG.')
+        try:
+            recorder = load_log(options['log'])
+        except FileNotFoundError:
+            raise CommandError(f"Fingerprint log {options['log']} does not exist.")
+
+        report = analyze(recorder, using=options['database'], tables=options['tables'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f'{len(recorder.samples)} query fingerprints, '
+                          f'{sum(sample["count"] for sample in recorder.samples.values())} executions.\n')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Redundant indexes'))
+        for index in report['redundant']:
+            self.stdout.write(
+                f"  {index['name']} ({index['table']}: {', '.join(index['columns'])}) is covered by "
+                f"{index['covered_by']}; dropping it saves {index['write_saving']:.0%} of the b-tree writes "
+                f"of {index['writes']} write statements."
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Unused indexes'))
+        for index in report['unused']:
+            self.stdout.write(
+                f"  {index['name']} ({index['table']}: {', '.join(index['columns'])}) served no query; "
+                f"dropping it saves {index['write_saving']:.0%} of the b-tree writes "
+                f"of {index['writes']} write statements."
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Missing indexes'))
+        for entry in report['missing']:
+            self.stdout.write(
+                f"  {entry['table']} ({', '.join(entry['columns'])}) would serve {entry['reads']} executions "
+                f"that scan or sort today, at {entry['write_cost']:.0%} extra b-tree writes "
+                f"for {entry['writes']} write statements."
+            )
+            for fingerprint in entry['fingerprints']:
+                self.stdout.write(f'      {fingerprint[:160]}')
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_chatparticipant_unique_chat_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='last_read_message_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Substr
+
+
+def backfill_chat_summaries(apps, schema_editor):
+    '''Compute the summary of existing chats and the read counters of their participants.'''
+    Chat = apps.get_model('events', 'Chat')
+    ChatParticipant = apps.get_model('events', 'ChatParticipant')
+    Message = apps.get_model('events', 'Message')
+
+    messages = Message.objects.filter(chat=OuterRef('pk'))
+    last_message = messages.order_by('-id')
+    Chat.objects.update(
+        message_count=Coalesce(
+            Subquery(messages.values('chat').annotate(count=Count('id')).values('count')), 0
+        ),
+        last_message_id=Subquery(last_message.values('id')[:1]),
+        last_message_preview=Coalesce(Substr(Subquery(last_message.values('message')[:1]), 1, 100), models.Value('')),
+        last_activity_at=Subquery(last_message.values('created_at')[:1]),
+    )
+
+    read_messages = Message.objects.filter(chat=OuterRef('chat'), id__lte=OuterRef('last_read_message_id'))
+    ChatParticipant.objects.update(
+        read_message_count=Coalesce(
+            Subquery(read_messages.values('chat').annotate(count=Count('id')).values('count')), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_chatparticipant_last_read_message_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='read_message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_chat_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:20
+
+from django.db import migrations
+
+# Full-text index of chat messages. The `chat` column holds one token per message
+# ('c<chat id>') so searches are scoped to a user's chats inside the FTS index itself.
+# It stores its own copy of the text so results and snippets never read events_message.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE events_message_fts USING fts5(
+        message, chat, user_id UNINDEXED, created_at UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO events_message_fts(rowid, message, chat, user_id, created_at)
+    SELECT id, message, 'c' || chat_id, user_id, created_at FROM events_message
+    """,
+    """
+    CREATE TRIGGER events_message_fts_insert AFTER INSERT ON events_message BEGIN
+        INSERT INTO events_message_fts(rowid, message, chat, user_id, created_at)
+        VALUES (new.id, new.message, 'c' || new.chat_id, new.user_id, new.created_at);
+    END
+    """,
+    """
+    CREATE TRIGGER events_message_fts_delete AFTER DELETE ON events_message BEGIN
+        DELETE FROM events_message_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER events_message_fts_update AFTER UPDATE OF message ON events_message BEGIN
+        UPDATE events_message_fts SET message = new.message WHERE rowid = new.id;
+    END
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS events_message_fts_update',
+    'DROP TRIGGER IF EXISTS events_message_fts_delete',
+    'DROP TRIGGER IF EXISTS events_message_fts_insert',
+    'DROP TABLE IF EXISTS events_message_fts',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite specific.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_chat_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SQL), run_sqlite(DROP_SQL)),
+    ]
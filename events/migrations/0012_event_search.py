@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:40
+
+from django.db import migrations
+
+# Full-text index of events, keyed by event id. It is maintained from the
+# Event post_save/post_delete signals (see events/signals.py).
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE events_event_fts USING fts5(
+        title, description, location,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO events_event_fts(rowid, title, description, location)
+    SELECT id, title, description, location FROM events_event
+    """,
+]
+
+DROP_SQL = [
+    'DROP TABLE IF EXISTS events_event_fts',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite specific.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_message_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SQL), run_sqlite(DROP_SQL)),
+    ]
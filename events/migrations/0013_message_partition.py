@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_event_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessagePartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=63, unique=True)),
+                ('min_id', models.BigIntegerField()),
+                ('max_id', models.BigIntegerField()),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['min_id'],
+            },
+        ),
+    ]
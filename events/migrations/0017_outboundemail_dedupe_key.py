@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0016_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='dedupe_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Subquery, Value, When
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.contrib.auth.models import User
 from datetime import timedelta
@@ -9,6 +11,11 @@ def get_default_user():
     except User.DoesNotExist:
         return None
 
+class VisibleEventManager(models.Manager):
+    """Events that haven't been deleted. Deleted events are hidden until purge_event() removes their rows."""
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 class Event(models.Model):
     STATUS_CHOICES = [
         ('ACTIVE', 'Active'),
@@ -21,6 +28,15 @@ class Event(models.Model):
     location = models.CharField(max_length=255)
     created_by  = models.ForeignKey(User, on_delete=models.CASCADE, related_name="created_events", default=get_default_user)
     status = models.CharField(max_length=8, choices=STATUS_CHOICES, default='ACTIVE')
+    # Optional limit on YES responses; responses beyond it join the waitlist (see rsvps.py).
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    # YES responses counted by conditional updates while the event has a capacity.
+    confirmed_count = models.PositiveIntegerField(default=0)
+    # Set when the organizer deletes the event; its rows are deleted later in batches (see purge.py).
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = VisibleEventManager()
+    all_objects = models.Manager()
 
     def attendees_count(self):
         return self.rsvps.filter(status='YES').count()
@@ -48,12 +64,15 @@ class RSVP(models.Model):
         ('YES', 'Yes'),
         ('NO', 'No'),
         ('MAYBE', 'Maybe'),
+        ('WAIT', 'Waitlisted'),
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="rsvps")
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="rsvps")
     status = models.CharField(max_length=5, choices=RSVP_CHOICES, default='MAYBE')
     timestamp = models.DateTimeField(auto_now_add=True)
+    # When the user joined the waitlist of a full event, for promotion order.
+    waitlisted_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [
@@ -80,12 +99,56 @@ class Task(models.Model):
         return self.description
     
 class Chat(models.Model):
+    PREVIEW_LENGTH = 100
+
     event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name="chat")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Summary of the chat's messages, maintained as messages are added so the
+    # tab list never has to read the message table.
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
 
     @property
     def is_deletable(self):
         return self.event.date < timezone.now() - timedelta(days=2)
+
+    @classmethod
+    def summary_update(cls, messages):
+        """
+        Return update() kwargs adding new messages of one chat to its summary.
+        The last message fields only move forward, so concurrent writers can't regress them.
+        """
+        newest = max(messages, key=lambda msg: msg.id)
+        is_newer = Q(last_message_id__isnull=True) | Q(last_message_id__lt=newest.id)
+        return {
+            'message_count': F('message_count') + len(messages),
+            'last_message_id': Case(
+                When(is_newer, then=Value(newest.id)),
+                default=F('last_message_id'),
+                output_field=models.BigIntegerField(),
+            ),
+            'last_message_preview': Case(
+                When(is_newer, then=Value(newest.message[:cls.PREVIEW_LENGTH])),
+                default=F('last_message_preview'),
+            ),
+            'last_activity_at': Case(When(is_newer, then=Value(newest.created_at)), default=F('last_activity_at')),
+        }
+
+    def add_message(self, user, text):
+        """
+        Create a message and update the chat summary in the same transaction.
+        Posting marks the chat as read for the author, so own messages never count as unread.
+        """
+        with transaction.atomic():
+            message = Message.objects.create(chat=self, user=user, message=text)
+            Chat.objects.filter(pk=self.pk).update(**Chat.summary_update([message]))
+            ChatParticipant.objects.filter(chat=self, user=user, last_read_message_id__lt=message.id).update(
+                last_read_message_id=message.id,
+                read_message_count=Subquery(Chat.objects.filter(pk=self.pk).values('message_count')),
+            )
+        return message
     
     def __str__(self):
         return f"'{self.event.title}' chat"
@@ -94,6 +157,10 @@ class ChatParticipant(models.Model):
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name="participants")
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     joined_at = models.DateTimeField(auto_now_add=True)
+    # Id of the newest message the user has read; messages with a greater id are unread.
+    last_read_message_id = models.BigIntegerField(default=0)
+    # Number of the chat's messages up to and including the last read one.
+    read_message_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -109,6 +176,19 @@ class ChatParticipant(models.Model):
             raise ValueError(f"User {user.username} is already a participant of this chat.")
         return cls.objects.create(chat=chat, user=user)
 
+    @classmethod
+    def with_unread_counts(cls, user):
+        """
+        Return the user's chat participations annotated with `unread_count`, computed from
+        the chat's message counter and the participant's read counter without reading messages.
+        Chats of deleted events are left out.
+        """
+        return cls.objects.filter(user=user, chat__event__deleted_at__isnull=True).annotate(
+            unread_count=Greatest(
+                F('chat__message_count') - F('read_message_count'), Value(0), output_field=models.IntegerField()
+            )
+        )
+
     def __str__(self):
         return f"{self.user.username} in '{self.chat.event.title}' chat"
 
@@ -116,4 +196,59 @@ class Message(models.Model):
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name="messages")
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class MessagePartition(models.Model):
+    """
+    A closed time window of messages moved out of the live `events_message` table
+    into its own table (see events/partitions.py).
+    """
+    table_name = models.CharField(max_length=63, unique=True)
+    min_id = models.BigIntegerField()
+    max_id = models.BigIntegerField()
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['min_id']
+
+    def __str__(self):
+        return self.table_name
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be sent, or sent, by the outbound mail queue (see events/mail.py).
+    """
+    QUEUED = 'QUEUED'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.TextField()
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()
+    headers = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=6, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Queued emails are sent from this time on; claiming one for sending moves it forward.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Identifies generated emails (reminders, digests) so generating them again doesn't queue duplicates.
+    dedupe_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)}"
@@ -0,0 +1,156 @@
+import heapq
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+from django.conf import settings
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.formats import date_format
+from django.utils.timezone import localdate, now
+from .mail import queue_emails
+from .models import Event, OutboundEmail, RSVP, Task
+
+# Invitation emails are generated on the workers from the RSVPs the organizer just
+# created, so sending invitations only costs the request one bulk insert.
+#
+# Event reminders and daily digests are generated for all users at once: a few queries
+# read every recipient's rows ordered by user, the rows are merged and grouped by user in
+# one pass, and the emails are streamed into the outbound queue in chunks. Nothing is
+# queried per user, and memory stays bounded by the chunk size.
+#
+# Every email has a dedupe_key naming what it is about (the invitation, the event and
+# its start time, or the day of the digest), so the jobs can be rerun after a failure, or run more
+# often than needed, without queueing an email twice.
+#
+# Recipients are the organizers and the users who said yes to active events; users
+# without an email address are skipped, and so are deleted events.
+DEFAULT_NOTIFICATIONS = {
+    'reminder_lead_hours': 24,  # Remind of events starting within this many hours
+    'digest_days': 7,  # Digests list the events of the next days
+    'chunk_size': 500,
+}
+
+# Event rows are (user id, email, username, event id, title, date, location) tuples.
+EVENT_ROW = ('user_id', 'user__email', 'user__username', 'event_id', 'event__title', 'event__date', 'event__location')
+ORGANIZER_ROW = ('created_by_id', 'created_by__email', 'created_by__username', 'pk', 'title', 'date', 'location')
+# Task rows are (user id, email, username, description, event title, event date) tuples.
+TASK_ROW = ('assigned_to_id', 'assigned_to__email', 'assigned_to__username', 'description', 'event__title', 'event__date')
+
+
+def notification_settings():
+    return {**DEFAULT_NOTIFICATIONS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+
+def event_rows(start, end):
+    '''
+    Rows of the organizers and attendees of the active events starting after `start`
+    and up to `end`, ordered by user and event date. Two queries, read as a stream.
+    '''
+    events = Event.objects.filter(status='ACTIVE', date__gt=start, date__lte=end)
+    attendees = (
+        RSVP.objects.filter(event__in=events, status='YES', user__email__gt='')
+        .exclude(user=F('event__created_by'))
+        .order_by('user_id', 'event__date', 'event_id')
+        .values_list(*EVENT_ROW)
+    )
+    organizers = (
+        events.filter(created_by__email__gt='')
+        .order_by('created_by_id', 'date', 'pk')
+        .values_list(*ORGANIZER_ROW)
+    )
+    return heapq.merge(attendees.iterator(), organizers.iterator(), key=itemgetter(0, 5))
+
+
+def task_rows(since):
+    '''Rows of the open tasks of active events starting after `since`, ordered by assignee and event date.'''
+    return (
+        Task.objects.filter(
+            is_completed=False, assigned_to__email__gt='',
+            event__status='ACTIVE', event__deleted_at__isnull=True, event__date__gt=since,
+        )
+        .order_by('assigned_to_id', 'event__date', 'pk')
+        .values_list(*TASK_ROW)
+        .iterator()
+    )
+
+
+def _event(row):
+    return {'title': row[4], 'date': row[5], 'location': row[6]}
+
+
+def _task(row):
+    return {'description': row[3], 'event_title': row[4], 'event_date': row[5]}
+
+
+def reminder_emails(current, config):
+    for row in event_rows(current, current + timedelta(hours=config['reminder_lead_hours'])):
+        user_id, email, username, event_id, title, date, location = row
+        yield OutboundEmail(
+            subject=f'Reminder: "{title}" is coming up',
+            body=render_to_string('emails/event_reminder.txt', {'username': username, 'event': _event(row)}),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+            # A rescheduled event gets a new reminder.
+            dedupe_key=f'reminder:{event_id}:{user_id}:{date:%Y%m%d%H%M}',
+        )
+
+
+def queue_event_reminders():
+    '''Queue a reminder for each organizer and attendee of the events starting within the lead time.'''
+    config = notification_settings()
+    queue_emails(reminder_emails(now(), config), config['chunk_size'])
+
+
+def digest_emails(current, config):
+    day = localdate(current)
+    events = ((row[0], 0, row) for row in event_rows(current, current + timedelta(days=config['digest_days'])))
+    tasks = ((row[0], 1, row) for row in task_rows(current))
+    # Both streams are ordered by user, so merging them and grouping by user yields
+    # each user's events followed by their tasks.
+    for user_id, rows in groupby(heapq.merge(events, tasks, key=itemgetter(0, 1)), key=itemgetter(0)):
+        user_events, user_tasks = [], []
+        for _, is_task, row in rows:
+            if is_task:
+                user_tasks.append(_task(row))
+            else:
+                user_events.append(_event(row))
+        email, username = row[1], row[2]
+        yield OutboundEmail(
+            subject=f'Your Evently digest for {date_format(day)}',
+            body=render_to_string('emails/daily_digest.txt', {
+                'username': username, 'day': day, 'events': user_events, 'tasks': user_tasks,
+            }),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+            dedupe_key=f'digest:{user_id}:{day.isoformat()}',
+        )
+
+
+def queue_daily_digests():
+    '''Queue today's digest of upcoming events and open tasks for every user who has any.'''
+    config = notification_settings()
+    queue_emails(digest_emails(now(), config), config['chunk_size'])
+
+
+def invitation_emails(event, user_ids):
+    rows = (
+        RSVP.objects.filter(event=event, user_id__in=user_ids, user__email__gt='')
+        .order_by('user_id')
+        .values_list('user_id', 'user__email', 'user__username')
+    )
+    for user_id, email, username in rows.iterator():
+        yield OutboundEmail(
+            subject=f'You\'re invited to "{event.title}"',
+            body=render_to_string('emails/invitation.txt', {'username': username, 'event': event}),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+            dedupe_key=f'invitation:{event.pk}:{user_id}',
+        )
+
+
+def send_invitations(event_id, user_ids):
+    '''Queue the invitation emails of users just invited to an event. Runs on the workers.'''
+    event = Event.objects.select_related('created_by').filter(pk=event_id).first()
+    if event is None:  # Deleted since
+        return
+    queue_emails(invitation_emails(event, user_ids), notification_settings()['chunk_size'])
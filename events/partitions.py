@@ -0,0 +1,194 @@
+import re
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, prefetch_related_objects
+from .models import MessagePartition, Message
+from .search import as_datetime
+
+# Messages are partitioned by time: `events_message` holds the current window and
+# rotate_messages() periodically moves it into a table of its own, registered as a
+# MessagePartition. Partitions are read-only. They have no foreign keys, so deleting
+# chats leaves their rows behind until drop_expired_partitions() drops the whole table
+# once none of its chats exist any more. Reads go through chat_messages() and
+# count_chat_messages(), which only touch the partitions a chat can have messages in.
+# Message ids keep increasing across rotations, so partitions cover disjoint id ranges
+# and the message search index (keyed by message id) stays valid.
+LIVE_TABLE = Message._meta.db_table
+MESSAGE_COLUMNS = 'm.id AS id, m.message, m.created_at, m.chat_id AS chat_id, m.user_id, u.username'
+_REFERENCES_RE = re.compile(r'\s+REFERENCES\s+"\w+"\s*\("\w+"\)(\s+DEFERRABLE INITIALLY DEFERRED)?', re.IGNORECASE)
+
+
+def message_tables(since=None, up_to_id=None):
+    '''
+    Return the tables that can hold messages created at or after `since`
+    with ids up to `up_to_id`, oldest first. The live table is always included.
+    '''
+    partitions = MessagePartition.objects.all()
+    if since is not None:
+        partitions = partitions.filter(ends_at__gte=since)
+    if up_to_id is not None:
+        partitions = partitions.filter(min_id__lte=up_to_id)
+    return [*partitions.values_list('table_name', flat=True), LIVE_TABLE]
+
+
+def _chat_messages_sql(chat_ids, since):
+    placeholders = ', '.join(['%s'] * len(chat_ids))
+    tables = message_tables(since)
+    sql = ' UNION ALL '.join(
+        f'SELECT {MESSAGE_COLUMNS} FROM "{table}" m JOIN auth_user u ON u.id = m.user_id'
+        f' WHERE m.chat_id IN ({placeholders})'
+        for table in tables
+    )
+    return f'{sql} ORDER BY chat_id, id', chat_ids * len(tables)
+
+
+def chat_messages(chat_ids, since=None):
+    '''
+    Return the messages of the given chats ordered by chat and id, with their authors loaded.
+    `since` is the creation time of the oldest chat, which limits the partitions read.
+    Messages whose author has been deleted are skipped, as the live table cascades them.
+    '''
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return []
+    messages = list(Message.objects.raw(*_chat_messages_sql(chat_ids, since)))
+    prefetch_related_objects(messages, 'user')
+    return messages
+
+
+def chat_message_rows(chat_ids, since=None, batch_size=1000):
+    '''
+    Like chat_messages(), but yield plain (id, message, created_at, chat_id, user_id, username)
+    tuples without instantiating models, reading the cursor in batches.
+    '''
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(*_chat_messages_sql(chat_ids, since))
+        while rows := cursor.fetchmany(batch_size):
+            for message_id, message, created_at, chat_id, user_id, username in rows:
+                yield message_id, message, as_datetime(created_at), chat_id, user_id, username
+
+
+def _count(tables, condition, params):
+    sql = ' UNION ALL '.join(f'SELECT COUNT(*) AS n FROM "{table}" WHERE {condition}' for table in tables)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT SUM(n) FROM ({sql})', params * len(tables))
+        return cursor.fetchone()[0] or 0
+
+
+def count_chat_messages(chat_id, up_to_id):
+    '''Count the messages of a chat with ids up to `up_to_id`.'''
+    return _count(message_tables(up_to_id=up_to_id), 'chat_id = %s AND id <= %s', [chat_id, up_to_id])
+
+
+def count_recent_chat_messages(chat_id, since):
+    '''Count the messages of a chat created at or after `since`, including those already rotated into a partition.'''
+    return _count(
+        message_tables(since=since), 'chat_id = %s AND created_at >= %s',
+        [chat_id, connection.ops.adapt_datetimefield_value(since)],
+    )
+
+
+def rotate_messages():
+    '''
+    Close the current window: rename the live table into a new partition table and
+    recreate the live table with its indexes and triggers. Returns the new partition,
+    or None when there is nothing to rotate or the database isn't SQLite.
+    '''
+    if connection.vendor != 'sqlite':
+        return None
+    with transaction.atomic():
+        bounds = Message.objects.aggregate(
+            count=Count('id'), min_id=Min('id'), max_id=Max('id'),
+            starts_at=Min('created_at'), ends_at=Max('created_at'),
+        )
+        if not bounds.pop('count'):
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL",
+                [LIVE_TABLE],
+            )
+            # Recreate the table before its indexes and triggers.
+            schema = sorted(cursor.fetchall(), key=lambda row: row[0] != 'table')
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [LIVE_TABLE])
+            sequence = cursor.fetchone()
+
+            partition = MessagePartition.objects.create(table_name=f'{LIVE_TABLE}_pending', **bounds)
+            partition.table_name = f'{LIVE_TABLE}_p{partition.pk}'
+            partition.save(update_fields=['table_name'])
+
+            # Renaming only rewrites the schema, so the write lock is held for a few
+            # statements however many messages the window holds. The rows are never copied.
+            cursor.execute(f'ALTER TABLE "{LIVE_TABLE}" RENAME TO "{partition.table_name}"')
+            for kind, name, _ in schema:
+                if kind == 'trigger':
+                    # The search triggers stay with the live table; partitions are read-only.
+                    cursor.execute(f'DROP TRIGGER "{name}"')
+            _detach_partition(cursor, partition.table_name, schema)
+
+            for _, _, sql in schema:
+                cursor.execute(sql)
+            # Keep ids increasing across rotations.
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                [LIVE_TABLE, sequence[0] if sequence else bounds['max_id']],
+            )
+    return partition
+
+
+def _detach_partition(cursor, table_name, schema):
+    '''
+    Drop the foreign keys of a renamed partition, so chats and users can still be deleted
+    while their old messages wait for the partition drop, and rename the indexes it took
+    from the live table, so the live table can recreate them. Neither change touches the
+    stored rows, so both are made in the schema table directly, as SQLite documents for
+    removing constraints (https://www.sqlite.org/lang_altertable.html#otheralter).
+    '''
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [table_name])
+    table_sql = _REFERENCES_RE.sub('', cursor.fetchone()[0])
+    if 'REFERENCES' in table_sql.upper():
+        # A constraint the pattern doesn't know; the rotation rolls back rather than writing a bad schema.
+        raise ValueError(f"Unexpected foreign key left in the schema of {table_name}: {table_sql}")
+    cursor.execute("PRAGMA schema_version")
+    schema_version = cursor.fetchone()[0]
+    cursor.execute("PRAGMA writable_schema = ON")
+    try:
+        cursor.execute("UPDATE sqlite_master SET sql = %s WHERE type = 'table' AND name = %s", [table_sql, table_name])
+        for kind, name, _ in schema:
+            if kind == 'index':
+                index_name = table_name + name.removeprefix(LIVE_TABLE)
+                cursor.execute(
+                    "UPDATE sqlite_master SET name = %s, sql = replace(sql, %s, %s) WHERE type = 'index' AND name = %s",
+                    [index_name, f'"{name}"', f'"{index_name}"', name],
+                )
+        # Makes every connection reload the schema.
+        cursor.execute(f"PRAGMA schema_version = {schema_version + 1}")
+    finally:
+        cursor.execute("PRAGMA writable_schema = OFF")
+
+
+def drop_expired_partitions():
+    '''
+    Drop the partitions that hold no messages of existing chats, along with their
+    entries in the message search index. Returns the names of the dropped tables.
+    '''
+    dropped = []
+    for partition in MessagePartition.objects.all():
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT 1 FROM events_chat c WHERE EXISTS '
+                f'(SELECT 1 FROM "{partition.table_name}" m WHERE m.chat_id = c.id) LIMIT 1'
+            )
+            if cursor.fetchone():
+                continue
+            cursor.execute(f'DROP TABLE "{partition.table_name}"')
+            cursor.execute(
+                'DELETE FROM events_message_fts WHERE rowid BETWEEN %s AND %s',
+                [partition.min_id, partition.max_id],
+            )
+            partition.delete()
+            dropped.append(partition.table_name)
+    return dropped
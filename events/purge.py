@@ -0,0 +1,62 @@
+from django.db import connection, transaction
+from django.utils.timezone import now
+from .event_pages import event_page_key
+from .ingest import members_cache_key
+from .jobs import LOW, enqueue
+from .models import Chat, ChatParticipant, Event, Message, RSVP, Task
+from .singleflight import invalidate
+
+# Deleting an event cascades through its RSVPs, tasks, chat participants and messages,
+# which for a big event is too much for one request and one transaction. Instead
+# hide_event() only sets Event.deleted_at, which hides the event from Event.objects and
+# from the RSVP inbox, chat lists and searches, and queues purge_event() as a
+# maintenance job (see jobs.py). The purge deletes the event's rows in batches of
+# PURGE_BATCH_SIZE, each one committed on its own so other writers can get in between,
+# then deletes the emptied event. It can be interrupted and run again:
+# tasks.purge_deleted_events() picks up whatever is left.
+#
+# Batches are deleted with plain DELETE statements, without the post_delete receivers
+# of their rows. Those would maintain chat membership, seat counts and cached pages of
+# an event nobody can see any more; hide_event() drops the caches once instead.
+# Messages in closed partitions are dropped with their partition (see partitions.py).
+PURGE_BATCH_SIZE = 1000
+
+_DELETE_BATCH_SQL = '''
+    DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {column} = %s LIMIT %s)
+'''
+
+
+def hide_event(event_id):
+    '''Hide an event at once and queue the deletion of its rows.'''
+    Event.objects.filter(pk=event_id).update(deleted_at=now())
+    invalidate(event_page_key(event_id))
+    chat_ids = Chat.objects.filter(event_id=event_id).values_list('pk', flat=True)
+    invalidate(*(members_cache_key(chat_id) for chat_id in chat_ids))
+    enqueue('events.purge.purge_event', event_id, priority=LOW)
+
+
+def delete_in_batches(model, column, value, batch_size=PURGE_BATCH_SIZE):
+    '''Delete the rows of `model` whose `column` equals `value`, committing every batch. Returns the number deleted.'''
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql = _DELETE_BATCH_SQL.format(table=table, column=connection.ops.quote_name(column))
+    deleted = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [value, batch_size])
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def purge_event(event_id, batch_size=PURGE_BATCH_SIZE):
+    '''Delete a hidden event with all its rows, in batches. Events that aren't hidden are left alone.'''
+    if not Event.all_objects.filter(pk=event_id, deleted_at__isnull=False).exists():
+        return
+    for chat_id in Chat.objects.filter(event_id=event_id).values_list('pk', flat=True):
+        delete_in_batches(Message, 'chat_id', chat_id, batch_size)
+        delete_in_batches(ChatParticipant, 'chat_id', chat_id, batch_size)
+    delete_in_batches(RSVP, 'event_id', event_id, batch_size)
+    delete_in_batches(Task, 'event_id', event_id, batch_size)
+    # Only the event and its chat are left, along with any rows written since the batches ran.
+    Event.all_objects.filter(pk=event_id).delete()
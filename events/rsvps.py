@@ -0,0 +1,169 @@
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+from .event_pages import event_page_key
+from .ingest import members_cache_key
+from .models import Chat, ChatParticipant, Event, RSVP
+from .singleflight import invalidate
+
+# RSVP responses are written with one INSERT ... ON CONFLICT DO UPDATE statement on the
+# (user, event) unique constraint, which is atomic under concurrent clicks. The update
+# only applies when the status differs, and RETURNING yields the rows that were inserted
+# or changed, so responses that change nothing skip the side effects. Those are the work
+# of the RSVP post_save receivers, which upserts bypass: chat participants and caches.
+# Both SQLite (3.35+) and PostgreSQL support this statement.
+#
+# Events with a capacity count their YES responses in Event.confirmed_count. A YES takes
+# a seat with a conditional increment (UPDATE ... WHERE confirmed_count < capacity), so
+# concurrent responses only contend on the event row and can't oversubscribe it; when
+# no seat is left the response joins the waitlist instead. Leaving frees the seat, which
+# goes to the earliest waitlisted response the same way.
+RESPONSES = ('YES', 'NO', 'MAYBE')
+
+_UPSERT_SQL = '''
+    INSERT INTO {table} (user_id, event_id, status, waitlisted_at, timestamp)
+    VALUES {values}
+    ON CONFLICT (user_id, event_id) DO UPDATE SET status = excluded.status, waitlisted_at = excluded.waitlisted_at
+    WHERE {table}.status <> excluded.status{keep_confirmed}
+    RETURNING event_id, status
+'''
+
+
+def _upsert(user_id, statuses, keep_confirmed=False):
+    '''Upsert RSVPs and return event id -> status for the rows that were created or changed.'''
+    table = RSVP._meta.db_table
+    sql = _UPSERT_SQL.format(
+        table=table,
+        values=', '.join(['(%s, %s, %s, %s, %s)'] * len(statuses)),
+        keep_confirmed=f" AND {table}.status <> 'YES'" if keep_confirmed else '',
+    )
+    timestamp = connection.ops.adapt_datetimefield_value(now())
+    params = [
+        value
+        for event_id, status in statuses.items()
+        for value in (user_id, event_id, status, timestamp if status == 'WAIT' else None, timestamp)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return dict(cursor.fetchall())
+
+
+def take_seat(event_id):
+    '''Count one more YES response if the event has room left. Returns whether it had.'''
+    return bool(
+        Event.objects.filter(pk=event_id, confirmed_count__lt=F('capacity'))
+        .update(confirmed_count=F('confirmed_count') + 1)
+    )
+
+
+def release_seat(event_id):
+    Event.objects.filter(pk=event_id, confirmed_count__gt=0).update(confirmed_count=F('confirmed_count') - 1)
+
+
+def promote_waitlist(event_id):
+    '''Give the free seats of an event to its earliest waitlisted responses. Returns the promoted user ids.'''
+    promoted = []
+    waitlist = RSVP.objects.filter(event_id=event_id, status='WAIT')
+    while candidate := waitlist.order_by('waitlisted_at', 'pk').values_list('pk', 'user_id').first():
+        if not take_seat(event_id):
+            break
+        # Compare-and-set, in case the response changed since it was read.
+        if waitlist.filter(pk=candidate[0]).update(status='YES', waitlisted_at=None):
+            promoted.append(candidate[1])
+        else:
+            release_seat(event_id)
+    return promoted
+
+
+def _respond_capped(user_id, event_id, status):
+    '''Apply a response to an event with a capacity. Returns (new status or None, promoted user ids).'''
+    if status == 'YES':
+        if take_seat(event_id):
+            changed = _upsert(user_id, {event_id: 'YES'})
+            if not changed:
+                release_seat(event_id)  # Already confirmed.
+        else:
+            # Confirmed responses keep their seat when the event is full.
+            changed = _upsert(user_id, {event_id: 'WAIT'}, keep_confirmed=True)
+        return changed.get(event_id), []
+
+    if RSVP.objects.filter(user_id=user_id, event_id=event_id, status='YES').update(status=status):
+        release_seat(event_id)
+        return status, promote_waitlist(event_id)
+    return _upsert(user_id, {event_id: status}).get(event_id), []
+
+
+def upsert_rsvps(user_id, statuses, capped=None):
+    '''
+    Set the user's RSVP status for several events, given a dict of event id -> status.
+    `capped` is the set of those events that have a capacity; it is queried when not given.
+    Returns a dict of event id -> status for the RSVPs that were created or changed
+    (a YES to a full event comes back as WAIT), after reconciling chat participants
+    and caches for them and for any waitlisted users promoted meanwhile.
+    '''
+    if not statuses:
+        return {}
+    if capped is None:
+        capped = set(Event.objects.filter(pk__in=statuses, capacity__isnull=False).order_by().values_list('pk', flat=True))
+    uncapped = {event_id: status for event_id, status in statuses.items() if event_id not in capped}
+    promotions = []
+    with transaction.atomic():
+        changed = _upsert(user_id, uncapped) if uncapped else {}
+        # In event order, so concurrent batches take the event rows in the same order.
+        for event_id in sorted(set(capped) & statuses.keys()):
+            status, promoted = _respond_capped(user_id, event_id, statuses[event_id])
+            if status:
+                changed[event_id] = status
+            promotions += [(promoted_id, event_id) for promoted_id in promoted]
+        apply_rsvp_changes(user_id, changed)
+        for promoted_id, event_id in promotions:
+            apply_rsvp_changes(promoted_id, {event_id: 'YES'})
+    return changed
+
+
+def upsert_rsvp(user_id, event_id, status, capped=None):
+    '''Set the user's RSVP status for an event. Returns the new status if it was created or changed, else None.'''
+    return upsert_rsvps(user_id, {event_id: status}, capped).get(event_id)
+
+
+def update_capacity(event_id):
+    '''
+    Recount the YES responses of an event after its capacity changed and fill any free
+    seats from the waitlist; without a capacity every waitlisted response is confirmed.
+    Returns the promoted user ids.
+    '''
+    with transaction.atomic():
+        confirmed = RSVP.objects.filter(event_id=OuterRef('pk'), status='YES').values('event_id').annotate(n=Count('pk'))
+        Event.objects.filter(pk=event_id).update(confirmed_count=Coalesce(Subquery(confirmed.values('n')), Value(0)))
+        if Event.objects.filter(pk=event_id, capacity__isnull=True).exists():
+            waitlist = RSVP.objects.filter(event_id=event_id, status='WAIT')
+            promoted = list(waitlist.values_list('user_id', flat=True))
+            waitlist.update(status='YES', waitlisted_at=None)
+        else:
+            promoted = promote_waitlist(event_id)
+        for user_id in promoted:
+            apply_rsvp_changes(user_id, {event_id: 'YES'})
+        invalidate(event_page_key(event_id))
+    return promoted
+
+
+def apply_rsvp_changes(user_id, changes):
+    '''
+    Do in bulk what the RSVP post_save receivers do for each RSVP: add the user to the chats
+    of the events they said yes to, remove them from the others and drop the cached pages.
+    '''
+    if not changes:
+        return
+    chats = dict(Chat.objects.filter(event_id__in=changes).values_list('event_id', 'id'))
+    joined = [chats[event_id] for event_id, status in changes.items() if status == 'YES' and event_id in chats]
+    left = [chats[event_id] for event_id, status in changes.items() if status != 'YES' and event_id in chats]
+    if joined:
+        ChatParticipant.objects.bulk_create(
+            [ChatParticipant(chat_id=chat_id, user_id=user_id) for chat_id in joined], ignore_conflicts=True
+        )
+        # bulk_create() sends no signals; deletes below do.
+        invalidate(*(members_cache_key(chat_id) for chat_id in joined))
+    if left:
+        ChatParticipant.objects.filter(chat_id__in=left, user_id=user_id).delete()
+    invalidate(*(event_page_key(event_id) for event_id in changes))
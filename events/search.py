@@ -0,0 +1,162 @@
+import html
+import re
+from datetime import timezone
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import make_aware, is_naive
+from .directory import display_names
+from .models import Chat, ChatParticipant, Event
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_TERMS = 10
+
+# Private-use characters mark matches in snippets so the text can be escaped before
+# the markers become <mark> tags.
+_MATCH_START, _MATCH_END = '\ue000', '\ue001'
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_query(text):
+    '''
+    Turn user input into a safe FTS5 query: every word is quoted, so FTS syntax in the
+    input has no effect, all words must match and the last one also matches as a prefix.
+    Returns None when the input has no searchable words.
+    '''
+    terms = _TERM_RE.findall(text)[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def highlight(snippet):
+    '''Escape a snippet and wrap its matches in <mark> tags.'''
+    return html.escape(snippet).replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+
+
+def as_datetime(value):
+    '''Convert a datetime column read with a raw cursor to an aware datetime.'''
+    # SQLite stores datetimes as naive UTC text.
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    return make_aware(value, timezone.utc) if value and is_naive(value) else value
+
+
+def search_messages(user, text, page=1, page_size=SEARCH_PAGE_SIZE):
+    '''
+    Search the messages of the chats the user participates in.
+    Results are ranked by BM25 relevance and paginated; `has_next` tells whether another page exists.
+    '''
+    query = fts_query(text)
+    chat_ids = list(
+        ChatParticipant.objects.filter(user=user, chat__event__deleted_at__isnull=True).values_list('chat_id', flat=True)
+    )
+    if query is None or not chat_ids:
+        return {'results': [], 'page': page, 'has_next': False}
+
+    # Restricting the `chat` column lets FTS intersect the term and chat posting lists.
+    match = f"message : ({query}) AND chat : ({' OR '.join(f'c{chat_id}' for chat_id in chat_ids)})"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT rowid, chat, user_id, created_at,
+                   snippet(events_message_fts, 0, %s, %s, '…', 16),
+                   bm25(events_message_fts, 1.0, 0.0) AS score
+            FROM events_message_fts
+            WHERE events_message_fts MATCH %s
+            ORDER BY score
+            LIMIT %s OFFSET %s
+            ''',
+            [_MATCH_START, _MATCH_END, match, page_size + 1, (page - 1) * page_size],
+        )
+        rows = cursor.fetchall()
+
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    usernames = display_names.get_many(int(row[2]) for row in rows)
+    chat_titles = dict(
+        Chat.objects.filter(id__in={int(row[1][1:]) for row in rows}).values_list('id', 'event__title')
+    )
+
+    results = []
+    for message_id, chat, user_id, created_at, snippet, score in rows:
+        chat_id = int(chat[1:])
+        results.append({
+            'id': message_id,
+            'chat_id': chat_id,
+            'chat_name': chat_titles.get(chat_id),
+            'user': usernames.get(int(user_id)),
+            'created_at': as_datetime(created_at),
+            'snippet': highlight(snippet),
+            'score': score,
+        })
+    return {'results': results, 'page': page, 'has_next': has_next}
+
+
+def index_event(event):
+    '''Add or replace an event in the full-text index.'''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM events_event_fts WHERE rowid = %s', [event.pk])
+        cursor.execute(
+            'INSERT INTO events_event_fts(rowid, title, description, location) VALUES (%s, %s, %s, %s)',
+            [event.pk, event.title, event.description, event.location],
+        )
+
+
+def unindex_event(event_id):
+    '''Remove an event from the full-text index.'''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM events_event_fts WHERE rowid = %s', [event_id])
+
+
+def search_events(user, text, date_from=None, date_to=None, status=None, page=1, page_size=SEARCH_PAGE_SIZE):
+    '''
+    Search the title, description and location of the events the user created or RSVP'd to.
+    Title matches weigh most, then location, then description. Date range and status
+    filters apply to the candidate events through the ORM, so they use the `date` indexes.
+    Returns the page of events, each with a highlighted `snippet`, and whether another page exists.
+    '''
+    query = fts_query(text)
+    if query is None:
+        return {'results': [], 'page': page, 'has_next': False}
+
+    visible = Event.objects.filter(Q(created_by=user) | Q(rsvps__user=user))
+    if date_from:
+        visible = visible.filter(date__gte=date_from)
+    if date_to:
+        visible = visible.filter(date__lt=date_to)
+    if status:
+        visible = visible.filter(status=status)
+    visible_sql, visible_params = visible.order_by().values('id').query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            SELECT rowid,
+                   snippet(events_event_fts, -1, %s, %s, '…', 20),
+                   bm25(events_event_fts, 10.0, 1.0, 3.0) AS score
+            FROM events_event_fts
+            WHERE events_event_fts MATCH %s AND rowid IN ({visible_sql})
+            ORDER BY score
+            LIMIT %s OFFSET %s
+            ''',
+            [_MATCH_START, _MATCH_END, query, *visible_params, page_size + 1, (page - 1) * page_size],
+        )
+        rows = cursor.fetchall()
+
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    events = Event.objects.in_bulk([row[0] for row in rows])
+    results = []
+    for event_id, snippet, score in rows:
+        event = events[event_id]
+        event.snippet = highlight(snippet)
+        event.score = score
+        results.append(event)
+    return {'results': results, 'page': page, 'has_next': has_next}
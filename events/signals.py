@@ -1,6 +1,14 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Event, Chat, RSVP, ChatParticipant
+from .models import Event, Chat, RSVP, ChatParticipant, Task
+from django.contrib.auth.models import User
+from .auth_cache import invalidate_user
+from .directory import display_names
+from .ingest import members_cache_key
+from .rsvps import apply_rsvp_changes, promote_waitlist, release_seat
+from .search import index_event, unindex_event
+from .singleflight import invalidate
+from .event_pages import event_page_key
 
 @receiver(post_save, sender=Event)
 def create_chat_for_event(sender, instance, created, **kwargs):
@@ -20,4 +28,54 @@ def update_chat_participants(sender, instance, created, **kwargs):
     if instance.status.upper() == "YES":
         ChatParticipant.objects.get_or_create(chat=chat, user=instance.user)
     else:
-        ChatParticipant.objects.filter(chat=chat, user=instance.user).delete()
\ No newline at end of file
+        ChatParticipant.objects.filter(chat=chat, user=instance.user).delete()
+
+@receiver(post_save, sender=Event)
+def update_event_search_index(sender, instance, **kwargs):
+    '''Keep the event full-text index up to date when an event is saved.'''
+    index_event(instance)
+
+@receiver(post_delete, sender=Event)
+def remove_event_from_search_index(sender, instance, **kwargs):
+    '''Remove a deleted event from the full-text index.'''
+    unindex_event(instance.pk)
+
+
+@receiver(post_save, sender=ChatParticipant)
+@receiver(post_delete, sender=ChatParticipant)
+def invalidate_chat_members(sender, instance, **kwargs):
+    '''Drop the cached member list of a chat when its participants change.'''
+    invalidate(members_cache_key(instance.chat_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_caches(sender, instance, **kwargs):
+    '''Drop a user's cached display name and request user when the user changes.'''
+    display_names.invalidate(instance.pk)
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_page(sender, instance, **kwargs):
+    '''Drop the cached event page when the event changes.'''
+    invalidate(event_page_key(instance.pk))
+
+
+@receiver(post_save, sender=RSVP)
+@receiver(post_delete, sender=RSVP)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_event_page_lists(sender, instance, **kwargs):
+    '''Drop the cached event page when one of its RSVPs or tasks changes.'''
+    invalidate(event_page_key(instance.event_id))
+
+
+@receiver(post_delete, sender=RSVP)
+def release_event_seat(sender, instance, **kwargs):
+    '''Give the seat of a deleted YES response to the waitlist of an event with a capacity.'''
+    if instance.status == 'YES' and Event.objects.filter(pk=instance.event_id, capacity__isnull=False).exists():
+        release_seat(instance.event_id)
+        for user_id in promote_waitlist(instance.event_id):
+            apply_rsvp_changes(user_id, {instance.event_id: 'YES'})
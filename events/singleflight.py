@@ -0,0 +1,124 @@
+import math
+import random
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Cache-aside for values that are expensive to compute and read by many requests at
+# once, such as the data behind a popular event page.
+# Single flight: on a miss one caller computes the value while the others wait for it.
+# Threads of a process wait on the same computation; other processes wait for a lock
+# key in the cache to be released, up to `wait` seconds, and then read the result.
+# Early refresh (XFetch): a read may recompute the value before it expires, with a
+# probability that grows as expiry nears and with how long the value took to compute
+# (`beta` scales it). One caller refreshes a hot key while the others keep reading the
+# cached value, so under load it is refreshed before it expires instead of missing.
+# invalidate() drops a value now and again when the writing transaction commits, so
+# reads in between can't cache rows that are about to change for long. It doesn't
+# stop a computation that is already running, which may store data read before the
+# change; keep timeouts short for values that change often.
+DEFAULT_SINGLE_FLIGHT = {
+    'beta': 1.0,
+    'lock_timeout': 10,
+    'wait': 5,
+}
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def single_flight_settings():
+    return {**DEFAULT_SINGLE_FLIGHT, **getattr(settings, 'SINGLE_FLIGHT', {})}
+
+
+def lock_key(key):
+    return f'{key}:computing'
+
+
+def get_or_compute(key, compute, timeout, beta=None):
+    '''
+    Return the cached value of `key`, calling `compute()` to fill it when missing or
+    due for an early refresh. Exceptions raised by compute() are passed to the callers
+    waiting for it and nothing is cached.
+    '''
+    config = single_flight_settings()
+    entry = cache.get(key)
+    if entry is None:
+        return _compute_once(key, compute, timeout, config)
+
+    value, duration, expires_at = entry
+    beta = config['beta'] if beta is None else beta
+    # 1 - random() is in (0, 1], so the log is defined and at most 0.
+    if time.time() - duration * beta * math.log(1 - random.random()) < expires_at:
+        return value
+    # Refresh early, unless another caller already is.
+    if not cache.add(lock_key(key), True, config['lock_timeout']):
+        return value
+    try:
+        return _store(key, compute, timeout)
+    finally:
+        cache.delete(lock_key(key))
+
+
+def _compute_once(key, compute, timeout, config):
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+    if not leader:
+        try:
+            return future.result(timeout=config['wait'])
+        except TimeoutError:
+            return _store(key, compute, timeout)
+
+    try:
+        value = _fill(key, compute, timeout, config)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+
+
+def _fill(key, compute, timeout, config):
+    '''Compute and cache the value, or wait for another process that is computing it.'''
+    if cache.add(lock_key(key), True, config['lock_timeout']):
+        try:
+            return _store(key, compute, timeout)
+        finally:
+            cache.delete(lock_key(key))
+
+    deadline = time.monotonic() + config['wait']
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    # The other process is slow or gone.
+    return _store(key, compute, timeout)
+
+
+def _store(key, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    duration = time.monotonic() - started
+    cache.set(key, (value, duration, time.time() + timeout), timeout)
+    return value
+
+
+def invalidate(*keys):
+    '''
+    Drop cached values now and again when the current transaction commits, so a value
+    recomputed in between from the rows not yet committed doesn't outlive the change.
+    '''
+    cache.delete_many(keys)
+    transaction.on_commit(partial(cache.delete_many, keys))
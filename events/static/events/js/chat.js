@@ -1,7 +1,41 @@
-// Fetch messages dynamically for a specific chat
+// Fallback poll interval (seconds) when the server gives no hint
+const DEFAULT_POLL_INTERVAL = 5;
+
+// Read receipt state per chat: the last message read and the newest one seen
+const readState = {};
+
+// The chat API sends lists as columns (one array per field) in the compact format;
+// turn them back into one object per row
+function fromColumns(columns) {
+  const names = Object.keys(columns);
+  const length = names.length ? columns[names[0]].length : 0;
+  return Array.from({ length }, (_, row) =>
+    Object.fromEntries(names.map((name) => [name, columns[name][row]]))
+  );
+}
+
+// Decode compact messages: authors are user ids into the `users` map
+function decodeMessages(data) {
+  return fromColumns(data.messages).map((msg) => ({
+    ...msg,
+    user: data.users[msg.user],
+  }));
+}
+
+// Fetch messages dynamically for a specific chat.
+// Returns the number of seconds to wait before the next poll.
 async function updateChatContent(chatId) {
-  const response = await fetch(`/api/chats/${chatId}/messages/`);
+  const response = await fetch(`/api/chats/${chatId}/messages/?format=compact`);
+
+  // Back off when the server asks us to slow down
+  if (response.status === 429) {
+    return Number(response.headers.get("Retry-After")) || DEFAULT_POLL_INTERVAL;
+  }
+  if (!response.ok) {
+    return DEFAULT_POLL_INTERVAL;
+  }
   const data = await response.json();
+  const messages = decodeMessages(data);
 
   // Update warning if present
   const warningDiv = document.querySelector(`#chat-${chatId} .chat-warning`);
@@ -20,25 +54,83 @@ async function updateChatContent(chatId) {
 
   // Update messages
   const messagesDiv = document.getElementById(`messages-${chatId}`);
-  messagesDiv.innerHTML = renderMessages(data.messages, currentUser);
+  messagesDiv.innerHTML = renderMessages(messages, currentUser);
+  updateReadState(chatId, messages);
+  return data.poll_interval || DEFAULT_POLL_INTERVAL;
+}
+
+// Track the newest message of a chat and mark it read if the chat is open,
+// otherwise show how many messages from others arrived since the last read one
+function updateReadState(chatId, messages) {
+  const state = readState[chatId];
+  state.loaded = true;
+  if (messages.length) {
+    const latest = messages[messages.length - 1];
+    state.latestId = latest.id;
+    document.getElementById(`preview-${chatId}`).textContent = latest.message;
+  }
+  if (document.getElementById(`chat-${chatId}`).classList.contains("active")) {
+    markChatRead(chatId);
+  } else {
+    const unread = messages.filter(
+      (msg) => msg.id > state.lastReadId && msg.user !== currentUser
+    ).length;
+    renderUnreadBadge(chatId, unread);
+  }
+}
+
+// Advance the read receipt of a chat to its newest message
+async function markChatRead(chatId) {
+  const state = readState[chatId];
+  renderUnreadBadge(chatId, 0);
+  if (state.latestId <= state.lastReadId) {
+    return;
+  }
+  state.lastReadId = state.latestId;
+  await fetch(`/api/chats/${chatId}/read/`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "X-CSRFToken": getCSRFToken(),
+    },
+    body: JSON.stringify({ message_id: state.latestId }),
+  });
+}
+
+function renderUnreadBadge(chatId, count) {
+  const badge = document.getElementById(`unread-${chatId}`);
+  badge.innerText = count;
+  badge.classList.toggle("d-none", count === 0);
 }
 
-// Periodically refresh chat content
-function startChatUpdates(chatId) {
-  setInterval(() => updateChatContent(chatId), 5000); // Refresh every 5 seconds
+// Periodically refresh chat content, waiting as long as the server suggests
+function startChatUpdates(chatId, pollInterval) {
+  const poll = async () => {
+    let nextInterval = DEFAULT_POLL_INTERVAL;
+    try {
+      nextInterval = await updateChatContent(chatId);
+    } finally {
+      setTimeout(poll, nextInterval * 1000);
+    }
+  };
+  setTimeout(poll, (pollInterval ?? DEFAULT_POLL_INTERVAL) * 1000);
 }
 
-// Initialize updates for all chats on the page
+// Initialize updates for all chats on the page.
+// The open chat loads its messages right away, the others on their first poll.
 function initializeDynamicUpdates(chats) {
   chats.forEach((chat) => {
-    startChatUpdates(chat.id);
+    const isActive = document
+      .getElementById(`chat-${chat.id}`)
+      .classList.contains("active");
+    startChatUpdates(chat.id, isActive ? 0 : chat.poll_interval);
   });
 }
 
-// Fetch chats and initialize everything
+// Fetch the chat list, sorted by recent activity, and initialize everything
 async function fetchChats() {
-  const response = await fetch("/api/chats/");
-  const chats = await response.json();
+  const response = await fetch("/api/chats/?sort=recent&format=compact");
+  const chats = fromColumns((await response.json()).chats);
   initializeChats(chats);
   initializeDynamicUpdates(chats); // Start periodic updates for all chats
 }
@@ -65,12 +157,13 @@ function initializeChats(chats) {
     tab.className = "list-group-item list-group-item-action chat-tab";
     tab.innerHTML = `
         ${chat.name}
-        ${
-          chat.unread_count > 0
-            ? `<span class="badge bg-danger">${chat.unread_count}</span>`
-            : ""
-        }
+        <span class="badge bg-danger ${
+          chat.unread_count > 0 ? "" : "d-none"
+        }" id="unread-${chat.id}">${chat.unread_count}</span>
+        <div class="small text-secondary text-truncate" id="preview-${chat.id}"></div>
       `;
+    // Previews are user text, so they are set as text rather than markup
+    tab.querySelector(`#preview-${chat.id}`).textContent = chat.last_message_preview;
     tab.href = "#";
     tab.dataset.chatId = chat.id;
     if (activeChatId ? chat.id === activeChatId : index === 0) {
@@ -87,9 +180,7 @@ function initializeChats(chats) {
     }
     chatContainer.innerHTML = `
       ${chat.warning ? `<div class="chat-warning">${chat.warning}</div>` : ""}
-      <div class="messages py-3 px-2" id="messages-${chat.id}">
-          ${renderMessages(chat.messages, currentUser)}
-      </div>
+      <div class="messages py-3 px-2" id="messages-${chat.id}"></div>
       <div class="message-input mt-3">
           <textarea id="message-input-${
             chat.id
@@ -100,6 +191,12 @@ function initializeChats(chats) {
       </div>
       `;
     chatContents.appendChild(chatContainer);
+
+    readState[chat.id] = {
+      lastReadId: chat.last_read_message_id,
+      latestId: chat.last_message_id || 0,
+      loaded: false,
+    };
   });
 
   // Add event listener for tab switching
@@ -117,6 +214,11 @@ function initializeChats(chats) {
       e.target.classList.add("active");
       const chatId = e.target.dataset.chatId;
       document.getElementById(`chat-${chatId}`).classList.add("active");
+      if (readState[chatId].loaded) {
+        markChatRead(chatId);
+      } else {
+        updateChatContent(chatId); // Load messages the first time a chat is opened
+      }
     }
   });
 }
@@ -202,6 +304,57 @@ function renderMessages(messages, currentUser) {
     .join("");
 }
 
+// Search the user's chat history and list the matching messages.
+// Snippets are escaped by the server, with matches wrapped in <mark>; the rest is set as text.
+async function searchMessages(query, page = 1) {
+  const resultsDiv = document.getElementById("chat-search-results");
+  if (page === 1) {
+    resultsDiv.innerHTML = "";
+  }
+  if (!query.trim()) {
+    return;
+  }
+  const params = new URLSearchParams({ q: query, page });
+  const response = await fetch(`/api/chats/search/?${params}`);
+  if (!response.ok) {
+    return;
+  }
+  const data = await response.json();
+
+  document.getElementById("chat-search-more")?.remove();
+  data.results.forEach((result) => {
+    const item = document.createElement("button");
+    item.className = "list-group-item list-group-item-action";
+    item.innerHTML = `
+      <div class="small text-secondary"></div>
+      <div>${result.snippet}</div>`;
+    item.firstElementChild.textContent = `${result.chat_name} · ${
+      result.user
+    } · ${formatTimestamp(result.created_at)}`;
+    // Open the chat the message belongs to
+    item.addEventListener("click", () =>
+      document.querySelector(`.chat-tab[data-chat-id="${result.chat_id}"]`)?.click()
+    );
+    resultsDiv.appendChild(item);
+  });
+  if (!data.results.length && page === 1) {
+    resultsDiv.innerHTML = `<div class="list-group-item">No messages found.</div>`;
+  }
+  if (data.has_next) {
+    const more = document.createElement("button");
+    more.id = "chat-search-more";
+    more.className = "list-group-item list-group-item-action text-center";
+    more.innerText = "Load more";
+    more.addEventListener("click", () => searchMessages(query, page + 1));
+    resultsDiv.appendChild(more);
+  }
+}
+
+document.getElementById("chat-search-form").addEventListener("submit", (e) => {
+  e.preventDefault();
+  searchMessages(document.getElementById("chat-search").value);
+});
+
 function formatTimestamp(timestamp) {
   const date = new Date(timestamp); // Convert the timestamp into a Date object
   const year = date.getFullYear();
@@ -0,0 +1,50 @@
+document.addEventListener("DOMContentLoaded", function () {
+  // Save every changed RSVP on the page with one request
+  const saveAllForm = document.getElementById("rsvp-save-all-form");
+  if (!saveAllForm) return;
+
+  saveAllForm.addEventListener("submit", function (e) {
+    e.preventDefault();
+
+    const responses = {};
+    document.querySelectorAll("select[data-event-pk]").forEach((select) => {
+      if (select.value !== select.dataset.initial) {
+        responses[select.dataset.eventPk] = select.value;
+      }
+    });
+    if (Object.keys(responses).length === 0) {
+      alert("No RSVPs changed.");
+      return;
+    }
+
+    const submitButton = this.querySelector("button[type='submit']");
+    submitButton.textContent = "Saving...";
+    submitButton.disabled = true;
+
+    fetch(this.action, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "X-CSRFToken": this.querySelector('[name="csrfmiddlewaretoken"]').value,
+      },
+      body: JSON.stringify({ responses: responses }),
+    })
+      .then((response) => response.json())
+      .then((data) => {
+        if (data.status !== "success") {
+          throw new Error("Invalid request");
+        }
+        const errors = Object.values(data.errors);
+        if (errors.length > 0) {
+          alert(errors.join("\n"));
+        }
+        window.location.reload();
+      })
+      .catch((error) => {
+        console.error("Error saving RSVPs:", error);
+        alert("Failed to save RSVPs.");
+        submitButton.textContent = "Save all";
+        submitButton.disabled = false;
+      });
+  });
+});
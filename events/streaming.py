@@ -0,0 +1,133 @@
+import re
+import zlib
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+# JSON responses that are written while they are encoded: iterators inside the
+# data (a queryset's .iterator(), a generator, or an async iterator such as
+# .aiterator() for async views) are sent as arrays one element at a time, so
+# memory stays flat however long the list is. Everything else is encoded as usual.
+CHUNK_SIZE = 16 * 1024
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+
+def _is_stream(value):
+    return hasattr(value, '__next__') or hasattr(value, '__anext__')
+
+
+def _pieces(data):
+    '''Split data into JSON text pieces and the iterators to stream in between.'''
+    if isinstance(data, dict) and any(_is_stream(value) for value in data.values()):
+        yield '{'
+        for index, (key, value) in enumerate(data.items()):
+            yield (',' if index else '') + _encoder.encode(str(key)) + ':'
+            yield from _pieces(value)
+        yield '}'
+    elif _is_stream(data):
+        yield data
+    else:
+        yield _encoder.encode(data)
+
+
+def _buffered(pieces):
+    '''Join small pieces into chunks of about CHUNK_SIZE bytes.'''
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def iter_json(data, serialize=None):
+    '''Encode data as JSON chunks, streaming its iterators as arrays (sync iterators only).'''
+    def pieces():
+        for piece in _pieces(data):
+            if isinstance(piece, str):
+                yield piece
+                continue
+            yield '['
+            for index, item in enumerate(piece):
+                yield (',' if index else '') + _encoder.encode(serialize(item) if serialize else item)
+            yield ']'
+    return _buffered(pieces())
+
+
+async def aiter_json(data, serialize=None):
+    '''Async version of iter_json(); streamed iterators may be sync or async.'''
+    buffer, size = [], 0
+    for piece in _pieces(data):
+        if isinstance(piece, str):
+            buffer.append(piece)
+            size += len(piece)
+            continue
+        items = piece if hasattr(piece, '__anext__') else aiterate(piece)
+        buffer.append('[')
+        index = 0
+        async for item in items:
+            text = (',' if index else '') + _encoder.encode(serialize(item) if serialize else item)
+            buffer.append(text)
+            size += len(text)
+            index += 1
+            if size >= CHUNK_SIZE:
+                yield ''.join(buffer).encode()
+                buffer, size = [], 0
+        buffer.append(']')
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+async def aiterate(iterator, batch_size=500):
+    '''
+    Iterate a sync iterator (e.g. over a database cursor) from async code.
+    Items are pulled in batches so there is one thread hop per batch, not per item.
+    '''
+    iterator = iter(iterator)
+    take = sync_to_async(lambda: [item for _, item in zip(range(batch_size), iterator)])
+    while batch := await take():
+        for item in batch:
+            yield item
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+async def _agzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    '''
+    Stream `data` as JSON; see the module comment for what is streamed.
+    `serialize` converts each streamed element to something JSON serializable.
+    With `is_async` the content is produced by an async generator, which async views
+    need under ASGI (sync iterators would be read into memory first).
+    When a request is given and it accepts gzip, the stream is compressed on the fly.
+    '''
+
+    def __init__(self, data, serialize=None, request=None, is_async=False, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        content = aiter_json(data, serialize) if is_async else iter_json(data, serialize)
+        gzip = request is not None and _ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', ''))
+        if gzip:
+            content = _agzip(content) if is_async else _gzip(content)
+        super().__init__(content, **kwargs)
+        if request is not None:
+            patch_vary_headers(self, ('Accept-Encoding',))
+        if gzip:
+            self['Content-Encoding'] = 'gzip'
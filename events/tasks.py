@@ -1,15 +1,49 @@
 from django.utils.timezone import now
 from datetime import timedelta
-from .models import Event
+from .models import Event, Chat
+from .archive import archive_chats
+from .partitions import drop_expired_partitions, rotate_messages
+from .singleflight import invalidate
+from .event_pages import event_page_key
+from .purge import purge_event
+from .mail import prune_outbound_email
+from .notifications import queue_daily_digests, queue_event_reminders
 
 def update_event_status():
     """Update the status of events from 'active' to 'inactive' if the event date has passed."""
     # Query all active events where the event date has passed
     events_to_update = Event.objects.filter(status='ACTIVE', date__lte=now())
+    updated = list(events_to_update.values_list('pk', flat=True))
     events_to_update.update(status='INACTIVE')  # Bulk update the status
+    # update() sends no signals, so drop the cached pages here.
+    invalidate(*(event_page_key(pk) for pk in updated))
 
 def delete_old_events():
-    """Delete events that are older than 2 days."""
+    """Delete events that are older than 2 days, archiving their chat histories first."""
     threshold_date = now() - timedelta(days=2)
     old_events = Event.objects.filter(date__lt=threshold_date)
-    old_events.delete()  # Cascade deletes RSVPs, tasks, and chats associated with the event
\ No newline at end of file
+    archive_chats(Chat.objects.filter(event__in=old_events))
+    old_events.delete()  # Cascade deletes RSVPs, tasks, and chats associated with the event
+    # Messages in closed partitions aren't cascaded; their tables are dropped once all their chats are gone.
+    drop_expired_partitions()
+
+def purge_deleted_events():
+    """Finish deleting the events hidden by delete_event, in case their queued purge didn't run."""
+    for event_id in Event.all_objects.filter(deleted_at__isnull=False).values_list('pk', flat=True):
+        purge_event(event_id)
+
+def rotate_message_partition():
+    """Move the current window of messages into its own partition."""
+    rotate_messages()
+
+def send_event_reminders():
+    """Queue reminder emails for the events starting within the reminder lead time."""
+    queue_event_reminders()
+
+def send_daily_digests():
+    """Queue each user's digest of upcoming events and open tasks."""
+    queue_daily_digests()
+
+def delete_old_emails():
+    """Delete the sent and failed emails of the outbound queue once their retention has passed."""
+    prune_outbound_email()
@@ -0,0 +1,11 @@
+from django import template
+from ..directory import display_names
+
+register = template.Library()
+
+@register.filter
+def display_name(user_id):
+    '''Print a user's name from its id through the display name cache, without loading the User.'''
+    if user_id is None:
+        return None
+    return display_names.get(user_id)
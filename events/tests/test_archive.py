@@ -0,0 +1,80 @@
+import os
+import tempfile
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.archive import INDEX_FILE, ChatArchive, archive_chats
+from events.models import Chat, Event, Message, RSVP
+from events.tasks import delete_old_events
+
+
+class ChatArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(CHAT_ARCHIVE_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.guest = User.objects.create_user(username='guest', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+        self.event = Event.objects.create(title="Picnic", date=now() + timedelta(days=1), created_by=self.user)
+        RSVP.objects.create(user=self.guest, event=self.event, status='YES')
+        self.chat = self.event.chat
+        self.chat.add_message(self.user, "Bring snacks")
+        self.chat.add_message(self.guest, "Will do")
+
+    def test_archive_round_trip(self):
+        self.assertEqual(archive_chats(Chat.objects.filter(pk=self.chat.pk)), 1)
+
+        archived = ChatArchive(self.directory).get(self.chat.id)
+        self.assertEqual(archived['event_title'], "Picnic")
+        self.assertEqual(archived['participants'], sorted([self.user.id, self.guest.id]))
+        self.assertEqual([msg['message'] for msg in archived['messages']], ["Bring snacks", "Will do"])
+        self.assertEqual(archived['messages'][1]['user'], "guest")
+        self.assertIsNone(ChatArchive(self.directory).get(self.chat.id + 1))
+
+    def test_each_chat_is_archived_with_its_own_messages(self):
+        quiet = Event.objects.create(title="Quiet", date=now() + timedelta(days=1), created_by=self.user)
+        busy = Event.objects.create(title="Busy", date=now() + timedelta(days=1), created_by=self.user)
+        busy.chat.add_message(self.user, "Hello")
+        self.chat.add_message(self.user, "Later")
+        self.assertEqual(archive_chats(Chat.objects.filter(event__in=[self.event, quiet, busy])), 3)
+
+        archive = ChatArchive(self.directory)
+        self.assertEqual(len(archive.get(self.chat.id)['messages']), 3)
+        self.assertEqual(archive.get(quiet.chat.id)['messages'], [])
+        self.assertEqual([msg['message'] for msg in archive.get(busy.chat.id)['messages']], ["Hello"])
+
+    def test_reader_picks_up_appends_and_ignores_torn_records(self):
+        archive = ChatArchive(self.directory)
+        self.assertNotIn(self.chat.id, archive)
+        archive_chats(Chat.objects.filter(pk=self.chat.pk))
+        self.assertIn(self.chat.id, archive)
+
+        # A later archive of the same chat wins; a partial index record is ignored.
+        self.chat.add_message(self.user, "One more")
+        archive_chats(Chat.objects.filter(pk=self.chat.pk))
+        with open(os.path.join(self.directory, INDEX_FILE), 'ab') as index:
+            index.write(b'\x01\x02\x03')
+        self.assertEqual(len(archive.get(self.chat.id)['messages']), 3)
+
+    def test_purge_archives_history_served_to_participants_only(self):
+        chat_id = self.chat.id
+        Event.objects.filter(pk=self.event.pk).update(date=now() - timedelta(days=3))
+        delete_old_events()
+        self.assertFalse(Message.objects.filter(chat_id=chat_id).exists())
+
+        url = reverse('archived_messages', args=[chat_id])
+        self.client.force_login(self.guest)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([msg['message'] for msg in response.json()['messages']], ["Bring snacks", "Will do"])
+
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,99 @@
+from unittest import mock
+from django.test import TestCase, TransactionTestCase
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from events.auth_cache import cached_user, get_cached_user, user_cache_key
+
+
+def user_queries(captured):
+    return [query['sql'] for query in captured.captured_queries if 'FROM "auth_user"' in query['sql']]
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+
+    def test_user_is_loaded_from_the_cache(self):
+        self.client.get(reverse('unread_counts'))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.id)))
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('unread_counts'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(user_queries(captured), [])
+
+    async def test_async_views_use_the_cache(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get(reverse('unread_counts'))
+
+        with mock.patch('events.auth_cache.auth.get_user') as get_user:
+            response = await self.async_client.get(reverse('unread_counts'))
+        self.assertEqual(response.status_code, 200)
+        get_user.assert_not_called()
+
+    def test_saving_the_user_drops_the_cached_user(self):
+        self.client.get(reverse('unread_counts'))
+        self.user.first_name = 'Changed'
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+
+    def test_password_change_logs_other_sessions_out(self):
+        self.client.get(reverse('unread_counts'))
+        self.user.set_password('new password')
+        self.user.save()
+
+        response = self.client.get(reverse('event_list'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response.url)
+
+    def test_cached_user_with_another_session_hash_is_reloaded(self):
+        self.client.get(reverse('unread_counts'))
+        entry = cache.get(user_cache_key(self.user.id))
+        cache.set(user_cache_key(self.user.id), {**entry, 'session_auth_hash': 'stale'})
+
+        response = self.client.get(reverse('event_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache.get(user_cache_key(self.user.id)), entry)
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(reverse('unread_counts'))
+        entry = cache.get(user_cache_key(self.user.id))
+        self.assertNotIn('password', entry['fields'])
+        self.assertNotIn(self.user.password, repr(entry))
+
+        # Saving a user rebuilt from the cache leaves the deferred password alone.
+        user = cached_user(entry)
+        user.first_name = 'Changed'
+        user.save()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('password'))
+        self.assertEqual(cached_user(entry).password, self.user.password)
+
+
+class CachedUserCommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+
+    def old_session_request(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        return request
+
+    def test_user_cached_before_a_password_change_commits_is_dropped(self):
+        before = User.objects.get(pk=self.user.pk)
+        with transaction.atomic():
+            self.user.set_password('new password')
+            self.user.save()
+            # A request on another connection still reads the user from before the change.
+            with mock.patch('events.auth_cache.auth.get_user', return_value=before):
+                self.assertEqual(get_cached_user(self.old_session_request()), self.user)
+            self.assertIsNotNone(cache.get(user_cache_key(self.user.id)))
+
+        self.assertFalse(get_cached_user(self.old_session_request()).is_authenticated)
@@ -0,0 +1,141 @@
+import random
+import threading
+import time
+from unittest import mock
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.db import OperationalError, connection
+from django.utils.timezone import now, timedelta
+from events.models import ChatParticipant, Event, RSVP
+from events.rsvps import update_capacity, upsert_rsvp
+
+
+class CapacityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='host', password='password')
+        self.guests = [User.objects.create_user(username=f'guest{i}', password='password') for i in range(4)]
+        self.event = Event.objects.create(title="Concert", date=now() + timedelta(days=1), created_by=self.host, capacity=2)
+
+    def respond(self, guest, status):
+        return upsert_rsvp(guest.id, self.event.id, status)
+
+    def statuses(self):
+        return dict(RSVP.objects.filter(event=self.event).values_list('user__username', 'status'))
+
+    def confirmed_count(self):
+        self.event.refresh_from_db()
+        return self.event.confirmed_count
+
+    def in_chat(self, guest):
+        return ChatParticipant.objects.filter(chat=self.event.chat, user=guest).exists()
+
+    def test_responses_beyond_capacity_join_the_waitlist(self):
+        self.assertEqual([self.respond(guest, 'YES') for guest in self.guests[:3]], ['YES', 'YES', 'WAIT'])
+        self.assertEqual(self.confirmed_count(), 2)
+        self.assertFalse(self.in_chat(self.guests[2]))
+
+        # Confirmed guests keep their place when they answer again.
+        self.assertIsNone(self.respond(self.guests[0], 'YES'))
+        self.assertIsNone(self.respond(self.guests[2], 'YES'))
+        self.assertEqual(self.confirmed_count(), 2)
+
+    def test_cancellations_promote_the_waitlist_in_order(self):
+        for guest in self.guests:
+            self.respond(guest, 'YES')
+        self.assertEqual(self.respond(self.guests[0], 'NO'), 'NO')
+        self.assertEqual(self.statuses(), {'guest0': 'NO', 'guest1': 'YES', 'guest2': 'YES', 'guest3': 'WAIT'})
+        self.assertTrue(self.in_chat(self.guests[2]))
+        self.assertEqual(self.confirmed_count(), 2)
+
+        # Leaving the waitlist frees nothing.
+        self.respond(self.guests[3], 'MAYBE')
+        self.assertEqual(self.confirmed_count(), 2)
+
+    def test_deleted_responses_free_their_seat(self):
+        for guest in self.guests[:3]:
+            self.respond(guest, 'YES')
+        self.guests[0].delete()
+        self.assertEqual(self.statuses(), {'guest1': 'YES', 'guest2': 'YES'})
+        self.assertEqual(self.confirmed_count(), 2)
+
+    def test_capacity_changes_recount_and_promote(self):
+        for guest in self.guests:
+            self.respond(guest, 'YES')
+        self.event.capacity = 3
+        self.event.save()
+        self.assertEqual(update_capacity(self.event.id), [self.guests[2].id])
+        self.assertEqual(self.confirmed_count(), 3)
+
+        self.event.capacity = None
+        self.event.save()
+        self.assertEqual(update_capacity(self.event.id), [self.guests[3].id])
+        self.assertEqual(set(self.statuses().values()), {'YES'})
+
+    def test_editing_the_event_keeps_the_counter_and_deletion(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        self.respond(self.guests[0], 'YES')
+        Event.objects.filter(pk=self.event.pk).update(deleted_at=now())
+
+        self.client.force_login(self.host)
+        with mock.patch('events.views.event_views.get_object_or_404', return_value=stale):
+            response = self.client.post(reverse('event_edit', args=[self.event.pk]), {
+                'title': "Renamed", 'date': (now() + timedelta(days=2)).strftime('%Y-%m-%dT%H:%M'), 'capacity': 2,
+            })
+        self.assertRedirects(response, reverse('event_detail', args=[self.event.pk]), fetch_redirect_response=False)
+        event = Event.all_objects.get(pk=self.event.pk)
+        self.assertEqual((event.title, event.confirmed_count), ("Renamed", 1))
+        self.assertIsNotNone(event.deleted_at)
+
+
+class CapacityStressTests(TransactionTestCase):
+    '''Many guests answering YES at the same moment must never oversubscribe an event.'''
+
+    def setUp(self):
+        self.host = User.objects.create_user(username='host', password='password')
+        self.guests = User.objects.bulk_create([User(username=f'guest{i}') for i in range(40)])
+        self.event = Event.objects.create(title="Launch", date=now() + timedelta(days=1), created_by=self.host, capacity=10)
+
+    def respond_at_once(self, responses):
+        '''Send (user id, status) responses from one thread each, all at the same moment.'''
+        start = threading.Barrier(len(responses))
+        failed = []
+
+        def respond(user_id, status):
+            try:
+                start.wait()
+                for attempt in range(50):
+                    try:
+                        upsert_rsvp(user_id, self.event.id, status)
+                        return
+                    except OperationalError:
+                        # SQLite reports some lock contention instead of waiting; retry like a client would.
+                        time.sleep(random.uniform(0, 0.01 * attempt))
+                failed.append(user_id)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=respond, args=response) for response in responses]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failed, [])
+
+    def test_concurrent_responses_fill_exactly_the_capacity(self):
+        self.respond_at_once([(guest.id, 'YES') for guest in self.guests])
+        statuses = list(RSVP.objects.filter(event=self.event).values_list('status', flat=True))
+        self.assertEqual(statuses.count('YES'), 10)
+        self.assertEqual(statuses.count('WAIT'), 30)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.confirmed_count, 10)
+
+        # Simultaneous cancellations are each replaced by one waitlisted guest.
+        confirmed = RSVP.objects.filter(event=self.event, status='YES').values_list('user_id', flat=True)
+        self.respond_at_once([(user_id, 'NO') for user_id in confirmed[:5]])
+        self.assertEqual(RSVP.objects.filter(event=self.event, status='YES').count(), 10)
+        self.assertEqual(RSVP.objects.filter(event=self.event, status='WAIT').count(), 25)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.confirmed_count, 10)
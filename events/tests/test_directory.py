@@ -0,0 +1,76 @@
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.directory import DisplayNameCache, display_names
+from events.singleflight import invalidate
+from events.event_pages import event_page_key
+from events.models import Event, RSVP, Task
+
+
+class DisplayNameCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(username=f'user{i}', password='password') for i in range(3)]
+        self.ids = [user.id for user in self.users]
+
+    def test_names_are_loaded_in_one_query_and_then_cached(self):
+        names = DisplayNameCache()
+        with self.assertNumQueries(1):
+            self.assertEqual(names.get_many(self.ids + [None, 0]), {user.id: user.username for user in self.users})
+        with self.assertNumQueries(0):
+            self.assertEqual(names.get(self.ids[0]), 'user0')
+
+        # Another process finds the names in the shared cache.
+        with self.assertNumQueries(0):
+            self.assertEqual(DisplayNameCache().get(self.ids[1]), 'user1')
+
+    @override_settings(USER_DIRECTORY={'max_size': 2, 'shared': False})
+    def test_least_recently_used_names_are_evicted(self):
+        names = DisplayNameCache()
+        names.get_many(self.ids[:2])
+        names.get(self.ids[0])
+        names.get(self.ids[2])
+        self.assertEqual(len(names), 2)
+        with self.assertNumQueries(0):
+            names.get(self.ids[0])
+        with self.assertNumQueries(1):
+            names.get(self.ids[1])
+
+    def test_saving_a_user_invalidates_the_name(self):
+        self.assertEqual(display_names.get(self.ids[0]), 'user0')
+        self.users[0].username = 'renamed'
+        self.users[0].save()
+        self.assertEqual(display_names.get(self.ids[0]), 'renamed')
+
+
+class DisplayNameTemplateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='host', password='password')
+        self.event = Event.objects.create(title="Picnic", date=now() + timedelta(days=1), created_by=self.user)
+        self.client.force_login(self.user)
+
+    def add_guests(self, count):
+        for i in range(count):
+            guest = User.objects.create_user(username=f'guest{self.event.rsvps.count()}', password='password')
+            RSVP.objects.create(user=guest, event=self.event, status='YES')
+            Task.objects.create(event=self.event, description="Bring food", assigned_to=guest)
+
+    @override_settings(USER_DIRECTORY={'shared': False})
+    def test_event_detail_queries_do_not_grow_with_rsvps(self):
+        self.add_guests(1)
+        self.client.get(reverse('event_detail', args=[self.event.pk]))  # warm the request user cache
+        display_names.clear()
+        invalidate(event_page_key(self.event.pk))
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('event_detail', args=[self.event.pk]))
+        self.add_guests(5)
+        display_names.clear()
+        with self.assertNumQueries(len(few.captured_queries)):
+            response = self.client.get(reverse('event_detail', args=[self.event.pk]))
+        self.assertContains(response, "guest5")
+        self.assertContains(response, "<strong>Organizer:</strong> host", html=False)
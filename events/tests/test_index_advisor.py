@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.utils.timezone import now, timedelta
+from events.models import Event, RSVP, Message
+from events.index_advisor import (
+    QueryFingerprintMiddleware,
+    analyze,
+    fingerprint,
+    load_log,
+    recording,
+)
+
+
+class IndexAdvisorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.event = Event.objects.create(
+            title="Test Event",
+            date=now() + timedelta(days=1),
+            created_by=self.user,
+        )
+
+    def test_fingerprint_normalizes_literals(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "t"."id" IN (%s, %s, %s) AND "t"."name" = \'x\' LIMIT 21'),
+            'SELECT * FROM "t" WHERE "t"."id" IN (...) AND "t"."name" = ? LIMIT ?',
+        )
+        # Digits inside identifiers are not literals.
+        self.assertEqual(fingerprint('SELECT "T3"."id" FROM "events_rsvp" T3'), 'SELECT "T3"."id" FROM "events_rsvp" T3')
+
+    def test_recording_groups_by_fingerprint(self):
+        with recording() as recorder:
+            Event.objects.filter(pk=1).exists()
+            Event.objects.filter(pk=2).exists()
+        counts = [sample['count'] for sample in recorder.samples.values()]
+        self.assertEqual(counts, [2])
+
+    def test_reports_redundant_rsvp_indexes(self):
+        with recording() as recorder:
+            RSVP.objects.create(user=self.user, event=self.event, status='YES')
+            list(RSVP.objects.filter(event=self.event, status='YES'))
+        report = analyze(recorder)
+
+        redundant = {index['name']: index for index in report['redundant']}
+        # The single-column `event` index is a prefix of `event, status` and `event, user`.
+        self.assertIn('events_rsvp_event_i_c6aeef_idx', redundant)
+        self.assertEqual(redundant['events_rsvp_event_i_c6aeef_idx']['writes'], 1)
+        self.assertNotIn('unique_user_event_rsvp', [index['name'] for index in report['unused']])
+
+    def test_reports_missing_message_index(self):
+        with recording() as recorder:
+            list(Message.objects.filter(chat=self.event.chat).order_by('created_at'))
+        report = analyze(recorder)
+
+        missing = [(entry['table'], entry['columns']) for entry in report['missing']]
+        self.assertIn(('events_message', ['chat_id', 'created_at']), missing)
+
+    def test_middleware_log_and_command(self):
+        log_path = os.path.join(tempfile.mkdtemp(), 'fingerprints.jsonl')
+
+        def view(request):
+            list(Message.objects.filter(chat=self.event.chat).order_by('created_at'))
+            return HttpResponse()
+
+        with override_settings(INDEX_ADVISOR_LOG=log_path):
+            middleware = QueryFingerprintMiddleware(view)
+            middleware(RequestFactory().get('/'))
+            middleware(RequestFactory().get('/'))
+
+        recorder = load_log(log_path)
+        self.assertEqual([sample['count'] for sample in recorder.samples.values()], [2])
+
+        out = StringIO()
+        call_command('index_advisor', log=log_path, json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['missing'][0]['reads'], 2)
@@ -0,0 +1,74 @@
+from concurrent.futures import wait
+from unittest.mock import patch
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.ingest import MessageWriter, members_cache_key, write_messages
+from events.models import Chat, ChatParticipant, Event, Message, RSVP
+
+
+class MessageWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.guest = User.objects.create_user(username='guest', password='password')
+        self.event = Event.objects.create(title="Picnic", date=now() + timedelta(days=1), created_by=self.user)
+        RSVP.objects.create(user=self.guest, event=self.event, status='YES')
+        self.chat = self.event.chat
+        self.writer = MessageWriter(max_delay=0.2)
+        self.addCleanup(self.writer.stop)
+
+    def test_queued_messages_are_committed_together(self):
+        with patch('events.ingest.write_messages', wraps=write_messages) as batch_writer:
+            futures = [
+                self.writer.submit(Message(chat_id=self.chat.id, user_id=user.id, message=f"Message {i}"))
+                for i, user in enumerate([self.user, self.guest, self.user])
+            ]
+            wait(futures, timeout=5)
+        self.assertEqual(batch_writer.call_count, 1)
+        ids = [future.result().id for future in futures]
+        self.assertEqual(ids, sorted(ids))
+
+        self.chat.refresh_from_db()
+        self.assertEqual((self.chat.message_count, self.chat.last_message_id), (3, ids[-1]))
+        self.assertEqual(self.chat.last_message_preview, "Message 2")
+        receipts = dict(ChatParticipant.objects.filter(chat=self.chat).values_list('user_id', 'read_message_count'))
+        self.assertEqual(receipts, {self.user.id: 3, self.guest.id: 2})
+
+    def test_a_bad_message_does_not_fail_its_batch(self):
+        good = self.writer.submit(Message(chat_id=self.chat.id, user_id=self.user.id, message="Hello"))
+        bad = self.writer.submit(Message(chat_id=self.chat.id + 100, user_id=self.user.id, message="Lost"))
+        wait([good, bad], timeout=5)
+        self.assertIsNotNone(good.result().id)
+        self.assertIsNotNone(bad.exception())
+        self.assertEqual(list(Message.objects.values_list('message', flat=True)), ["Hello"])
+
+
+@override_settings(CHAT_INGEST={'sync': True})
+class IngestViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.guest = User.objects.create_user(username='guest', password='password')
+        self.event = Event.objects.create(title="Picnic", date=now() + timedelta(days=1), created_by=self.user)
+        self.url = reverse('add_message', args=[self.event.chat.pk])
+
+    def test_only_members_can_post(self):
+        self.client.force_login(self.guest)
+        self.assertEqual(self.client.post(self.url, {"message": "Hi"}, content_type="application/json").status_code, 404)
+
+        # Joining the chat drops the cached member list.
+        RSVP.objects.create(user=self.guest, event=self.event, status='YES')
+        response = self.client.post(self.url, {"message": "Hi"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], Chat.objects.get(pk=self.event.chat.pk).last_message_id)
+
+    def test_member_list_cached_before_the_change_commits_is_dropped(self):
+        RSVP.objects.create(user=self.guest, event=self.event, status='YES')
+        self.client.force_login(self.guest)
+        with self.captureOnCommitCallbacks(execute=True):
+            ChatParticipant.objects.filter(chat=self.event.chat, user=self.guest).delete()
+            # Another request reloading the members before the commit.
+            cache.set(members_cache_key(self.event.chat.pk), {self.user.id, self.guest.id})
+        self.assertEqual(self.client.post(self.url, {"message": "Hi"}, content_type="application/json").status_code, 404)
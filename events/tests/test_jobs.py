@@ -0,0 +1,70 @@
+import time
+from django.test import TestCase, override_settings
+from django_q.brokers import get_broker
+from django_q.models import Failure, OrmQ, Success
+from django_q.signing import SignedPackage
+from events.jobs import HIGH, LOW, enqueue, run_queued
+
+calls = []
+
+
+def record(value):
+    calls.append(value)
+    return value
+
+
+def fail():
+    raise RuntimeError("Job failed")
+
+
+def slow():
+    time.sleep(5)
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def queued(self, queue):
+        return [SignedPackage.loads(package.payload) for package in OrmQ.objects.filter(key=queue)]
+
+    def test_priorities_have_their_own_queues(self):
+        enqueue('events.tests.test_jobs.record', 'invite')
+        enqueue('events.tests.test_jobs.record', 'purge', priority=LOW)
+        self.assertEqual([task['args'] for task in self.queued('DjangoQ')], [('invite',)])
+        self.assertEqual([task['args'] for task in self.queued('maintenance')], [('purge',)])
+
+        self.assertEqual(run_queued(LOW), 1)
+        self.assertEqual(calls, ['purge'])
+        self.assertEqual(get_broker('DjangoQ').queue_size(), 1)
+
+    @override_settings(JOB_TIMEOUTS={'events.tests.test_jobs.record': 5})
+    def test_jobs_carry_their_timeout(self):
+        enqueue('events.tests.test_jobs.record', 1)
+        enqueue('events.purge.purge_event', 1, priority=LOW)
+        self.assertEqual(self.queued('DjangoQ')[0]['timeout'], 5)
+        self.assertEqual(self.queued('maintenance')[0]['timeout'], 600)
+
+    def test_run_queued_saves_results_and_acknowledges(self):
+        enqueue('events.tests.test_jobs.record', 'a')
+        enqueue('events.tests.test_jobs.record', 'b')
+        self.assertEqual(run_queued(HIGH), 2)
+        self.assertEqual(sorted(calls), ['a', 'b'])
+        self.assertEqual(Success.objects.count(), 2)
+        self.assertFalse(OrmQ.objects.exists())
+
+    def test_failed_jobs_stay_queued_for_a_retry(self):
+        enqueue('events.tests.test_jobs.fail')
+        self.assertEqual(run_queued(HIGH), 1)
+        self.assertIn("Job failed", Failure.objects.get().result)
+        # Locked until the retry is due, so it isn't run again meanwhile.
+        self.assertEqual(OrmQ.objects.count(), 1)
+        self.assertEqual(get_broker('DjangoQ').queue_size(), 0)
+
+    @override_settings(JOB_TIMEOUTS={'events.tests.test_jobs.slow': 1})
+    def test_jobs_are_stopped_at_their_timeout(self):
+        enqueue('events.tests.test_jobs.slow')
+        started = time.monotonic()
+        run_queued(HIGH)
+        self.assertLess(time.monotonic() - started, 4)
+        self.assertTrue(Failure.objects.exists())
@@ -0,0 +1,184 @@
+import socketserver
+import threading
+from email import message_from_bytes
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.jobs import run_queued
+from events.mail import DEFAULT_OUTBOUND_EMAIL, prune_outbound_email, send_queued_email
+from events.models import OutboundEmail
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    '''
+    A local SMTP server for tests. It records the messages it accepts and the connections
+    made to it, and answers RCPT for the addresses in `replies` with the given reply.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.replies = {}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost ready')
+        recipients = []
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip('<> ')
+                reply = self.server.replies.get(address, '250 OK')
+                if reply.startswith('250'):
+                    recipients.append(address)
+                self.reply(reply)
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                self.server.messages.append((recipients, message_from_bytes(data)))
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:  # MAIL, RSET, NOOP
+                self.reply('250 OK')
+
+
+class OutboundEmailTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        self.addCleanup(self.smtp.stop)
+        settings = override_settings(
+            EMAIL_BACKEND='events.mail.QueuedEmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.port,
+            EMAIL_USE_TLS=False,
+            OUTBOUND_EMAIL={'backend': 'django.core.mail.backends.smtp.EmailBackend'},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def queue(self, *recipients):
+        get_connection().send_messages([
+            EmailMessage(f"Hello {recipient}", "Body", 'evently@example.com', [recipient]) for recipient in recipients
+        ])
+
+    def make_due(self):
+        OutboundEmail.objects.filter(status=OutboundEmail.QUEUED).update(next_attempt_at=now())
+
+    def test_password_reset_is_queued_and_sent_in_the_background(self):
+        User.objects.create_user(username='user', email='user@example.com', password='password')
+
+        response = self.client.post(reverse('password_reset'), {'email': 'user@example.com'})
+        self.assertRedirects(response, reverse('password_reset_done'))
+        self.assertEqual(self.smtp.messages, [])
+        self.assertEqual(OutboundEmail.objects.get().to, ['user@example.com'])
+
+        self.assertEqual(run_queued(), 1)
+        [(recipients, message)] = self.smtp.messages
+        self.assertEqual(recipients, ['user@example.com'])
+        self.assertIn('/reset/', message.get_payload())
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.SENT)
+
+    def test_batch_is_sent_over_one_connection(self):
+        self.queue(*(f'guest{i}@example.com' for i in range(5)))
+        self.assertEqual(send_queued_email(), 5)
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(len(self.smtp.messages), 5)
+
+    @override_settings(OUTBOUND_EMAIL={**DEFAULT_OUTBOUND_EMAIL, 'batch_size': 2})
+    def test_full_batches_queue_another_run(self):
+        self.queue(*(f'guest{i}@example.com' for i in range(5)))
+        run_queued()
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+
+    def test_transient_failures_are_retried_with_backoff(self):
+        self.smtp.replies['busy@example.com'] = '451 Try again later'
+        self.queue('busy@example.com', 'ok@example.com')
+
+        self.assertEqual(send_queued_email(), 1)
+        busy = OutboundEmail.objects.get(to=['busy@example.com'])
+        self.assertEqual((busy.status, busy.attempts), (OutboundEmail.QUEUED, 1))
+        self.assertIn('451', busy.last_error)
+        self.assertGreater(busy.next_attempt_at, now() + timedelta(seconds=29))
+        # Not due yet.
+        self.assertEqual(send_queued_email(), 0)
+
+        del self.smtp.replies['busy@example.com']
+        self.make_due()
+        self.assertEqual(send_queued_email(), 1)
+        self.assertEqual(OutboundEmail.objects.get(pk=busy.pk).status, OutboundEmail.SENT)
+
+    def test_permanent_failures_are_not_retried(self):
+        self.smtp.replies['gone@example.com'] = '550 No such user'
+        self.queue('gone@example.com')
+        send_queued_email()
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.FAILED)
+        self.assertIn('550', email.last_error)
+
+    def test_unreachable_server_fails_the_batch_until_max_attempts(self):
+        self.queue('a@example.com', 'b@example.com')
+        self.smtp.stop()
+
+        for attempt in range(DEFAULT_OUTBOUND_EMAIL['max_attempts']):
+            self.make_due()
+            self.assertEqual(send_queued_email(), 0)
+        statuses = set(OutboundEmail.objects.values_list('status', 'attempts'))
+        self.assertEqual(statuses, {(OutboundEmail.FAILED, DEFAULT_OUTBOUND_EMAIL['max_attempts'])})
+
+    def test_claimed_emails_are_skipped(self):
+        self.queue('a@example.com')
+        OutboundEmail.objects.update(next_attempt_at=now() + timedelta(seconds=300))
+        self.assertEqual(send_queued_email(), 0)
+        self.assertEqual(self.smtp.messages, [])
+
+    def test_html_alternative_is_kept(self):
+        send_mail("Hi", "Body", 'evently@example.com', ['a@example.com'], html_message="<p>Hi</p>")
+        send_queued_email()
+        [(_, message)] = self.smtp.messages
+        self.assertEqual([part.get_content_type() for part in message.get_payload()], ['text/plain', 'text/html'])
+
+    def test_old_sent_and_failed_emails_are_pruned(self):
+        self.queue('old-sent@example.com', 'old-failed@example.com', 'old-queued@example.com', 'new-sent@example.com')
+        emails = {email.to[0]: email for email in OutboundEmail.objects.all()}
+        old = now() - timedelta(days=DEFAULT_OUTBOUND_EMAIL['retention_days'] + 1)
+        OutboundEmail.objects.filter(pk=emails['old-sent@example.com'].pk).update(status=OutboundEmail.SENT, next_attempt_at=old)
+        OutboundEmail.objects.filter(pk=emails['old-failed@example.com'].pk).update(status=OutboundEmail.FAILED, next_attempt_at=old)
+        OutboundEmail.objects.filter(pk=emails['old-queued@example.com'].pk).update(next_attempt_at=old)
+        OutboundEmail.objects.filter(pk=emails['new-sent@example.com'].pk).update(status=OutboundEmail.SENT)
+
+        self.assertEqual(prune_outbound_email(batch_size=1), 2)
+        self.assertEqual(
+            sorted(email.to[0] for email in OutboundEmail.objects.all()),
+            ['new-sent@example.com', 'old-queued@example.com'],
+        )
+
+    def test_unsupported_messages_are_rejected(self):
+        with self.assertRaises(ValueError):
+            get_connection().send_messages([EmailMessage("Hi", "Body", to=['a@example.com'], bcc=['b@example.com'])])
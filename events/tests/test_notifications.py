@@ -0,0 +1,142 @@
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.core import mail
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.jobs import run_queued
+from events.models import Event, OutboundEmail, RSVP, Task
+from events.notifications import queue_daily_digests, queue_event_reminders, send_invitations
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create_user(username='host', email='host@example.com', password='password')
+        self.event = self.create_event("Harbour festival", hours=3)
+
+    def create_event(self, title, hours):
+        return Event.objects.create(
+            title=title, date=now() + timedelta(hours=hours), description="Boats", location="Pier",
+            created_by=self.host,
+        )
+
+    def guest(self, name, email=True):
+        return User.objects.create_user(username=name, email=f'{name}@example.com' if email else '', password='password')
+
+    def recipients(self):
+        return sorted(address for email in OutboundEmail.objects.all() for address in email.to)
+
+    def test_reminders_go_to_the_organizer_and_confirmed_attendees(self):
+        RSVP.objects.create(user=self.guest('yes'), event=self.event, status='YES')
+        RSVP.objects.create(user=self.guest('maybe'), event=self.event, status='MAYBE')
+        RSVP.objects.create(user=self.guest('noemail', email=False), event=self.event, status='YES')
+        later = self.create_event("Next month", hours=24 * 30)
+        RSVP.objects.create(user=self.guest('later'), event=later, status='YES')
+
+        queue_event_reminders()
+        self.assertEqual(self.recipients(), ['host@example.com', 'yes@example.com'])
+        email = OutboundEmail.objects.get(to=['yes@example.com'])
+        self.assertEqual(email.subject, 'Reminder: "Harbour festival" is coming up')
+        self.assertIn("Hi yes,", email.body)
+        self.assertIn("at Pier", email.body)
+
+    def test_hidden_events_get_no_reminders(self):
+        RSVP.objects.create(user=self.guest('yes'), event=self.event, status='YES')
+        Event.objects.filter(pk=self.event.pk).update(deleted_at=now())
+        queue_event_reminders()
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_reminders_are_queued_once(self):
+        RSVP.objects.create(user=self.guest('yes'), event=self.event, status='YES')
+        queue_event_reminders()
+        queue_event_reminders()
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+        # A rescheduled event is announced again.
+        Event.objects.filter(pk=self.event.pk).update(date=self.event.date + timedelta(hours=1))
+        queue_event_reminders()
+        self.assertEqual(OutboundEmail.objects.count(), 4)
+
+    def test_queries_dont_grow_with_recipients(self):
+        def count_queries():
+            OutboundEmail.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                queue_event_reminders()
+            return len(queries)
+
+        RSVP.objects.create(user=self.guest('first'), event=self.event, status='YES')
+        few = count_queries()
+        for i in range(20):
+            RSVP.objects.create(user=self.guest(f'guest{i}'), event=self.create_event(f"Event {i}", hours=5), status='YES')
+        self.assertEqual(count_queries(), few)
+        self.assertEqual(OutboundEmail.objects.count(), 42)
+
+    def test_each_user_gets_one_digest_of_their_events_and_tasks(self):
+        attendee = self.guest('attendee')
+        RSVP.objects.create(user=attendee, event=self.event, status='YES')
+        RSVP.objects.create(user=attendee, event=self.create_event("Regatta", hours=48), status='YES')
+        Task.objects.create(event=self.event, assigned_to=attendee, description="Bring rope")
+        helper = self.guest('helper')
+        Task.objects.create(event=self.event, assigned_to=helper, description="Set up chairs")
+        Task.objects.create(event=self.event, assigned_to=helper, description="Done already", is_completed=True)
+        self.guest('idle')
+
+        queue_daily_digests()
+        self.assertEqual(self.recipients(), ['attendee@example.com', 'helper@example.com', 'host@example.com'])
+        body = OutboundEmail.objects.get(to=['attendee@example.com']).body
+        self.assertIn("Harbour festival", body)
+        self.assertIn("Regatta", body)
+        self.assertIn('Bring rope (for "Harbour festival"', body)
+        body = OutboundEmail.objects.get(to=['helper@example.com']).body
+        self.assertIn("Set up chairs", body)
+        self.assertNotIn("Upcoming events", body)
+        self.assertNotIn("Done already", body)
+
+    def test_digests_are_queued_once_a_day(self):
+        queue_daily_digests()
+        queue_daily_digests()
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    @override_settings(OUTBOUND_EMAIL={'backend': 'django.core.mail.backends.locmem.EmailBackend'})
+    def test_queued_reminders_are_sent_by_the_workers(self):
+        RSVP.objects.create(user=self.guest('yes'), event=self.event, status='YES')
+        queue_event_reminders()
+        self.assertEqual(run_queued(), 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['host@example.com', 'yes@example.com'])
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+
+
+class InvitationTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create_user(username='host', email='host@example.com', password='password')
+        self.event = Event.objects.create(
+            title="Harbour festival", date=now() + timedelta(days=3), description="Boats", location="Pier",
+            created_by=self.host,
+        )
+        self.guests = [User.objects.create_user(username=f'guest{i}', email=f'guest{i}@example.com') for i in range(3)]
+        self.silent = User.objects.create_user(username='silent')
+        self.client.force_login(self.host)
+
+    def invite(self, users):
+        return self.client.post(
+            reverse('event_detail', args=[self.event.pk]), {'user_ids': [user.pk for user in users]},
+            content_type='application/json', headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+
+    def test_invitation_emails_are_written_by_the_workers(self):
+        self.assertEqual(self.invite([*self.guests, self.silent]).status_code, 200)
+        self.assertEqual(RSVP.objects.filter(event=self.event, status='MAYBE').count(), 4)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+        run_queued()
+        self.assertEqual(sorted(email.to[0] for email in OutboundEmail.objects.all()), [f'guest{i}@example.com' for i in range(3)])
+        email = OutboundEmail.objects.get(to=['guest0@example.com'])
+        self.assertEqual(email.subject, 'You\'re invited to "Harbour festival"')
+        self.assertIn('host invited you to "Harbour festival"', email.body)
+
+    def test_invitations_are_emailed_once(self):
+        self.invite(self.guests[:1])
+        run_queued()
+        send_invitations(self.event.pk, [self.guests[0].pk])
+        self.assertEqual(OutboundEmail.objects.count(), 1)
@@ -0,0 +1,96 @@
+import re
+import tempfile
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils.timezone import now, timedelta
+from events.models import Event, Message, MessagePartition
+from events.partitions import chat_messages, count_chat_messages, message_tables, rotate_messages
+from events.search import search_messages
+from events.tasks import delete_old_events
+
+
+def table_exists(name):
+    return name in connection.introspection.table_names()
+
+
+class MessagePartitionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.event = Event.objects.create(title="Picnic", date=now() + timedelta(days=1), created_by=self.user)
+        self.chat = self.event.chat
+
+    def test_rotation_keeps_messages_readable(self):
+        first = self.chat.add_message(self.user, "Bring snacks")
+        partition = rotate_messages()
+        self.assertTrue(table_exists(partition.table_name))
+        self.assertEqual((partition.min_id, partition.max_id), (first.id, first.id))
+        self.assertFalse(Message.objects.exists())
+
+        second = self.chat.add_message(self.user, "Bring drinks")
+        self.assertGreater(second.id, first.id)
+        messages = chat_messages([self.chat.id], since=self.chat.created_at)
+        self.assertEqual([msg.message for msg in messages], ["Bring snacks", "Bring drinks"])
+        self.assertEqual(messages[0].user, self.user)
+        self.assertEqual(count_chat_messages(self.chat.id, second.id), 2)
+        self.assertEqual(len(search_messages(self.user, "bring")['results']), 2)
+
+    def test_rotation_renames_the_live_table_into_the_partition(self):
+        self.chat.add_message(self.user, "Hello")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT type, name FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL", [Message._meta.db_table])
+            live_schema = sorted(cursor.fetchall())
+            partition = rotate_messages()
+
+            cursor.execute(f'PRAGMA foreign_key_list("{partition.table_name}")')
+            self.assertEqual(cursor.fetchall(), [])
+            cursor.execute("SELECT type, name FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL", [partition.table_name])
+            self.assertEqual(
+                sorted(cursor.fetchall()),
+                [('index', partition.table_name + name.removeprefix(Message._meta.db_table)) for kind, name in live_schema if kind == 'index']
+                + [('table', partition.table_name)],
+            )
+            cursor.execute("SELECT type, name FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL", [Message._meta.db_table])
+            self.assertEqual(sorted(cursor.fetchall()), live_schema)
+            cursor.execute("PRAGMA integrity_check")
+            self.assertEqual(cursor.fetchall(), [('ok',)])
+            cursor.execute("PRAGMA foreign_key_check")
+            self.assertEqual(cursor.fetchall(), [])
+
+    def test_rotation_rolls_back_when_a_foreign_key_cannot_be_dropped(self):
+        self.chat.add_message(self.user, "Hello")
+        with mock.patch('events.partitions._REFERENCES_RE', re.compile('(?!)')):
+            with self.assertRaises(ValueError):
+                rotate_messages()
+        self.assertFalse(MessagePartition.objects.exists())
+        self.assertEqual([msg.message for msg in Message.objects.all()], ["Hello"])
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA integrity_check")
+            self.assertEqual(cursor.fetchall(), [('ok',)])
+
+    def test_reads_skip_partitions_older_than_the_chat(self):
+        self.chat.add_message(self.user, "Hello")
+        partition = rotate_messages()
+        self.assertIn(partition.table_name, message_tables(since=self.chat.created_at))
+        self.assertEqual(message_tables(since=partition.ends_at + timedelta(seconds=1)), [Message._meta.db_table])
+        self.assertIsNone(rotate_messages())
+
+    def test_purge_drops_partitions_without_live_chats(self):
+        other = Event.objects.create(title="Concert", date=now() + timedelta(days=10), created_by=self.user)
+        self.chat.add_message(self.user, "old picnic note")
+        old_partition = rotate_messages()
+        other.chat.add_message(self.user, "concert note")
+        self.chat.add_message(self.user, "late picnic note")
+        shared_partition = rotate_messages()
+
+        Event.objects.filter(pk=self.event.pk).update(date=now() - timedelta(days=3))
+        with tempfile.TemporaryDirectory() as archive_dir, override_settings(CHAT_ARCHIVE_DIR=archive_dir):
+            delete_old_events()
+
+        # The first partition only held the purged chat; the second still has a live one.
+        self.assertFalse(table_exists(old_partition.table_name))
+        self.assertTrue(table_exists(shared_partition.table_name))
+        self.assertEqual(list(MessagePartition.objects.values_list('table_name', flat=True)), [shared_partition.table_name])
+        self.assertEqual([msg.message for msg in chat_messages([other.chat.id])], ["concert note"])
+        self.assertEqual(len(search_messages(self.user, "note")['results']), 1)
@@ -0,0 +1,79 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.jobs import LOW, run_queued
+from events.models import Chat, ChatParticipant, Event, Message, RSVP, Task
+from events.purge import purge_event
+from events.search import search_events
+from events.tasks import purge_deleted_events
+
+
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='host', password='password')
+        self.guests = [User.objects.create_user(username=f'guest{i}', password='password') for i in range(5)]
+        self.event = Event.objects.create(
+            title="Harbour festival", date=now() + timedelta(days=1), description="Boats", location="Pier",
+            created_by=self.host,
+        )
+        self.chat = Chat.objects.get(event=self.event)
+        RSVP.objects.bulk_create([RSVP(user=guest, event=self.event, status='YES') for guest in self.guests])
+        ChatParticipant.objects.bulk_create([ChatParticipant(chat=self.chat, user=guest) for guest in self.guests])
+        Task.objects.bulk_create([Task(event=self.event, description=f"Task {i}") for i in range(3)])
+        for i in range(7):
+            self.chat.add_message(self.host, f"Message {i}")
+        self.other = Event.objects.create(title="Other", date=now() + timedelta(days=1), created_by=self.host)
+
+    def delete(self):
+        self.client.force_login(self.host)
+        response = self.client.post(reverse('event_delete', args=[self.event.pk]))
+        self.assertRedirects(response, reverse('event_list'))
+
+    def test_delete_hides_the_event_and_queues_the_purge(self):
+        self.delete()
+
+        self.assertFalse(Event.objects.filter(pk=self.event.pk).exists())
+        self.assertIsNotNone(Event.all_objects.get(pk=self.event.pk).deleted_at)
+        self.assertEqual(RSVP.objects.filter(event_id=self.event.pk).count(), 5)
+
+        self.assertEqual(run_queued(LOW), 1)
+        self.assertFalse(Event.all_objects.filter(pk=self.event.pk).exists())
+        self.assertFalse(RSVP.objects.filter(event_id=self.event.pk).exists())
+
+    def test_hidden_event_is_gone_for_its_guests(self):
+        self.delete()
+        self.client.force_login(self.guests[0])
+
+        self.assertEqual(self.client.get(reverse('event_detail', args=[self.event.pk])).status_code, 404)
+        self.assertEqual(list(self.client.get(reverse('rsvp_list')).context['event_rsvp_status']), [])
+        self.assertEqual(self.client.get(reverse('unread_counts')).json(), {})
+        self.assertEqual(search_events(self.guests[0], 'harbour')['results'], [])
+
+    def test_purge_deletes_in_batches(self):
+        self.delete()
+
+        with CaptureQueriesContext(connection) as captured:
+            purge_event(self.event.pk, batch_size=2)
+        batches = [query for query in captured.captured_queries if query['sql'].lstrip().startswith('DELETE') and 'LIMIT' in query['sql']]
+        # 7 messages, 6 participants (the host too, so a last empty batch), 5 RSVPs and 3 tasks.
+        self.assertEqual(len(batches), 4 + 4 + 3 + 2)
+        self.assertFalse(Event.all_objects.filter(pk=self.event.pk).exists())
+        self.assertFalse(Chat.objects.filter(pk=self.chat.pk).exists())
+        self.assertFalse(Message.objects.filter(chat_id=self.chat.pk).exists())
+        self.assertFalse(RSVP.objects.filter(event_id=self.event.pk).exists())
+        self.assertTrue(Event.objects.filter(pk=self.other.pk).exists())
+
+    def test_purge_leaves_visible_events_alone(self):
+        purge_event(self.event.pk)
+        self.assertEqual(RSVP.objects.filter(event=self.event).count(), 5)
+
+    def test_scheduled_task_purges_what_is_left(self):
+        self.delete()
+        purge_deleted_events()
+        self.assertFalse(Event.all_objects.filter(pk=self.event.pk).exists())
+        self.assertEqual(ChatParticipant.objects.filter(chat_id=self.chat.pk).count(), 0)
@@ -0,0 +1,102 @@
+import json
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.timezone import now, timedelta
+from events.event_pages import event_page_key
+from events.ingest import members_cache_key
+from events.models import Event, RSVP, ChatParticipant
+from events.rsvps import upsert_rsvp, upsert_rsvps
+
+
+class UpsertRsvpTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='host', password='password')
+        self.guest = User.objects.create_user(username='guest', password='password')
+        self.event = Event.objects.create(title="Dinner", date=now() + timedelta(days=1), created_by=self.host)
+        self.chat = self.event.chat
+
+    def is_participant(self):
+        return ChatParticipant.objects.filter(chat=self.chat, user=self.guest).exists()
+
+    def test_new_response_creates_the_rsvp_and_joins_the_chat(self):
+        self.assertTrue(upsert_rsvp(self.guest.id, self.event.id, 'YES'))
+        rsvp = RSVP.objects.get(user=self.guest, event=self.event)
+        self.assertEqual(rsvp.status, 'YES')
+        self.assertIsNotNone(rsvp.timestamp)
+        self.assertTrue(self.is_participant())
+
+    def test_unchanged_response_skips_side_effects(self):
+        upsert_rsvp(self.guest.id, self.event.id, 'YES')
+        cache.set(members_cache_key(self.chat.id), {self.host.id, self.guest.id})
+        # Views pass the events with a capacity, which they have loaded anyway.
+        with self.assertNumQueries(3):  # savepoint, upsert, release
+            self.assertIsNone(upsert_rsvp(self.guest.id, self.event.id, 'YES', capped=set()))
+        self.assertIsNotNone(cache.get(members_cache_key(self.chat.id)))
+
+    def test_changed_response_updates_the_rsvp_and_leaves_the_chat(self):
+        upsert_rsvp(self.guest.id, self.event.id, 'YES')
+        timestamp = RSVP.objects.get(user=self.guest, event=self.event).timestamp
+        cache.set(members_cache_key(self.chat.id), {self.host.id, self.guest.id})
+
+        self.assertTrue(upsert_rsvp(self.guest.id, self.event.id, 'NO'))
+        rsvp = RSVP.objects.get(user=self.guest, event=self.event)
+        self.assertEqual((rsvp.status, rsvp.timestamp), ('NO', timestamp))
+        self.assertFalse(self.is_participant())
+        self.assertIsNone(cache.get(members_cache_key(self.chat.id)))
+
+    def test_caches_refilled_before_the_response_commits_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_rsvp(self.guest.id, self.event.id, 'YES')
+            # Other requests reloading the caches before the commit.
+            cache.set(members_cache_key(self.chat.id), {self.host.id})
+            cache.set(event_page_key(self.event.id), 'stale page')
+        self.assertIsNone(cache.get(members_cache_key(self.chat.id)))
+        self.assertIsNone(cache.get(event_page_key(self.event.id)))
+
+    def test_several_responses_return_only_the_changed_ones(self):
+        other = Event.objects.create(title="Lunch", date=now() + timedelta(days=2), created_by=self.host)
+        upsert_rsvp(self.guest.id, self.event.id, 'MAYBE')
+        changed = upsert_rsvps(self.guest.id, {self.event.id: 'MAYBE', other.id: 'YES'})
+        self.assertEqual(changed, {other.id: 'YES'})
+        self.assertEqual(RSVP.objects.filter(user=self.guest).count(), 2)
+        self.assertTrue(ChatParticipant.objects.filter(chat=other.chat, user=self.guest).exists())
+
+
+class RsvpBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='host', password='password')
+        self.guest = User.objects.create_user(username='guest', password='password')
+        self.events = [
+            Event.objects.create(title=f"Event {i}", date=now() + timedelta(days=1), created_by=self.host)
+            for i in range(3)
+        ]
+        self.client.force_login(self.guest)
+
+    def post(self, responses):
+        return self.client.post(reverse('rsvp_batch'), json.dumps({'responses': responses}), content_type='application/json')
+
+    def test_responses_are_saved_together(self):
+        RSVP.objects.create(user=self.guest, event=self.events[2], status='NO')
+        response = self.post({event.id: 'YES' for event in self.events[:2]} | {self.events[2].id: 'NO'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['changed'], {str(self.events[0].id): 'YES', str(self.events[1].id): 'YES'})
+        self.assertEqual(data['errors'], {})
+        self.assertEqual(ChatParticipant.objects.filter(user=self.guest).count(), 2)
+
+    def test_invalid_responses_are_reported(self):
+        past = self.events[1]
+        Event.objects.filter(pk=past.pk).update(status='INACTIVE')
+        data = self.post({self.events[0].id: 'YES', past.id: 'YES', self.events[2].id: 'SOON', 0: 'YES'}).json()
+        self.assertEqual(list(data['changed']), [str(self.events[0].id)])
+        self.assertEqual(set(data['errors']), {str(past.id), str(self.events[2].id), '0'})
+        self.assertEqual(RSVP.objects.filter(user=self.guest).count(), 1)
+
+    def test_malformed_requests_are_rejected(self):
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertEqual(self.post(['YES']).status_code, 400)
+        self.assertEqual(self.client.get(reverse('rsvp_batch')).status_code, 400)
@@ -0,0 +1,115 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.models import Event, Message, RSVP
+from events.search import fts_query, search_events, search_messages
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.other = User.objects.create_user(username='other', password='password')
+        self.event = Event.objects.create(title="Picnic", date=now() + timedelta(days=1), created_by=self.user)
+        self.other_event = Event.objects.create(title="Secret", date=now() + timedelta(days=1), created_by=self.other)
+        self.chat = self.event.chat
+        self.other_chat = self.other_event.chat
+
+    def test_fts_query_quotes_terms(self):
+        self.assertEqual(fts_query('bring "snacks" OR NEAR(x'), '"bring" "snacks" "OR" "NEAR" "x"*')
+        self.assertIsNone(fts_query('  !? '))
+
+    def test_search_is_scoped_to_user_chats(self):
+        self.chat.add_message(self.user, "Bring snacks please")
+        self.other_chat.add_message(self.other, "Bring snacks to the secret party")
+
+        results = search_messages(self.user, "snacks")['results']
+        self.assertEqual([result['chat_id'] for result in results], [self.chat.id])
+        self.assertEqual(results[0]['chat_name'], "Picnic")
+        self.assertEqual(results[0]['user'], "testuser")
+
+        # Joining the chat makes its history searchable.
+        RSVP.objects.create(user=self.user, event=self.other_event, status='YES')
+        self.assertEqual(len(search_messages(self.user, "snacks")['results']), 2)
+
+    def test_results_are_ranked_and_highlighted(self):
+        self.chat.add_message(self.user, "snacks")
+        self.chat.add_message(self.user, "<b>Snacks</b> and snacks and more snacks")
+
+        results = search_messages(self.user, "snacks")['results']
+        self.assertEqual(results[0]['snippet'], "&lt;b&gt;<mark>Snacks</mark>&lt;/b&gt; and <mark>snacks</mark> and more <mark>snacks</mark>")
+        self.assertEqual(results[1]['snippet'], "<mark>snacks</mark>")
+
+    def test_prefix_match_and_pagination(self):
+        for i in range(3):
+            self.chat.add_message(self.user, f"sandwich number {i}")
+
+        first = search_messages(self.user, "sandw", page=1, page_size=2)
+        second = search_messages(self.user, "sandw", page=2, page_size=2)
+        self.assertEqual(len(first['results']), 2)
+        self.assertTrue(first['has_next'])
+        self.assertEqual(len(second['results']), 1)
+        self.assertFalse(second['has_next'])
+
+    def test_deleted_messages_leave_the_index(self):
+        message = self.chat.add_message(self.user, "temporary note")
+        Message.objects.filter(pk=message.pk).delete()
+        self.assertEqual(search_messages(self.user, "temporary")['results'], [])
+
+        self.chat.add_message(self.user, "another note")
+        self.event.delete()
+        self.assertEqual(search_messages(self.user, "note")['results'], [])
+
+    def test_search_view(self):
+        self.chat.add_message(self.user, "Meet at the gate")
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('search_chat_messages'), {'q': 'gate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['snippet'], "Meet at the <mark>gate</mark>")
+
+
+class EventSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.other = User.objects.create_user(username='other', password='password')
+        self.picnic = Event.objects.create(
+            title="Picnic", description="Sandwiches and lemonade", location="City park",
+            date=now() + timedelta(days=1), created_by=self.user,
+        )
+        self.concert = Event.objects.create(
+            title="Park concert", description="Jazz in the park", location="Bandstand",
+            date=now() + timedelta(days=10), created_by=self.other,
+        )
+        self.secret = Event.objects.create(
+            title="Secret picnic", description="", location="Park",
+            date=now() + timedelta(days=2), created_by=self.other,
+        )
+        RSVP.objects.create(user=self.user, event=self.concert, status='MAYBE')
+
+    def test_search_is_scoped_to_user_events_and_ranked(self):
+        results = search_events(self.user, "park")['results']
+        # A title match ranks above a location match; the event the user isn't part of is hidden.
+        self.assertEqual(results, [self.concert, self.picnic])
+        self.assertIn("<mark>park</mark>", results[1].snippet)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.picnic.description = "Barbecue"
+        self.picnic.save()
+        self.assertEqual(search_events(self.user, "barbecue")['results'], [self.picnic])
+        self.assertEqual(search_events(self.user, "lemonade")['results'], [])
+
+        self.picnic.delete()
+        self.assertEqual(search_events(self.user, "barbecue")['results'], [])
+
+    def test_date_and_status_filters(self):
+        self.assertEqual(search_events(self.user, "park", date_to=now() + timedelta(days=5))['results'], [self.picnic])
+        self.assertEqual(search_events(self.user, "park", date_from=now() + timedelta(days=5))['results'], [self.concert])
+        Event.objects.filter(pk=self.concert.pk).update(status='INACTIVE')
+        self.assertEqual(search_events(self.user, "park", status='INACTIVE')['results'], [self.concert])
+
+    def test_search_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('event_search'), {'q': 'lemon', 'status': 'ACTIVE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['results']['results'], [self.picnic])
+        self.assertContains(response, "<mark>lemonade</mark>")
@@ -0,0 +1,129 @@
+from unittest import mock
+import threading
+import time
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import Http404
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.models import Event, RSVP
+from events.purge import hide_event
+from events.singleflight import get_or_compute, lock_key
+from events.event_pages import event_page_key
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='value', delay=0):
+        self.calls += 1
+        time.sleep(delay)
+        return value
+
+    def test_value_is_computed_once_and_cached(self):
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'value')
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'value')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute('key', lambda: self.compute(delay=0.2), 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_waits_for_another_process_computing_the_value(self):
+        cache.add(lock_key('key'), True)
+        threading.Timer(0.1, lambda: cache.set('key', ('theirs', 0.1, time.time() + 60))).start()
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'theirs')
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(SINGLE_FLIGHT={'wait': 0.1})
+    def test_computes_when_the_other_process_takes_too_long(self):
+        cache.add(lock_key('key'), True)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'value')
+        self.assertEqual(self.calls, 1)
+
+    @mock.patch('events.singleflight.random.random', return_value=0.5)
+    def test_values_close_to_expiry_are_refreshed_early(self, random):
+        # Took 10 seconds to compute and expires in 1.
+        cache.set('key', ('old', 10, time.time() + 1), 60)
+        self.assertEqual(get_or_compute('key', lambda: self.compute('new'), 60), 'new')
+        self.assertEqual(get_or_compute('key', lambda: self.compute('newer'), 60), 'new')
+        self.assertEqual(self.calls, 1)
+
+    @mock.patch('events.singleflight.random.random', return_value=0.5)
+    def test_values_far_from_expiry_are_not_refreshed(self, random):
+        cache.set('key', ('cached', 0.1, time.time() + 30), 60)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'cached')
+        self.assertEqual(self.calls, 0)
+
+    def test_stale_value_is_served_while_another_caller_refreshes(self):
+        cache.set('key', ('old', 10, time.time() + 1), 60)
+        cache.add(lock_key('key'), True)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'old')
+        self.assertEqual(self.calls, 0)
+
+    def test_errors_are_not_cached(self):
+        def fail():
+            raise Http404
+        with self.assertRaises(Http404):
+            get_or_compute('key', fail, 60)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'value')
+
+
+class EventPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='host', password='password')
+        self.guest = User.objects.create_user(username='guest', password='password')
+        self.event = Event.objects.create(title="Launch", date=now() + timedelta(days=1), created_by=self.user)
+        self.client.force_login(self.user)
+
+    def test_event_page_data_is_cached(self):
+        url = reverse('event_detail', args=[self.event.pk])
+        self.client.get(url)
+        self.assertIsNotNone(cache.get(event_page_key(self.event.pk)))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertContains(response, "Launch")
+        page_queries = [q['sql'] for q in captured.captured_queries if 'FROM "events_event"' in q['sql'] or 'FROM "events_task"' in q['sql']]
+        self.assertEqual(page_queries, [])
+
+    def test_rsvp_changes_refresh_the_page(self):
+        url = reverse('event_detail', args=[self.event.pk])
+        self.client.get(url)
+        RSVP.objects.create(user=self.guest, event=self.event, status='YES')
+        self.assertIsNone(cache.get(event_page_key(self.event.pk)))
+        self.assertEqual(self.client.get(url).context['attendees_count'], 1)
+
+    def test_page_refilled_before_the_change_commits_is_dropped(self):
+        url = reverse('event_detail', args=[self.event.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            RSVP.objects.create(user=self.guest, event=self.event, status='YES')
+            # Another request recomputing the page before the commit.
+            self.client.get(url)
+            self.assertIsNotNone(cache.get(event_page_key(self.event.pk)))
+        self.assertIsNone(cache.get(event_page_key(self.event.pk)))
+
+    def test_hidden_event_is_dropped_from_the_cache_on_commit(self):
+        url = reverse('event_detail', args=[self.event.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            hide_event(self.event.pk)
+            cache.set(event_page_key(self.event.pk), 'stale page')
+        self.assertIsNone(cache.get(event_page_key(self.event.pk)))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_missing_event_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('event_detail', args=[self.event.pk + 1])).status_code, 404)
@@ -0,0 +1,50 @@
+import gzip
+import json
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from events.streaming import CHUNK_SIZE, StreamingJsonResponse, aiter_json, iter_json
+
+
+class StreamingJsonTests(SimpleTestCase):
+    def test_iterators_are_streamed_as_arrays(self):
+        data = {'total': 3, 'items': iter(range(3)), 'meta': {'page': 1}}
+        self.assertEqual(b''.join(iter_json(data)), b'{"total":3,"items":[0,1,2],"meta":{"page":1}}')
+        self.assertEqual(b''.join(iter_json(iter([]))), b'[]')
+
+    def test_large_streams_are_chunked(self):
+        chunks = list(iter_json(('x' * 100 for _ in range(1000)), serialize=str.upper))
+        self.assertGreater(len(chunks), 1)
+        self.assertLessEqual(max(map(len, chunks)), CHUNK_SIZE + 200)
+        self.assertEqual(json.loads(b''.join(chunks)), ['X' * 100] * 1000)
+
+    async def test_async_encoding_matches_sync(self):
+        data = {'items': iter([{'a': 1}, {'a': 2}]), 'done': True}
+        chunks = [chunk async for chunk in aiter_json(data)]
+        self.assertEqual(b''.join(chunks), b'{"items":[{"a":1},{"a":2}],"done":true}')
+
+    def test_gzip_on_the_fly(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = StreamingJsonResponse({'items': iter(range(5))}, request=request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(json.loads(gzip.decompress(b''.join(response.streaming_content))), {'items': [0, 1, 2, 3, 4]})
+
+
+class StreamingViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        for i in range(3):
+            User.objects.create_user(username=f'guest{i}', password='password')
+
+    async def test_search_users_is_streamed_and_gzipped(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('search_users'), {'q': 'guest'}, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        users = json.loads(gzip.decompress(b''.join([chunk async for chunk in response.streaming_content])))
+        self.assertEqual([user['username'] for user in users], ['guest0', 'guest1', 'guest2'])
+
+        response = await self.async_client.get(reverse('search_users'), {'q': 'guest'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(json.loads(b''.join([chunk async for chunk in response.streaming_content]))), 3)
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from events.models import Event, Message
+from events.partitions import rotate_messages
+from events.throttling import poll_interval, take_token
+
+
+class PollIntervalTests(TestCase):
+    def test_busy_chats_poll_faster_than_quiet_ones(self):
+        busy = poll_interval(recent_messages=20, last_activity=now(), event_passed=False)
+        quiet = poll_interval(recent_messages=1, last_activity=now(), event_passed=False)
+        self.assertLess(busy, quiet)
+        self.assertGreaterEqual(busy, 2)
+
+    def test_idle_chats_back_off(self):
+        recent = poll_interval(recent_messages=0, last_activity=now() - timedelta(minutes=10), event_passed=False)
+        old = poll_interval(recent_messages=0, last_activity=now() - timedelta(days=3), event_passed=False)
+        self.assertEqual(recent, 30)
+        self.assertEqual(old, 300)
+
+    def test_past_events_poll_at_max_interval(self):
+        self.assertEqual(poll_interval(recent_messages=50, last_activity=now(), event_passed=True), 300)
+
+
+class ChatRateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.event = Event.objects.create(
+            title="Test Event",
+            date=now() + timedelta(days=1),
+            created_by=self.user,
+        )
+        Message.objects.create(chat=self.event.chat, user=self.user, message="Hello")
+        self.client.force_login(self.user)
+
+    async def test_response_includes_poll_interval(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('fetch_latest_messages', args=[self.event.chat.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual(data['poll_interval'], 5)
+
+    async def test_poll_interval_counts_messages_moved_into_a_partition(self):
+        await sync_to_async(rotate_messages)()
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('fetch_latest_messages', args=[self.event.chat.pk]))
+        data = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual([msg['message'] for msg in data['messages']], ["Hello"])
+        self.assertEqual(data['poll_interval'], 5)
+
+    @override_settings(CHAT_RATE_LIMIT={'rate': 0.5, 'burst': 2})
+    @mock.patch('events.throttling.time.time', return_value=1002.0)  # halfway through a 4 second window
+    def test_requests_over_the_limit_get_retry_after(self, time):
+        url = reverse('fetch_latest_messages', args=[self.event.chat.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+
+    @override_settings(CHAT_RATE_LIMIT={'rate': 0.5, 'burst': 2})
+    @mock.patch('events.throttling.time.time', return_value=1000.0)
+    async def test_concurrent_requests_cannot_share_a_token(self, time):
+        results = await asyncio.gather(*(take_token(self.user.pk) for _ in range(10)))
+        self.assertEqual(results.count(0), 2)
+        self.assertEqual(set(results) - {0}, {4})
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from django.test import SimpleTestCase, override_settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from events import tiered_cache
+from events.tiered_cache import TieredCache
+
+
+class FlakyCache(LocMemCache):
+    '''Stand-in for Redis that can be taken down.'''
+    down = False
+
+    def __getattribute__(self, name):
+        if type(self).down and name in ('get', 'get_many', 'set', 'add', 'set_many', 'delete', 'delete_many', 'incr', 'touch'):
+            raise ConnectionError('shared cache is down')
+        return super().__getattribute__(name)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'events.tests.test_tiered_cache.FlakyCache', 'LOCATION': 'tiered-cache-tests'},
+})
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        tiered_cache._levels.clear()
+        FlakyCache.down = False
+        caches['shared'].clear()
+        # Two processes sharing one backend.
+        self.first = self.make_cache('first')
+        self.second = self.make_cache('second')
+
+    def tearDown(self):
+        FlakyCache.down = False
+
+    def make_cache(self, location, **options):
+        options = {'SYNC_INTERVAL': 0, 'RETRY_AFTER': 0, 'SHARED_ONLY': ['rate:'], **options}
+        return TieredCache(location, {'OPTIONS': options})
+
+    def test_reads_are_served_from_the_local_level(self):
+        self.first.set('key', 'value')
+        # Changed behind the tiered cache's back, so not broadcast.
+        caches['shared'].set('key', 'other')
+        self.assertEqual(self.first.get('key'), 'value')
+        self.assertEqual(self.second.get('key'), 'other')
+
+    def test_local_copies_expire_after_the_local_timeout(self):
+        cache = self.make_cache('third', LOCAL_TIMEOUT=0)
+        cache.set('key', 'value')
+        caches['shared'].set('key', 'other')
+        self.assertEqual(cache.get('key'), 'other')
+
+    def test_writes_and_deletes_are_broadcast(self):
+        self.first.set('key', 1)
+        self.assertEqual(self.second.get('key'), 1)
+
+        self.first.set('key', 2)
+        self.assertEqual(self.second.get('key'), 2)
+
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+        self.second.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.first.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.first.delete_many(['a', 'b'])
+        self.assertEqual(self.second.get_many(['a', 'b']), {})
+
+    def test_missed_broadcasts_clear_the_local_level(self):
+        self.first.set('key', 1)
+        self.second.get('key')
+        caches['shared'].delete(tiered_cache.broadcast_key(1))
+        self.first.set('key', 2)
+        caches['shared'].set('key', 3)
+        self.assertEqual(self.second.get('key'), 3)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.make_cache('third', MAX_ENTRIES=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        caches['shared'].set_many({'a': 'shared', 'b': 'shared', 'c': 'shared'})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'shared', 'c': 3})
+
+    def test_shared_only_keys_skip_the_local_level(self):
+        self.first.set('rate:1', 1)
+        caches['shared'].set('rate:1', 2)
+        self.assertEqual(self.first.get('rate:1'), 2)
+
+    def test_keeps_working_from_the_local_level_while_the_backend_is_down(self):
+        cache = self.make_cache('third', LOCAL_TIMEOUT=0, RETRY_AFTER=60)
+        cache.set('key', 'value')
+        FlakyCache.down = True
+
+        with self.assertLogs('events.tiered_cache', 'WARNING'):
+            self.assertEqual(cache.get('key'), 'value')
+        self.assertTrue(cache.degraded)
+        cache.set('written', 'offline')
+        self.assertTrue(cache.add('added', 1))
+        self.assertFalse(cache.add('added', 2))
+        self.assertEqual(cache.incr('added'), 2)
+        self.assertEqual(cache.get_many(['key', 'written', 'added']), {'key': 'value', 'written': 'offline', 'added': 2})
+
+    def test_recovers_when_the_backend_is_back(self):
+        self.first.set('key', 'value')
+        FlakyCache.down = True
+        with self.assertLogs('events.tiered_cache', 'WARNING'):
+            self.first.set('written', 'offline')
+        FlakyCache.down = False
+        self.second.set('key', 'changed')
+
+        # Broadcasts were missed, so entries read from the backend are dropped;
+        # entries written during the outage are kept.
+        self.assertEqual(self.first.get('key'), 'changed')
+        self.assertFalse(self.first.degraded)
+        self.assertEqual(self.first.get('written'), 'offline')
+
+    def test_timeouts(self):
+        self.first.set('key', 'value', timeout=0)
+        self.assertIsNone(self.first.get('key'))
+        self.first.set('key', 'value', timeout=None)
+        self.assertTrue(self.first.touch('key', 1))
+        self.first.set('expiring', 'value', timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.first.get('expiring'))
+
+    def test_async_get(self):
+        self.first.set('key', 'value')
+        self.assertEqual(asyncio.run(self.first.aget('key')), 'value')
+        self.assertEqual(asyncio.run(self.first.aget('missing', 'default')), 'default')
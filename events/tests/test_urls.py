@@ -1,9 +1,9 @@
 from django.test import TestCase
 from django.urls import reverse, resolve
 from events.views.auth_views import login_view, logout_view, register
-from events.views.event_views import index, event_list, event_detail, event_form
-from events.views.rsvp_views import rsvp_list, rsvp_event, update_rsvp_list
-from events.views.chat_views import chat_tabs, get_chats, add_message, fetch_latest_messages
+from events.views.event_views import index, event_list, event_search, event_detail, event_form
+from events.views.rsvp_views import rsvp_list, rsvp_event, update_rsvp_list, rsvp_batch
+from events.views.chat_views import chat_tabs, get_chats, add_message, fetch_latest_messages, unread_counts, mark_chat_read, archived_messages
 from events.views.task_views import create_task, reload_task_list, edit_task, toggle_task_completion
 from events.views.auth_views import (
     CustomPasswordResetView,
@@ -56,6 +56,11 @@ class TestUrls(TestCase):
         view = resolve(url)
         self.assertEqual(view.func, event_list)
 
+    def test_event_search_url(self):
+        url = reverse('event_search')
+        view = resolve(url)
+        self.assertEqual(view.func, event_search)
+
     def test_event_detail_url(self):
         url = reverse('event_detail', kwargs={'pk': 1})
         view = resolve(url)
@@ -101,6 +106,26 @@ class TestUrls(TestCase):
         view = resolve(url)
         self.assertEqual(view.func, fetch_latest_messages)
 
+    def test_unread_counts_url(self):
+        url = reverse('unread_counts')
+        view = resolve(url)
+        self.assertEqual(view.func, unread_counts)
+
+    def test_mark_chat_read_url(self):
+        url = reverse('mark_chat_read', kwargs={'chat_id': 1})
+        view = resolve(url)
+        self.assertEqual(view.func, mark_chat_read)
+
+    def test_archived_messages_url(self):
+        url = reverse('archived_messages', kwargs={'chat_id': 1})
+        view = resolve(url)
+        self.assertEqual(view.func, archived_messages)
+
+    def test_rsvp_batch_url(self):
+        url = reverse('rsvp_batch')
+        view = resolve(url)
+        self.assertEqual(view.func, rsvp_batch)
+
     def test_update_rsvp_list_url(self):
         url = reverse('update_rsvp_list', kwargs={'pk': 1})
         view = resolve(url)
@@ -1,4 +1,5 @@
-from django.test import TestCase
+import json
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from ..models import Event, Task, RSVP, Chat, ChatParticipant, Message
@@ -7,6 +8,7 @@ from django.db.models.signals import post_save
 from events.signals import create_chat_for_event, update_chat_participants
 from unittest.mock import patch
 from django.http import JsonResponse
+from asgiref.sync import sync_to_async
 
 class ViewTests(TestCase):
     @classmethod
@@ -94,12 +96,63 @@ class ViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, self.event.title)
 
+    def test_event_detail_paginates_rsvps(self):
+        '''Test that the organizer sees the RSVPs one page at a time, with their names.'''
+        guests = User.objects.bulk_create([User(username=f"guest{i:02}") for i in range(55)])
+        RSVP.objects.bulk_create([RSVP(user=guest, event=self.event, status="YES") for guest in guests])
+
+        response = self.client.get(reverse("event_detail", args=[self.event.pk]))
+        self.assertEqual(len(response.context["rsvp_page"]["rsvps"]), 50)
+        self.assertTrue(response.context["rsvp_page"]["has_next"])
+        self.assertEqual(response.context["attendees_count"], 55)
+        self.assertContains(response, "guest00")
+        self.assertNotContains(response, "guest54")
+
+        response = self.client.get(reverse("event_detail", args=[self.event.pk]), {"rsvp_page": 2})
+        self.assertEqual(len(response.context["rsvp_page"]["rsvps"]), 5)
+        self.assertFalse(response.context["rsvp_page"]["has_next"])
+        self.assertContains(response, "guest54")
+
+        response = self.client.get(reverse("update_rsvp_list", args=[self.event.pk]), {"rsvp_page": 2})
+        self.assertIn("guest54", response.json()["html"])
+
     def test_rsvp_event(self):
         '''Test that the rsvp_event view works correctly.'''
         response = self.client.post(reverse("rsvp_event", args=[self.event.pk]), {"status": "YES"})
         self.assertEqual(response.status_code, 302)  # Redirect to RSVP list
         self.assertTrue(RSVP.objects.filter(user=self.user1, event=self.event, status="YES").exists())
 
+    def test_rsvp_list_filters_and_counts_by_status(self):
+        '''Test that the RSVP inbox is filtered by status, with a count per status and no query per row.'''
+        events = Event.objects.bulk_create([
+            Event(title=f"Invite {i:02}", date=now() + timedelta(days=1, hours=i), created_by=self.user1, status="ACTIVE")
+            for i in range(30)
+        ])
+        RSVP.objects.bulk_create([
+            RSVP(user=self.user2, event=event, status="MAYBE" if i % 3 else "YES") for i, event in enumerate(events)
+        ])
+        past = Event.objects.create(title="Past", date=now() + timedelta(days=1), created_by=self.user1)
+        Event.objects.filter(pk=past.pk).update(status="INACTIVE")
+        RSVP.objects.create(user=self.user2, event=past, status="MAYBE")
+        self.client.login(username="user2", password="password123")
+
+        with self.assertNumQueries(5):  # session user, savepoint, aggregate, page, release
+            response = self.client.get(reverse("rsvp_list"))
+        facets = {facet["label"]: facet["count"] for facet in response.context["facets"]}
+        self.assertEqual(facets, {"All": 30, "Yes": 10, "No": 0, "Maybe": 20, "Waitlisted": 0})
+        self.assertEqual(response.context["maybe_count"], 21)
+        self.assertEqual(len(response.context["event_rsvp_status"]), 24)
+        self.assertTrue(response.context["has_next"])
+
+        response = self.client.get(reverse("rsvp_list"), {"status": "YES"})
+        self.assertEqual([rsvp.status for rsvp in response.context["event_rsvp_status"]], ["YES"] * 10)
+        self.assertFalse(response.context["has_next"])
+        self.assertNotContains(response, "Past")
+
+        response = self.client.get(reverse("rsvp_list"), {"status": "MAYBE", "page": 2})
+        self.assertEqual(len(response.context["event_rsvp_status"]), 0)
+        self.assertFalse(response.context["has_next"])
+
     @patch("django.core.handlers.base.BaseHandler.get_response")
     def test_chat_tabs_view(self, mock_fetch):
         '''Test that the chat_tabs view works correctly.'''
@@ -119,6 +172,7 @@ class ViewTests(TestCase):
         response = self.client.get(reverse("chat_tabs"))
         self.assertContains(response, "Test Event")
 
+    @override_settings(CHAT_INGEST={'sync': True})
     def test_add_message_to_chat(self):
         '''Test that the add_message view works correctly.'''
         response = self.client.post(reverse("add_message", args=[self.chat.pk]), {
@@ -126,6 +180,109 @@ class ViewTests(TestCase):
         }, content_type="application/json")
         self.assertEqual(response.status_code, 200)
         self.assertTrue(Message.objects.filter(chat=self.chat, user=self.user1, message="Test Message").exists())
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.message_count, 1)
+        self.assertEqual(self.chat.last_message_preview, "Test Message")
+
+    async def test_get_chats_async(self):
+        '''Test that the async get_chats view returns the chat summaries without messages.'''
+        message = await sync_to_async(self.chat.add_message)(self.user2, "Hello")
+        await self.async_client.aforce_login(self.user1)
+        response = await self.async_client.get(reverse("get_chats"))
+        self.assertEqual(response.status_code, 200)
+        chats = response.json()
+        self.assertEqual([chat['id'] for chat in chats], [self.chat.id])
+        self.assertEqual(chats[0]['message_count'], 1)
+        self.assertEqual(chats[0]['last_message_id'], message.id)
+        self.assertEqual(chats[0]['last_message_preview'], "Hello")
+        self.assertEqual(chats[0]['unread_count'], 1)
+        self.assertNotIn('messages', chats[0])
+
+    def test_get_chats_sorted_by_recent_activity(self):
+        '''Test that ?sort=recent orders chats by their last message.'''
+        other_event = Event.objects.create(
+            title="Other Event", date=now() + timedelta(days=2), created_by=self.user1, status="ACTIVE"
+        )
+        other_chat = Chat.objects.create(event=other_event)
+        ChatParticipant.objects.create(chat=other_chat, user=self.user1)
+        other_chat.add_message(self.user2, "Older")
+        self.chat.add_message(self.user2, "Newer")
+
+        response = self.client.get(reverse("get_chats"), {"sort": "recent"})
+        self.assertEqual([chat['id'] for chat in response.json()], [self.chat.id, other_chat.id])
+
+    async def test_fetch_latest_messages_async(self):
+        '''Test that the async fetch_latest_messages view returns messages in order.'''
+        await Message.objects.acreate(chat=self.chat, user=self.user1, message="First")
+        await Message.objects.acreate(chat=self.chat, user=self.user2, message="Second")
+        await self.async_client.aforce_login(self.user1)
+        response = await self.async_client.get(reverse("fetch_latest_messages", args=[self.chat.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual([msg['message'] for msg in data['messages']], ["First", "Second"])
+
+    def test_compact_chat_payloads(self):
+        '''Test that ?format=compact and the compact Accept header return columnar data.'''
+        first = self.chat.add_message(self.user1, "First")
+        second = self.chat.add_message(self.user2, "Second")
+
+        data = self.client.get(reverse("fetch_latest_messages", args=[self.chat.pk]), {"format": "compact"}).json()
+        self.assertEqual(data['messages']['id'], [first.id, second.id])
+        self.assertEqual(data['messages']['user'], [self.user1.id, self.user2.id])
+        self.assertEqual(data['messages']['message'], ["First", "Second"])
+        self.assertEqual(data['messages']['created_at'][1], round(second.created_at.timestamp() * 1000))
+        self.assertEqual(data['users'], {str(self.user1.id): "user1", str(self.user2.id): "user2"})
+
+        response = self.client.get(reverse("get_chats"), HTTP_ACCEPT="application/vnd.evently.compact+json")
+        chats = response.json()['chats']
+        self.assertEqual(chats['id'], [self.chat.id])
+        self.assertEqual(chats['last_message_preview'], ["Second"])
+        self.assertEqual(chats['unread_count'], [1])
+
+    def test_unread_counts_and_mark_read(self):
+        '''Test that unread counts exclude own messages and follow the read receipt.'''
+        self.chat.add_message(self.user1, "Mine")
+        first = self.chat.add_message(self.user2, "First")
+        self.chat.add_message(self.user2, "Second")
+
+        response = self.client.get(reverse("unread_counts"))
+        self.assertEqual(response.json(), {str(self.chat.id): 2})
+
+        response = self.client.post(reverse("mark_chat_read", args=[self.chat.pk]),
+                                    {"message_id": first.id}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse("get_chats")).json()[0]['unread_count'], 1)
+
+        # Without a message id the receipt moves to the latest message.
+        self.client.post(reverse("mark_chat_read", args=[self.chat.pk]), content_type="application/json")
+        self.assertEqual(self.client.get(reverse("unread_counts")).json(), {str(self.chat.id): 0})
+
+        # Receipts never move backwards.
+        self.client.post(reverse("mark_chat_read", args=[self.chat.pk]),
+                         {"message_id": first.id}, content_type="application/json")
+        self.assertEqual(self.client.get(reverse("unread_counts")).json(), {str(self.chat.id): 0})
+
+    def test_mark_read_rejects_unknown_messages(self):
+        '''Test that receipts can't be moved past the chat's latest message or set from a malformed body.'''
+        latest = self.chat.add_message(self.user2, "Latest")
+        url = reverse("mark_chat_read", args=[self.chat.pk])
+        for body in ({"message_id": 10**9}, {"message_id": latest.id + 1}, {"message_id": 0}, {"message_id": True}, [1]):
+            response = self.client.post(url, body, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, "{not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ChatParticipant.objects.get(chat=self.chat, user=self.user1).last_read_message_id, 0)
+
+        # New messages still advance the sender's receipt and count as unread for others.
+        self.chat.add_message(self.user1, "Reply")
+        self.chat.add_message(self.user2, "Unread")
+        self.assertEqual(self.client.get(reverse("unread_counts")).json(), {str(self.chat.id): 1})
+
+    def test_mark_read_requires_participation(self):
+        '''Test that users can only mark chats they participate in as read.'''
+        self.client.login(username="user2", password="password123")
+        response = self.client.post(reverse("mark_chat_read", args=[self.chat.pk]), content_type="application/json")
+        self.assertEqual(response.status_code, 404)
 
     def test_toggle_task_completion(self):
         response = self.client.post(reverse("toggle_task", args=[self.task.pk]))
@@ -0,0 +1,109 @@
+import math
+import time
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.timezone import now
+
+# Seconds between polls: busy chats poll at MIN_INTERVAL, idle ones back off to MAX_INTERVAL.
+DEFAULT_CHAT_POLL = {
+    'min_interval': 2,
+    'base_interval': 5,
+    'max_interval': 300,
+    'activity_window': 300,      # seconds of history used for the message rate
+    'target_concurrency': 50,    # in-flight chat requests per process before clients are slowed down
+}
+
+# Per user: `rate` requests per second on average, bursts of up to `burst`.
+DEFAULT_CHAT_RATE_LIMIT = {
+    'rate': 5,
+    'burst': 30,
+}
+
+_in_flight = 0
+
+
+def chat_poll_settings():
+    return {**DEFAULT_CHAT_POLL, **getattr(settings, 'CHAT_POLL', {})}
+
+
+def chat_rate_limit_settings():
+    return {**DEFAULT_CHAT_RATE_LIMIT, **getattr(settings, 'CHAT_RATE_LIMIT', {})}
+
+
+def load_factor():
+    '''How far this process is above its target number of concurrent chat requests (1.0 when below).'''
+    return max(1.0, _in_flight / chat_poll_settings()['target_concurrency'])
+
+
+def poll_interval(recent_messages, last_activity, event_passed):
+    '''
+    Compute the next poll interval in seconds for a chat.
+    Chats with messages in the activity window poll faster the busier they are,
+    quiet chats back off with the time since their last message and chats of
+    past events poll at the maximum interval. The result is stretched by the
+    current load of the process.
+    '''
+    config = chat_poll_settings()
+    if event_passed:
+        interval = config['max_interval']
+    elif recent_messages:
+        interval = config['base_interval'] / math.sqrt(recent_messages)
+    elif last_activity is None:
+        interval = config['max_interval'] / 5
+    else:
+        idle = (now() - last_activity).total_seconds()
+        interval = idle / 20
+    interval = max(config['min_interval'], min(config['max_interval'], interval))
+    return round(min(config['max_interval'], interval * load_factor()), 1)
+
+
+def _count_request(key, timeout):
+    # The async cache API's incr() is a get and a set, so count through the sync one.
+    if cache.add(key, 1, timeout=timeout):
+        return 1
+    return cache.incr(key)
+
+
+async def take_token(user_id):
+    '''
+    Take one token from the user's allowance in the shared cache.
+    Returns 0 when the request is allowed, otherwise the seconds until a token is available.
+    Requests are counted per window of burst / rate seconds with add() and incr(), which
+    are atomic in the shared cache, so concurrent requests can't share a token. A client
+    can spend the end of one window and the start of the next back to back.
+    '''
+    config = chat_rate_limit_settings()
+    window = config['burst'] / config['rate']
+    current = time.time()
+    window_index = int(current // window)
+    key = f'chat-rate:{user_id}:{window_index}'
+    taken = await sync_to_async(_count_request)(key, timeout=math.ceil(window) + 1)
+    if taken <= config['burst']:
+        return 0
+    return math.ceil((window_index + 1) * window - current)
+
+
+def chat_api(view):
+    '''
+    Rate limit an async chat API view per user and track it in the process load.
+    Clients over their limit get a 429 with Retry-After.
+    '''
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        global _in_flight
+        user = await request.auser()
+        retry_after = await take_token(user.pk)
+        if retry_after:
+            response = JsonResponse({'status': 'error', 'message': 'Too many requests.'}, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+
+        _in_flight += 1
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            _in_flight -= 1
+    return wrapper
@@ -0,0 +1,311 @@
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+# A cache backend with two levels: a bounded LRU in each process in front of a shared
+# backend (Redis in production), so hot keys such as sessions, request users and chat
+# member lists are mostly read from memory.
+#
+# Local copies live at most LOCAL_TIMEOUT seconds. Writes and deletes go to the shared
+# backend and are broadcast to the other processes through it: each one bumps a shared
+# version counter and stores the changed key under that version. Every SYNC_INTERVAL
+# seconds a process reads the counter and drops the keys changed since the version it
+# last saw, or its whole local level when it fell too far behind.
+#
+# When the shared backend fails, the cache keeps working from the local level alone
+# (entries are kept until their own timeout) and retries the backend after RETRY_AFTER
+# seconds. Broadcasts missed meanwhile can't be replayed, so on recovery everything that
+# was read from the backend is dropped; entries written during the outage are kept.
+#
+# Keys starting with one of the SHARED_ONLY prefixes skip the local level, for values
+# that are written on almost every request (rate limit buckets) and must be shared.
+VERSION_KEY = 'tiered-cache:version'
+BROADCAST_TIMEOUT = 300
+DEFAULT_OPTIONS = {
+    'SHARED': 'shared',
+    'MAX_ENTRIES': 10000,
+    'LOCAL_TIMEOUT': 30,
+    'SYNC_INTERVAL': 1,
+    'RETRY_AFTER': 5,
+    'MAX_BROADCASTS': 1000,
+    'SHARED_ONLY': (),
+}
+
+_unavailable = object()
+# Django creates backend instances per thread; they share the local level by LOCATION.
+_levels = {}
+_levels_lock = threading.Lock()
+
+
+def broadcast_key(version):
+    return f'tiered-cache:changed:{version}'
+
+
+class _LocalLevel:
+    def __init__(self):
+        # key -> (pickled value, fresh until, expires at, written while the backend was down)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.synced_version = None
+        self.next_sync = 0
+        self.own_versions = set()
+        self.down_until = None
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        options = {**DEFAULT_OPTIONS, **params.get('OPTIONS', {})}
+        super().__init__({**params, 'OPTIONS': {}})
+        self.shared_alias = options['SHARED']
+        self.max_entries = options['MAX_ENTRIES']
+        self.local_timeout = options['LOCAL_TIMEOUT']
+        self.sync_interval = options['SYNC_INTERVAL']
+        self.retry_after = options['RETRY_AFTER']
+        self.max_broadcasts = options['MAX_BROADCASTS']
+        self.shared_only = tuple(options['SHARED_ONLY'])
+        with _levels_lock:
+            self._level = _levels.setdefault(location, _LocalLevel())
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @property
+    def degraded(self):
+        return self._level.down_until is not None
+
+    # The shared backend
+
+    def _call_shared(self, method, *args, **kwargs):
+        '''Call a method of the shared backend, or return _unavailable while it is down.'''
+        if self._level.down_until is not None and time.monotonic() < self._level.down_until:
+            return _unavailable
+        try:
+            result = getattr(self.shared, method)(*args, **kwargs)
+        except ValueError:
+            # incr() of a missing key, not a failure of the backend.
+            raise
+        except Exception:
+            if self._level.down_until is None:
+                logger.warning('Shared cache %r is unavailable, using the local cache only', self.shared_alias, exc_info=True)
+            self._level.down_until = time.monotonic() + self.retry_after
+            return _unavailable
+        if self._level.down_until is not None:
+            self._recover()
+        return result
+
+    def _recover(self):
+        logger.info('Shared cache %r is available again', self.shared_alias)
+        self._level.down_until = None
+        with self._level.lock:
+            for key in [key for key, entry in self._level.entries.items() if not entry[3]]:
+                del self._level.entries[key]
+        self._level.synced_version = None
+        self._level.next_sync = 0
+
+    def _publish(self, keys, version):
+        '''Tell the other processes that these keys changed.'''
+        keys = [self._local_key(key, version) for key in keys if self._is_local(key)]
+        if not keys:
+            return
+        try:
+            counter = self._call_shared('incr', VERSION_KEY)
+        except ValueError:
+            self._call_shared('add', VERSION_KEY, 0, timeout=None)
+            counter = self._call_shared('incr', VERSION_KEY)
+        if counter is _unavailable:
+            return
+        self._level.own_versions.add(counter)
+        self._call_shared('set', broadcast_key(counter), keys, timeout=BROADCAST_TIMEOUT)
+
+    def _sync(self):
+        '''Drop the local entries that other processes changed since the last sync.'''
+        if time.monotonic() < self._level.next_sync or not self._level.sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._level.next_sync = time.monotonic() + self.sync_interval
+            version = self._call_shared('get', VERSION_KEY)
+            if version is _unavailable:
+                return
+            synced, self._level.synced_version = self._level.synced_version, version
+            if synced is None or version == synced:
+                return
+            if version is None or not synced < version <= synced + self.max_broadcasts:
+                # A flushed backend, or too many changes to replay.
+                self._clear_local()
+                self._level.own_versions.clear()
+                return
+            versions = [v for v in range(synced + 1, version + 1) if v not in self._level.own_versions]
+            self._level.own_versions.difference_update(range(synced + 1, version + 1))
+            if not versions:
+                return
+            changed = self._call_shared('get_many', [broadcast_key(v) for v in versions])
+            if changed is _unavailable or len(changed) < len(versions):
+                self._clear_local()
+                return
+            with self._level.lock:
+                for keys in changed.values():
+                    for key in keys:
+                        self._level.entries.pop(key, None)
+        finally:
+            self._level.sync_lock.release()
+
+    # The local level
+
+    def _is_local(self, key):
+        return not key.startswith(self.shared_only)
+
+    def _local_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def _get_local(self, key, version):
+        local_key = self._local_key(key, version)
+        current = time.time()
+        with self._level.lock:
+            entry = self._level.entries.get(local_key)
+            if entry is None:
+                return _unavailable
+            if entry[2] is not None and entry[2] <= current:
+                del self._level.entries[local_key]
+                return _unavailable
+            if entry[1] <= current and not (self.degraded or entry[3]):
+                return _unavailable
+            self._level.entries.move_to_end(local_key)
+        return pickle.loads(entry[0])
+
+    def _set_local(self, key, value, timeout, version, pinned=False):
+        if not (self._is_local(key) or pinned):
+            return
+        expires = self.get_backend_timeout(timeout)
+        if expires is not None and expires <= time.time():
+            self._delete_local(key, version)
+            return
+        fresh = time.time() + self.local_timeout
+        if expires is not None:
+            fresh = min(fresh, expires)
+        entry = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), fresh, expires, pinned)
+        local_key = self._local_key(key, version)
+        with self._level.lock:
+            self._level.entries[local_key] = entry
+            self._level.entries.move_to_end(local_key)
+            while len(self._level.entries) > self.max_entries:
+                self._level.entries.popitem(last=False)
+
+    def _delete_local(self, key, version):
+        with self._level.lock:
+            return self._level.entries.pop(self._local_key(key, version), None) is not None
+
+    def _clear_local(self):
+        with self._level.lock:
+            self._level.entries.clear()
+
+    def _shared_timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # The cache API
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._get_local(key, version) if self._is_local(key) or self.degraded else _unavailable
+            if value is _unavailable:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            loaded = self._call_shared('get_many', missing, version=version)
+            if loaded is not _unavailable:
+                for key, value in loaded.items():
+                    # Copies of shared entries are kept for LOCAL_TIMEOUT at most.
+                    self._set_local(key, value, self.local_timeout, version)
+                found.update(loaded)
+        return found
+
+    async def aget(self, key, default=None, version=None):
+        # Local hits don't need a thread.
+        if self._is_local(key) and time.monotonic() < self._level.next_sync:
+            value = self._get_local(key, version)
+            if value is not _unavailable:
+                return value
+        return await sync_to_async(self.get, thread_sensitive=False)(key, default, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        stored = self._call_shared('set', key, value, timeout=self._shared_timeout(timeout), version=version)
+        self._publish([key], version)
+        self._set_local(key, value, timeout, version, pinned=stored is _unavailable)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._call_shared('add', key, value, timeout=self._shared_timeout(timeout), version=version)
+        if added is _unavailable:
+            if self._get_local(key, version) is not _unavailable:
+                return False
+            self._set_local(key, value, timeout, version, pinned=True)
+            return True
+        if added:
+            self._publish([key], version)
+            self._set_local(key, value, timeout, version)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._call_shared('set_many', data, timeout=self._shared_timeout(timeout), version=version)
+        self._publish(data, version)
+        for key, value in data.items():
+            self._set_local(key, value, timeout, version, pinned=failed is _unavailable)
+        return [] if failed is _unavailable else failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = self._call_shared('touch', key, timeout=self._shared_timeout(timeout), version=version)
+        value = self._get_local(key, version)
+        if value is not _unavailable:
+            self._set_local(key, value, timeout, version, pinned=touched is _unavailable)
+        if touched is _unavailable:
+            return value is not _unavailable
+        return touched
+
+    def delete(self, key, version=None):
+        deleted = self._call_shared('delete', key, version=version)
+        self._publish([key], version)
+        deleted_locally = self._delete_local(key, version)
+        return deleted_locally if deleted is _unavailable else deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._call_shared('delete_many', keys, version=version)
+        self._publish(keys, version)
+        for key in keys:
+            self._delete_local(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self._call_shared('incr', key, delta, version=version)
+        if value is _unavailable:
+            value = self._get_local(key, version)
+            if value is _unavailable:
+                raise ValueError("Key '%s' not found" % key)
+            value += delta
+            self._set_local(key, value, DEFAULT_TIMEOUT, version, pinned=True)
+            return value
+        self._publish([key], version)
+        self._delete_local(key, version)
+        return value
+
+    def clear(self):
+        # Clearing the shared backend also removes the version counter, which makes
+        # the other processes drop their local levels on their next sync.
+        self._call_shared('clear')
+        self._clear_local()
+
+    def close(self, **kwargs):
+        self._call_shared('close', **kwargs)
@@ -6,10 +6,10 @@ from .views.auth_views import (
     CustomPasswordResetCompleteView,
 )
 from .views.auth_views import login_view, logout_view, register
-from .views.event_views import index, event_list, event_detail, event_form, delete_event
-from .views.rsvp_views import search_users, update_rsvp_list, rsvp_list, rsvp_event
+from .views.event_views import index, event_list, event_search, event_detail, event_form, delete_event
+from .views.rsvp_views import search_users, update_rsvp_list, rsvp_list, rsvp_event, rsvp_batch
 from .views.task_views import create_task, reload_task_list, edit_task, toggle_task_completion, delete_task
-from .views.chat_views import chat_tabs, get_chats, add_message, fetch_latest_messages
+from .views.chat_views import chat_tabs, get_chats, add_message, fetch_latest_messages, unread_counts, mark_chat_read, search_chat_messages, archived_messages
 from django.conf import settings
 from django.urls import include
 
@@ -27,6 +27,7 @@ urlpatterns = [
     path("reset/done/", CustomPasswordResetCompleteView.as_view(), name="password_reset_complete"),
     # event views
     path('events/', event_list, name='event_list'),
+    path('events/search/', event_search, name='event_search'),
     path('events/<int:pk>/', event_detail, name='event_detail'),
     path('events/new/', event_form, name='event_create'),
     path('events/<int:pk>/edit/', event_form, name='event_edit'),
@@ -36,6 +37,7 @@ urlpatterns = [
     path('events/<int:pk>/update-rsvp-list/', update_rsvp_list, name='update_rsvp_list'),
     path('rsvps/', rsvp_list, name='rsvp_list'),
     path('rsvp/<int:pk>/', rsvp_event, name='rsvp_event'),
+    path('rsvps/batch/', rsvp_batch, name='rsvp_batch'),
     # task views
     path('events/<int:pk>/tasks/create/', create_task, name='create_task'),
     path('events/<int:pk>/tasks/reload/', reload_task_list, name='reload_task_list'),
@@ -47,6 +49,10 @@ urlpatterns = [
     path('api/chats/', get_chats, name='get_chats'),
     path('api/chats/<int:chat_id>/messages/add/', add_message, name="add_message"),
     path('api/chats/<int:chat_id>/messages/', fetch_latest_messages, name="fetch_latest_messages"),
+    path('api/chats/unread/', unread_counts, name="unread_counts"),
+    path('api/chats/search/', search_chat_messages, name="search_chat_messages"),
+    path('api/chats/<int:chat_id>/read/', mark_chat_read, name="mark_chat_read"),
+    path('api/chats/<int:chat_id>/archive/', archived_messages, name="archived_messages"),
 ]
 
 if settings.DEBUG:
@@ -1,34 +1,112 @@
 import json
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from ..models import Chat, Message, ChatParticipant
+from django.db import transaction
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
+from django.http import JsonResponse, Http404
+from ..models import Chat, ChatParticipant
+from ..archive import get_archive
+from ..ingest import ais_chat_member, ingest_message
+from ..compact import columns, epoch_ms, wants_compact
+from ..partitions import chat_message_rows, count_chat_messages, count_recent_chat_messages
+from ..search import search_messages
+from ..streaming import StreamingJsonResponse
+from ..throttling import chat_api, chat_poll_settings, poll_interval
 from django.utils.timezone import now
+from datetime import timedelta
 
-def fetch_chat_data(user):
+def event_warning(event_date):
+    """Return the warning shown for chats whose event has already passed."""
+    if event_date < now():
+        return "This chat will be deleted soon."
+    return None
+
+def chat_warning(chat):
+    """Return the warning shown for a chat, if any."""
+    return event_warning(chat.event.date)
+
+def serialize_message_row(row):
+    """Serialize a message row from chat_message_rows()."""
+    message_id, message, created_at, _, _, username = row
+    return {'id': message_id, 'user': username, 'message': message, 'created_at': created_at}
+
+def chat_poll_interval(chat, timestamps):
+    """Return the next poll interval hint for a chat from the creation times of its already loaded messages."""
+    since = now() - timedelta(seconds=chat_poll_settings()['activity_window'])
+    recent_messages = sum(1 for created_at in timestamps if created_at >= since)
+    last_activity = timestamps[-1] if timestamps else None
+    return poll_interval(recent_messages, last_activity, event_passed=chat.event.date < now())
+
+def serialize_chat(participant):
+    """Serialize a participant's chat for the tab list from the chat summary, without reading messages."""
+    chat = participant.chat
+    return {
+        'id': chat.id,
+        'name': chat.event.title,
+        'event_pk': chat.event.pk,
+        'warning': chat_warning(chat),
+        'unread_count': participant.unread_count,
+        'last_read_message_id': participant.last_read_message_id,
+        'message_count': chat.message_count,
+        'last_message_id': chat.last_message_id,
+        'last_message_preview': chat.last_message_preview,
+        'last_activity_at': chat.last_activity_at,
+        'poll_interval': poll_interval(0, chat.last_activity_at, event_passed=chat.event.date < now()),
+    }
+
+def chat_list(user, sort=None):
+    """Return the user's chat participations with chat, event and unread counts in one query."""
+    chats = ChatParticipant.with_unread_counts(user).select_related('chat', 'chat__event')
+    if sort == 'recent':
+        chats = chats.order_by(F('chat__last_activity_at').desc(nulls_last=True), '-chat_id')
+    return chats
+
+CHAT_COLUMNS = [
+    'id', 'name', 'event_pk', 'warning', 'unread_count', 'last_read_message_id', 'message_count',
+    'last_message_id', 'last_message_preview', 'last_activity_at', 'poll_interval',
+]
+MESSAGE_COLUMNS = ['id', 'user', 'message', 'created_at']
+
+async def acompact_chat_data(user, sort=None):
+    """Return the user's chats in the compact columnar format, built from value rows."""
+    rows = chat_list(user, sort).values_list(
+        'chat_id', 'chat__event__title', 'chat__event_id', 'chat__event__date', 'unread_count',
+        'last_read_message_id', 'chat__message_count', 'chat__last_message_id',
+        'chat__last_message_preview', 'chat__last_activity_at',
+    )
+    chats = [
+        (
+            chat_id, title, event_pk, event_warning(event_date), unread, last_read, count,
+            last_id, preview, epoch_ms(last_activity),
+            poll_interval(0, last_activity, event_passed=event_date < now()),
+        )
+        async for chat_id, title, event_pk, event_date, unread, last_read, count, last_id, preview, last_activity in rows
+    ]
+    return {'format': 'compact', 'chats': columns(CHAT_COLUMNS, chats)}
+
+def compact_messages(chat):
+    """Return a chat's messages in the compact columnar format, built from value rows."""
+    rows = list(chat_message_rows([chat.id], since=chat.created_at))
+    return {
+        'format': 'compact',
+        'warning': chat_warning(chat),
+        'poll_interval': chat_poll_interval(chat, [created_at for _, _, created_at, _, _, _ in rows]),
+        'users': {user_id: username for _, _, _, _, user_id, username in rows},
+        'messages': columns(
+            MESSAGE_COLUMNS,
+            ((message_id, user_id, message, epoch_ms(created_at)) for message_id, message, created_at, _, user_id, _ in rows),
+        ),
+    }
+
+def fetch_chat_data(user, sort=None):
     """Fetch and prepare chat data for a given user."""
-    chats = ChatParticipant.objects.filter(user=user).select_related('chat', 'chat__event')
-    chat_data = []
-
-    for participant in chats:
-        chat = participant.chat
-        warning = None
-
-        if chat.event.date < now():  
-            warning = "This chat will be deleted soon."
-
-        chat_data.append({
-            'id': chat.id,
-            'name': chat.event.title,
-            'event_pk': chat.event.pk,
-            'warning': warning,
-            'messages': [
-                {'user': msg.user.username, 'message': msg.message, 'created_at': msg.created_at}
-                for msg in chat.messages.order_by('created_at')
-            ],
-        })
-    return chat_data
+    return [serialize_chat(participant) for participant in chat_list(user, sort)]
+
+async def afetch_chat_data(user, sort=None):
+    """Async version of fetch_chat_data using the async ORM."""
+    return [serialize_chat(participant) async for participant in chat_list(user, sort)]
 
 @login_required
 def chat_tabs(request):
@@ -38,41 +116,138 @@ def chat_tabs(request):
     # Render the template
     return render(request, "events/chat_tabs.html", {"chats": chat_data})
 
+# The chat API views are async so polling clients don't hold a worker thread each.
+# ATOMIC_REQUESTS cannot wrap async views, so they opt out of it explicitly.
+# Responses carry a `poll_interval` hint and clients over their rate limit get a 429.
+
 @login_required
-def get_chats(request):
-    """Return chat data for the user as JSON."""
-    user = request.user
-    chat_data = fetch_chat_data(user)
+@transaction.non_atomic_requests
+@chat_api
+async def get_chats(request):
+    """
+    Return chat data for the user as JSON, optionally sorted by recent activity (?sort=recent)
+    and in the compact format (?format=compact).
+    """
+    user = await request.auser()
+    if wants_compact(request):
+        return JsonResponse(await acompact_chat_data(user, request.GET.get('sort')))
+    chat_data = await afetch_chat_data(user, request.GET.get('sort'))
     return JsonResponse(chat_data, safe=False)
 
 @login_required
-def add_message(request, chat_id):
-    """Add a message to a specific chat."""
+@transaction.non_atomic_requests
+@chat_api
+async def add_message(request, chat_id):
+    """Add a message to a specific chat through the write-behind message writer."""
     if request.method == "POST":
-        user = request.user
-        chat = get_object_or_404(Chat, id=chat_id)
+        user = await request.auser()
+        # Membership is checked from the cache, so posting doesn't read the chat.
+        if not await ais_chat_member(chat_id, user.pk):
+            raise Http404("You are not a participant of this chat.")
 
         # Add the message
         data = json.loads(request.body)
         message_text = data.get("message")
         if message_text:
-            Message.objects.create(chat=chat, user=user, message=message_text)
-            return JsonResponse({"status": "success"})
+            # Answered once the batch holding the message has committed.
+            message = await ingest_message(chat_id, user.pk, message_text)
+            return JsonResponse({"status": "success", "id": message.id})
     return JsonResponse({"status": "error"}, status=400)
 
 @login_required
-def fetch_latest_messages(request, chat_id):
-    """Fetch the latest messages for a specific chat."""
-    chat = get_object_or_404(Chat, id=chat_id)
-    messages = Message.objects.filter(chat=chat).order_by('created_at')
-    warning = None
-    if chat.event.date < now():
-        warning = "This chat will be deleted soon."
-
-    return JsonResponse({
-        'warning': warning,
-        'messages': [
-            {'user': msg.user.username, 'message': msg.message, 'created_at': msg.created_at}
-            for msg in messages
-        ]
-    })
\ No newline at end of file
+@transaction.non_atomic_requests
+@chat_api
+async def fetch_latest_messages(request, chat_id):
+    """
+    Fetch the latest messages for a specific chat, optionally in the compact format (?format=compact).
+    The default format is streamed from the database cursor.
+    """
+    chat = await aget_object_or_404(Chat.objects.select_related('event'), id=chat_id, event__deleted_at__isnull=True)
+    if wants_compact(request):
+        return JsonResponse(await sync_to_async(compact_messages)(chat))
+
+    # The history is streamed from the cursor, so the poll interval comes from the
+    # chat summary and a count of the recent messages, which a rotation may just
+    # have moved into a partition.
+    since = now() - timedelta(seconds=chat_poll_settings()['activity_window'])
+    recent_messages = await sync_to_async(count_recent_chat_messages)(chat.id, since)
+    # Only the partitions created since the chat started are read.
+    return StreamingJsonResponse(
+        {
+            'warning': chat_warning(chat),
+            'poll_interval': poll_interval(recent_messages, chat.last_activity_at, event_passed=chat.event.date < now()),
+            'messages': chat_message_rows([chat.id], since=chat.created_at),
+        },
+        serialize=serialize_message_row,
+        request=request,
+        is_async=True,
+    )
+
+
+@login_required
+@transaction.non_atomic_requests
+@chat_api
+async def unread_counts(request):
+    """Return the number of unread messages per chat for the user, without loading any messages."""
+    user = await request.auser()
+    counts = ChatParticipant.with_unread_counts(user).values_list('chat_id', 'unread_count')
+    return JsonResponse({str(chat_id): count async for chat_id, count in counts})
+
+@login_required
+@transaction.non_atomic_requests
+@chat_api
+async def mark_chat_read(request, chat_id):
+    """Advance the user's read receipt in a chat to the given message, or to the latest one."""
+    if request.method != "POST":
+        return JsonResponse({"status": "error"}, status=400)
+
+    user = await request.auser()
+    participants = ChatParticipant.objects.filter(chat_id=chat_id, user=user, chat__event__deleted_at__isnull=True)
+    if not await participants.aexists():
+        raise Http404("You are not a participant of this chat.")
+
+    try:
+        data = json.loads(request.body or "{}")
+    except ValueError:
+        return JsonResponse({"status": "error"}, status=400)
+    message_id = data.get("message_id") if isinstance(data, dict) else False
+    # Reading up to the latest message only needs the chat summary.
+    summary = await Chat.objects.filter(pk=chat_id).values('last_message_id', 'message_count').aget()
+    last_message_id = summary['last_message_id'] or 0
+    if message_id is None:
+        message_id, read_count = last_message_id, summary['message_count']
+    elif isinstance(message_id, int) and not isinstance(message_id, bool) and 0 < message_id <= last_message_id:
+        read_count = await sync_to_async(count_chat_messages)(chat_id, message_id)
+    else:
+        # A receipt past the latest message would block the receipt updates of new messages.
+        return JsonResponse({"status": "error"}, status=400)
+
+    # Receipts only move forward, so a stale client can't mark read messages unread again.
+    await participants.filter(last_read_message_id__lt=message_id).aupdate(
+        last_read_message_id=message_id, read_message_count=read_count
+    )
+    return JsonResponse({"status": "success", "last_read_message_id": message_id})
+
+@login_required
+@transaction.non_atomic_requests
+@chat_api
+async def search_chat_messages(request):
+    """Search the user's chat history (?q=...&page=N), ranked by relevance with highlighted snippets."""
+    user = await request.auser()
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    results = await sync_to_async(search_messages)(user, request.GET.get('q', ''), page)
+    return JsonResponse(results)
+
+@login_required
+@transaction.non_atomic_requests
+@chat_api
+async def archived_messages(request, chat_id):
+    """Return the history of a purged chat from the archive; the messages are not read from the database."""
+    user = await request.auser()
+    chat = get_archive().history_for(chat_id, user.pk)
+    if chat is None:
+        raise Http404("No archived chat found.")
+    return JsonResponse(chat)
@@ -2,12 +2,22 @@ import json
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
-from ..forms import EventForm
+from ..forms import EventForm, EventSearchForm
 from ..models import Event, RSVP, Task
+from ..jobs import HIGH, enqueue
+from ..purge import hide_event
+from ..rsvps import update_capacity
+from ..search import search_events
+from ..directory import display_names
+from ..event_pages import EVENT_PAGE_TIMEOUT, event_page_key, load_event_page
+from ..singleflight import get_or_compute, invalidate
+from .rsvp_views import requested_page, rsvp_page
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.db.models import Q
-from django.utils.timezone import now
+from django.utils.timezone import now, timedelta, make_aware
+from datetime import datetime, time
+from functools import partial
 from itertools import chain
 
 def index(request):
@@ -58,13 +68,45 @@ def event_list(request):
             'past': past_events,
         }})
 
+def start_of_day(day):
+    '''Return midnight of a date in the current time zone.'''
+    return make_aware(datetime.combine(day, time.min))
+
+@login_required
+def event_search(request):
+    '''Search the events the user is involved in by title, description and location.'''
+    form = EventSearchForm(request.GET or None)
+    results = None
+    if form.is_valid() and form.cleaned_data['q']:
+        data = form.cleaned_data
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+        except ValueError:
+            page = 1
+        results = search_events(
+            request.user, data['q'],
+            date_from=start_of_day(data['date_from']) if data['date_from'] else None,
+            # The end date is inclusive, so search up to the start of the following day.
+            date_to=start_of_day(data['date_to'] + timedelta(days=1)) if data['date_to'] else None,
+            status=data['status'],
+            page=page,
+        )
+
+    # Pagination links keep the search parameters.
+    params = request.GET.copy()
+    params.pop('page', None)
+    return render(request, 'events/event_search.html', {
+        'form': form,
+        'results': results,
+        'querystring': params.urlencode(),
+    })
+
 
 @login_required
 def event_detail(request, pk):
     '''Display event details and RSVPs to this event.'''
-    event = get_object_or_404(Event, pk=pk)
-
     if request.method == "POST" and request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        event = get_object_or_404(Event, pk=pk)
         try:
             data = json.loads(request.body)
             user_ids = data.get('user_ids', [])
@@ -72,21 +114,29 @@ def event_detail(request, pk):
                 return JsonResponse({'message': 'No users provided'}, status=400)
             
             users = User.objects.filter(id__in=user_ids)
-            RSVP.objects.bulk_create([
+            invited = RSVP.objects.bulk_create([
                 RSVP(user=user, event=event, status='MAYBE') for user in users
             ])
+            invalidate(event_page_key(event.pk))
+            # The invitation emails are written by the workers.
+            enqueue('events.notifications.send_invitations', event.pk, [rsvp.user_id for rsvp in invited], priority=HIGH)
             return JsonResponse({'message': 'Invitations sent successfully', 'processed_users': user_ids}, status=200)
         except Exception as e:
             return JsonResponse({'message': f'Error: {str(e)}'}, status=400)
         
-    rsvps = event.rsvps.all() 
+    # Shared by all viewers and computed once when it expires, however many are waiting.
+    page = get_or_compute(event_page_key(pk), partial(load_event_page, pk), EVENT_PAGE_TIMEOUT)
+    event, tasks = page['event'], page['tasks']
+    is_creator = event.created_by_id == request.user.id
+    # Load all names shown on the page in one lookup.
+    display_names.get_many([event.created_by_id, *(task.assigned_to_id for task in tasks)])
     return render(request, 'events/event_detail.html', {
-        'event': event,
-        'is_creator': event.created_by == request.user,
+        **page,
+        'is_creator': is_creator,
         'is_active': event.status == 'ACTIVE',
-        'is_attendee': RSVP.objects.filter(event=event, user=request.user, status='YES').exists(),
-        'rsvps': rsvps,
-        'attendees_count': event.attendees_count(),
+        # Only the organizer sees the RSVP list, and needs no RSVP of their own.
+        'is_attendee': not is_creator and RSVP.objects.filter(event_id=pk, user=request.user, status='YES').exists(),
+        'rsvp_page': rsvp_page(pk, requested_page(request, 'rsvp_page')) if is_creator and event.status == 'ACTIVE' else None,
         })
 
 @login_required
@@ -106,7 +156,13 @@ def event_form(request, pk=None):
             new_event = form.save(commit=False)
             if not pk:  # Set creator only for new events
                 new_event.created_by = request.user
-            new_event.save()
+                new_event.save()
+            else:
+                # Only the edited fields are written (and the status save() sets), so an edit
+                # can't reset the seat counter kept by rsvps.py or un-hide an event deleted meanwhile.
+                new_event.save(update_fields=[*EventForm.Meta.fields, 'status'])
+            if pk and 'capacity' in form.changed_data:
+                update_capacity(new_event.pk)
             return redirect('event_detail', pk=new_event.pk)
     else:
         form = EventForm(instance=event)
@@ -122,6 +178,7 @@ def delete_event(request, pk):
         messages.error(request, "You do not have permission to delete this event.")
         return redirect('event_detail', pk=pk)
     
-    event.delete()
+    # The event disappears now; its rows are deleted in the background.
+    hide_event(event.pk)
     messages.success(request, "Event deleted successfully.")
     return redirect('event_list')
\ No newline at end of file
@@ -1,18 +1,28 @@
+import json
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from ..models import Event, RSVP
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Q
 from django.template.loader import render_to_string
 from django.http import JsonResponse
+from ..rsvps import RESPONSES, upsert_rsvp, upsert_rsvps
+from ..streaming import StreamingJsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
+RSVP_PAGE_SIZE = 50
+RSVP_INBOX_PAGE_SIZE = 24
+RSVP_BATCH_SIZE = 500
+
 @login_required
 @csrf_exempt
-def search_users(request):
+@transaction.non_atomic_requests
+async def search_users(request):
     """
     Search for users based on their username, first name, or last name.
+    The view is async, so the results are streamed from the cursor under ASGI.
     """
     query = request.GET.get('q', '')
     if query:
@@ -21,39 +31,75 @@ def search_users(request):
             Q(first_name__icontains=query) | 
             Q(last_name__icontains=query)
         ).values('id', 'username', 'first_name', 'last_name')
-        
-        return JsonResponse(list(users), safe=False)
+
+        # Broad queries can match many users, so they are streamed rather than built as one list.
+        return StreamingJsonResponse(users.aiterator(), request=request, is_async=True)
     return JsonResponse([], safe=False)
 
+def requested_page(request, param='page'):
+    '''Return the page number requested in the query string, defaulting to the first page.'''
+    try:
+        return max(1, int(request.GET.get(param, 1)))
+    except ValueError:
+        return 1
+
+
+def rsvp_page(event_id, page=1, page_size=RSVP_PAGE_SIZE):
+    '''
+    Return one page of an event's RSVPs with their users' names loaded in the same query.
+    `has_next` tells whether another page exists, so no count query is needed.
+    '''
+    rsvps = list(
+        RSVP.objects.filter(event_id=event_id)
+        .select_related('user')
+        .only('status', 'event', 'user', 'user__username')
+        .order_by('pk')[(page - 1) * page_size:page * page_size + 1]
+    )
+    return {'rsvps': rsvps[:page_size], 'page': page, 'has_next': len(rsvps) > page_size}
+
+
 @login_required
 def update_rsvp_list(request, pk):
     '''Update the RSVP list for a specific event.'''
     event = get_object_or_404(Event, pk=pk)
-    rsvps = event.rsvps.all()
-    html = render_to_string('includes/rsvp_list_partial.html', {'rsvps': rsvps}, request=request)
+    html = render_to_string(
+        'includes/rsvp_list_partial.html',
+        {'rsvp_page': rsvp_page(event.pk, requested_page(request, 'rsvp_page'))},
+        request=request,
+    )
     return JsonResponse({'html': html})
 
 @login_required
 def rsvp_list(request):
-    '''Display a list of events the user has RSVP'd to.'''
-    user_rsvps = RSVP.objects.filter(user=request.user)
-    events = Event.objects.filter(pk__in=user_rsvps.values_list('event_id', flat=True),  status='ACTIVE')
+    '''Display the user's RSVPs to active events, filtered by status and paginated.'''
+    user_rsvps = RSVP.objects.filter(user=request.user, event__deleted_at__isnull=True)
+    status = request.GET.get('status')
+    if status not in dict(RSVP.RSVP_CHOICES):
+        status = None
+    page = requested_page(request)
 
-    # Count RSVP statuses
-    maybe_count = user_rsvps.filter(status='MAYBE').count()
+    # Facet counts for active events and the pending invitation badge in one aggregate.
+    active = Q(event__status='ACTIVE')
+    counts = user_rsvps.aggregate(
+        **{value: Count('pk', filter=active & Q(status=value)) for value, _ in RSVP.RSVP_CHOICES},
+        maybe_count=Count('pk', filter=Q(status='MAYBE')),
+    )
+    maybe_count = counts.pop('maybe_count')
+    facets = [{'status': None, 'label': 'All', 'count': sum(counts.values())}]
+    facets += [{'status': value, 'label': label, 'count': counts[value]} for value, label in RSVP.RSVP_CHOICES]
 
-    # Create a dictionary mapping event IDs to the user's RSVP status
-    rsvp_status = {rsvp.event.pk: rsvp.status for rsvp in user_rsvps}
-
-    event_rsvp_status = []
-    for event in events:
-        event_rsvp_status.append({
-            'event': event,
-            'status': rsvp_status.get(event.pk)
-        })
+    # The RSVPs with their events in one joined query, one row past the page to tell if there is a next one.
+    rsvps = user_rsvps.filter(active).select_related('event').order_by('event__date', 'event_id')
+    if status:
+        rsvps = rsvps.filter(status=status)
+    rsvps = list(rsvps[(page - 1) * RSVP_INBOX_PAGE_SIZE:page * RSVP_INBOX_PAGE_SIZE + 1])
 
     return render(request, 'events/rsvp_list.html', {
-        'event_rsvp_status': event_rsvp_status,
+        'event_rsvp_status': rsvps[:RSVP_INBOX_PAGE_SIZE],
+        'facets': facets,
+        'status': status,
+        'page': page,
+        'has_next': len(rsvps) > RSVP_INBOX_PAGE_SIZE,
         'maybe_count': maybe_count,
     })
 
@@ -68,14 +114,46 @@ def rsvp_event(request, pk):
 
     if request.method == 'POST':
         status = request.POST.get('status')
-        if status in ['YES', 'NO', 'MAYBE']:
-            rsvp, created = RSVP.objects.get_or_create(user=request.user, event=event)
-            rsvp.status = status
-            rsvp.save()
-            messages.success(request, f'RSVP for "{event.title}" updated to "{status}".')
+        if status in RESPONSES:
+            capped = {event.pk} if event.capacity is not None else set()
+            if upsert_rsvp(request.user.id, event.pk, status, capped) == 'WAIT':
+                messages.warning(request, f'"{event.title}" is full. You are on the waitlist and will be confirmed when a place frees up.')
+            else:
+                messages.success(request, f'RSVP for "{event.title}" updated to "{status}".')
         else:
             messages.error(request, "Invalid RSVP status.")
 
     return redirect('rsvp_list')
 
 
+@login_required
+def rsvp_batch(request):
+    '''
+    Answer many invitations at once. Expects a JSON body {"responses": {"<event id>": "<status>", ...}}.
+    Valid responses are saved together; the others are reported in `errors` by event id.
+    '''
+    if request.method != "POST":
+        return JsonResponse({"status": "error"}, status=400)
+    try:
+        responses = json.loads(request.body).get('responses')
+        responses = {int(event_id): status for event_id, status in responses.items()}
+    except (ValueError, AttributeError):
+        return JsonResponse({"status": "error"}, status=400)
+    if not responses or len(responses) > RSVP_BATCH_SIZE:
+        return JsonResponse({"status": "error"}, status=400)
+
+    events = {pk: (status, capacity) for pk, status, capacity in Event.objects.filter(pk__in=responses).values_list('pk', 'status', 'capacity')}
+    errors, valid = {}, {}
+    for event_id, status in responses.items():
+        if event_id not in events:
+            errors[event_id] = "Event not found."
+        elif events[event_id][0] == 'INACTIVE':
+            errors[event_id] = "The event has already happened."
+        elif status not in RESPONSES:
+            errors[event_id] = "Invalid RSVP status."
+        else:
+            valid[event_id] = status
+
+    capped = {event_id for event_id in valid if events[event_id][1] is not None}
+    changed = upsert_rsvps(request.user.id, valid, capped)
+    return JsonResponse({"status": "success", "changed": changed, "errors": errors})
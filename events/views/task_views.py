@@ -5,6 +5,7 @@ from django.contrib import messages
 from django.template.loader import render_to_string
 from ..forms import TaskForm
 from ..models import Event, Task
+from ..directory import display_names
 
 @login_required
 def load_task_form(request, pk=None, task_id=None):
@@ -23,8 +24,8 @@ def load_task_form(request, pk=None, task_id=None):
 def reload_task_list(request, pk):
     '''Reload the task list for an event.'''
     event = get_object_or_404(Event, pk=pk)
-    tasks = event.task_set.all().order_by('-id') 
-    
+    tasks = list(event.task_set.all().order_by('-id'))
+    display_names.get_many(task.assigned_to_id for task in tasks)
     html = render_to_string('includes/task_list_partial.html', {'tasks': tasks, 'event': event}, request=request)
     return JsonResponse({'html': html})
 